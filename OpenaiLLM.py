@@ -1,45 +1,382 @@
 import openai
+import asyncio
+import hashlib
+import json
+import weakref
+import threading
+import contextlib
+from refAgent.utilities import DiskCache
+from refAgent.tracing import annotate_span
+
+def build_messages(system_prompt, user_query):
+    """Build the new chat messages for one call: optional system prompt, then the user queries."""
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+
+    # Handle single string or list of user queries
+    queries = user_query if isinstance(user_query, list) else [user_query]
+    for q in queries:
+        messages.append({"role": "user", "content": q})
+    return messages
+
+def estimate_tokens(messages):
+    """Cheap local token estimate (~4 characters per token plus per-message overhead)."""
+    if isinstance(messages, str):
+        return len(messages) // 4
+    return sum(len(m.get("content") or "") // 4 + 4 for m in messages)
+
+class HistoryPolicy:
+    def __init__(self, max_prompt_tokens=8192, max_omitted_notes=10):
+        """
+        Decides which part of a growing conversation is sent with the next call.
+
+        Always kept: the system prompt, the first user turn (task and original code),
+        the most recent user turn in the history (latest compiler/test feedback) and
+        the new messages. Older turns are added newest-first while the estimated
+        prompt fits `max_prompt_tokens`; the rest are replaced by a short note
+        quoting the start of each omitted feedback message.
+        """
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_omitted_notes = max_omitted_notes
+
+    def select(self, history, messages):
+        system = [m for m in messages if m["role"] == "system"]
+        new_turns = [m for m in messages if m["role"] != "system"]
+        if not system:
+            system = [m for m in history if m["role"] == "system"][-1:]
+
+        # System prompts are re-sent with every call, so history copies are redundant
+        turns = [m for m in history if m["role"] != "system"]
+        first_user = next((i for i, m in enumerate(turns) if m["role"] == "user"), None)
+        if first_user is None:
+            return system + turns + new_turns
+
+        pinned = turns[first_user]
+        rest = []
+        for m in turns[first_user + 1:]:
+            if m["role"] == "user" and m["content"] == pinned["content"]:
+                m = {"role": "user", "content": "Same request as above."}
+            rest.append(m)
+
+        # A repeated request right after feedback adds nothing the model has not seen
+        if rest and rest[-1]["role"] == "user":
+            new_turns = [m for m in new_turns if m["content"] != pinned["content"]]
+
+        latest_user = max((i for i, m in enumerate(rest) if m["role"] == "user"), default=len(rest))
+        start = min(latest_user, max(len(rest) - 1, 0))
+        used = estimate_tokens(system + [pinned] + rest[start:] + new_turns)
+        while start > 0 and used + estimate_tokens(rest[start - 1:start]) <= self.max_prompt_tokens:
+            start -= 1
+            used += estimate_tokens(rest[start:start + 1])
+
+        omitted = rest[:start]
+        note = []
+        if omitted:
+            feedback = [" ".join(m["content"].split())[:160] for m in omitted
+                        if m["role"] == "user" and m["content"] != "Same request as above."]
+            lines = [f"[{len(omitted)} earlier messages omitted to fit the context budget.]"]
+            lines += [f"- {line}" for line in feedback[-self.max_omitted_notes:]]
+            note = [{"role": "user", "content": "\n".join(lines)}]
+
+        return system + [pinned] + note + rest[start:] + new_turns
+
+def select_messages(llm, messages):
+    """Return the messages to send for `llm` (history + new messages) and its `call_log` entry.
+
+    The entry records the estimated prompt size with and without the history policy;
+    `prompt_tokens`/`completion_tokens` are added once the response arrives (see `record_usage`),
+    or `cached` when the reply came from the response cache.
+    """
+    unbounded = llm.message_history + messages
+    selected = llm.history_policy.select(llm.message_history, messages) if llm.history_policy else unbounded
+    log_entry = {
+        "estimated_prompt_tokens": estimate_tokens(selected),
+        "unbounded_prompt_tokens": estimate_tokens(unbounded),
+    }
+    llm.call_log.append(log_entry)
+    return selected, log_entry
+
+def record_usage(log_entry, usage, reply):
+    """Add the server-reported token usage of a call to its `call_log` entry (local estimates when not reported)."""
+    if usage is not None:
+        log_entry["prompt_tokens"] = usage.prompt_tokens
+        log_entry["completion_tokens"] = usage.completion_tokens
+    else:
+        log_entry["completion_tokens"] = estimate_tokens(reply)
+
+def tokens_used(call_log):
+    """Tokens consumed by the calls of a `call_log`; replies served from the cache cost nothing."""
+    return sum(
+        entry.get("prompt_tokens", entry["estimated_prompt_tokens"]) + entry.get("completion_tokens", 0)
+        for entry in call_log if not entry.get("cached")
+    )
+
+# A stream monitor is called with the reply received so far after every streamed chunk and
+# returns None to keep reading, STREAM_STOP to end the reply here (the answer is complete),
+# or the reason for cancelling a reply that has gone wrong.
+STREAM_STOP = "stop"
+
+def stream_options():
+    """Extra `create` arguments for a streamed completion (usage is reported in the last chunk)."""
+    return {"stream": True, "stream_options": {"include_usage": True}}
+
+def read_chunk(chunk):
+    """Text delta and usage (or None) of one streamed chunk."""
+    text = ""
+    if chunk.choices:
+        text = chunk.choices[0].delta.content or ""
+    return text, getattr(chunk, "usage", None)
+
+def check_stream(stream_monitor, reply, log_entry):
+    """Run `stream_monitor` on the partial reply; True when reading should stop. The outcome is
+    recorded in the `call_log` entry as `stream` ("complete", "stopped" or "aborted") and `abort_reason`."""
+    verdict = stream_monitor(reply)
+    if verdict is None:
+        return False
+    if verdict == STREAM_STOP:
+        log_entry["stream"] = "stopped"
+    else:
+        log_entry["stream"] = "aborted"
+        log_entry["abort_reason"] = verdict
+    return True
+
+class ResponseCache(DiskCache):
+    def __init__(self, db_path, max_entries=10000):
+        """
+        On-disk cache of chat completions, shared by every agent of a run.
+        Entries are keyed by model, full message list, temperature, max_tokens and
+        response format, and the least recently used entries are evicted beyond `max_entries`.
+        """
+        super().__init__(db_path, max_entries=max_entries, table="responses")
+
+    @staticmethod
+    def make_key(model, messages, temperature, max_tokens, response_format=None):
+        request = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+        if response_format is not None:
+            request["response_format"] = response_format
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 class OpenAILLM:
-    def __init__(self, api_key=None, base_url="http://localhost:11434/v1", model="starcoder2:3b"):
+    def __init__(self, api_key=None, base_url="http://localhost:11434/v1", model="starcoder2:3b", cache=None, history_policy=None):
         """
         Local Ollama wrapper using OpenAI-compatible API.
         No real API key needed — Ollama ignores it.
+        `cache` is an optional ResponseCache used to replay identical requests.
+        `history_policy` is an optional HistoryPolicy bounding the resent conversation;
+        per-call prompt sizes are recorded in `call_log`.
         """
         self.client = openai.OpenAI(
             api_key = api_key or "unused",  # Dummy key
             base_url = base_url
         )
         self.model = model
+        self.cache = cache
+        self.history_policy = history_policy
         self.message_history = []
+        self.call_log = []
 
-    def query_llm(self, system_prompt, user_query, model=None, max_tokens=4096, temperature=0.7):
+    def _stream_completion(self, model, messages, max_tokens, temperature, stream_monitor, log_entry):
+        """Stream a completion through `stream_monitor` (see STREAM_STOP); returns (reply, usage).
+        Stopping closes the HTTP response, which cancels the generation on the server."""
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **stream_options(),
+        )
+        log_entry["stream"] = "complete"
+        parts, usage = [], None
         try:
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
+            for chunk in stream:
+                text, chunk_usage = read_chunk(chunk)
+                usage = chunk_usage or usage
+                if text:
+                    parts.append(text)
+                    if check_stream(stream_monitor, "".join(parts), log_entry):
+                        break
+        finally:
+            stream.close()
+        return "".join(parts), usage
 
-            # Handle single string or list of user queries
-            queries = user_query if isinstance(user_query, list) else [user_query]
-            for q in queries:
-                messages.append({"role": "user", "content": q})
+    def query_llm(self, system_prompt, user_query, model=None, max_tokens=4096, temperature=0.7, use_cache=True, stream_monitor=None,
+                  response_format=None):
+        """
+        Send one chat request and return the reply text (or "Local LLM Error: ...").
+        With `stream_monitor`, the reply is streamed and may end early (see STREAM_STOP);
+        cancelled replies are returned as received but never cached.
+        `response_format` is passed to the server as is (JSON mode, JSON schema).
+        """
+        try:
+            messages = build_messages(system_prompt, user_query)
 
             # Use conversation history for multi-turn (error feedback)
-            full_messages = self.message_history + messages
+            full_messages, log_entry = select_messages(self, messages)
+            model = model or self.model
 
-            response = self.client.chat.completions.create(
-                model=model or self.model,
-                messages=full_messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
+            # use_cache=False forces a fresh sample (e.g. generator retries); the reply is still stored
+            cache_key = None
+            reply = None
+            if self.cache is not None:
+                cache_key = ResponseCache.make_key(model, full_messages, temperature, max_tokens, response_format)
+                if use_cache:
+                    reply = self.cache.get(cache_key)
 
-            reply = response.choices[0].message.content.strip()
+            if reply is None:
+                if stream_monitor is not None:
+                    reply, usage = self._stream_completion(model, full_messages, max_tokens, temperature, stream_monitor, log_entry)
+                else:
+                    response = self.client.chat.completions.create(
+                        model=model,
+                        messages=full_messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        **({"response_format": response_format} if response_format is not None else {}),
+                    )
+                    reply, usage = response.choices[0].message.content, getattr(response, "usage", None)
+
+                reply = reply.strip()
+                record_usage(log_entry, usage, reply)
+                if cache_key is not None and log_entry.get("stream") != "aborted":
+                    self.cache.put(cache_key, reply)
+            else:
+                log_entry["cached"] = True
 
             # Update history for next turn
             self.message_history.extend(messages)
             self.message_history.append({"role": "assistant", "content": reply})
 
+            annotate_span(**log_entry)
+            return reply
+
+        except Exception as e:
+            return f"Local LLM Error: {str(e)}"
+
+@contextlib.asynccontextmanager
+async def _hold(semaphore, poll_s=0.05):
+    """Hold a `threading` semaphore from a coroutine without blocking its event loop."""
+    while not semaphore.acquire(blocking=False):
+        await asyncio.sleep(poll_s)
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+class AsyncOpenAILLM:
+    # One semaphore per server for the whole process: worker threads each run their own
+    # event loop (`asyncio.run`), so an asyncio.Semaphore would only limit one of them.
+    _semaphores = {}
+    _semaphores_lock = threading.Lock()
+    # AsyncOpenAI clients belong to the event loop their connections were opened on:
+    # one per loop and server, shared by every instance, closed by `aclose_clients`.
+    _clients = weakref.WeakKeyDictionary()
+
+    def __init__(self, api_key=None, base_url="http://localhost:11434/v1", model="starcoder2:3b", cache=None, max_concurrency=4, history_policy=None):
+        """
+        Asynchronous counterpart of OpenAILLM for fanning out independent requests.
+        At most `max_concurrency` requests per server are in flight at once across all
+        threads and event loops, and all instances talking to the same server from one
+        event loop reuse one connection pool (close it with `aclose_clients`).
+        """
+        self.api_key = api_key or "unused"  # Dummy key
+        self.base_url = base_url
+        self.model = model
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.history_policy = history_policy
+        self.message_history = []
+        self.call_log = []
+
+    def _client_and_semaphore(self):
+        per_loop = self._clients.setdefault(asyncio.get_running_loop(), {})
+        if self.base_url not in per_loop:
+            per_loop[self.base_url] = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+        with self._semaphores_lock:
+            if self.base_url not in self._semaphores:
+                self._semaphores[self.base_url] = threading.BoundedSemaphore(self.max_concurrency)
+            return per_loop[self.base_url], self._semaphores[self.base_url]
+
+    @classmethod
+    async def aclose_clients(cls):
+        """Close the clients opened on the running event loop; call before the loop ends."""
+        for client in cls._clients.pop(asyncio.get_running_loop(), {}).values():
+            await client.close()
+
+    async def _stream_completion(self, client, model, messages, max_tokens, temperature, stream_monitor, log_entry):
+        """Async counterpart of OpenAILLM._stream_completion."""
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **stream_options(),
+        )
+        log_entry["stream"] = "complete"
+        parts, usage = [], None
+        try:
+            async for chunk in stream:
+                text, chunk_usage = read_chunk(chunk)
+                usage = chunk_usage or usage
+                if text:
+                    parts.append(text)
+                    if check_stream(stream_monitor, "".join(parts), log_entry):
+                        break
+        finally:
+            await stream.close()
+        return "".join(parts), usage
+
+    async def query_llm(self, system_prompt, user_query, model=None, max_tokens=4096, temperature=0.7, use_cache=True, record_history=True, stream_monitor=None,
+                        response_format=None):
+        """
+        Same contract as OpenAILLM.query_llm. Pass `record_history=False` for fan-out
+        calls (e.g. several candidates) whose replies should not enter the conversation.
+        """
+        try:
+            messages = build_messages(system_prompt, user_query)
+
+            # Snapshot the history: concurrent calls on one instance all see the same context
+            full_messages, log_entry = select_messages(self, messages)
+            model = model or self.model
+
+            cache_key = None
+            reply = None
+            if self.cache is not None:
+                cache_key = ResponseCache.make_key(model, full_messages, temperature, max_tokens, response_format)
+                if use_cache:
+                    reply = self.cache.get(cache_key)
+
+            if reply is None:
+                client, semaphore = self._client_and_semaphore()
+                async with _hold(semaphore):
+                    if stream_monitor is not None:
+                        reply, usage = await self._stream_completion(client, model, full_messages, max_tokens, temperature,
+                                                                     stream_monitor, log_entry)
+                    else:
+                        response = await client.chat.completions.create(
+                            model=model,
+                            messages=full_messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            **({"response_format": response_format} if response_format is not None else {}),
+                        )
+                        reply, usage = response.choices[0].message.content, getattr(response, "usage", None)
+
+                reply = reply.strip()
+                record_usage(log_entry, usage, reply)
+                if cache_key is not None and log_entry.get("stream") != "aborted":
+                    self.cache.put(cache_key, reply)
+            else:
+                log_entry["cached"] = True
+
+            # Update history for next turn
+            if record_history:
+                self.message_history.extend(messages)
+                self.message_history.append({"role": "assistant", "content": reply})
+
+            annotate_span(**log_entry)
             return reply
 
         except Exception as e:
@@ -1,231 +1,883 @@
-from refAgent.java_metrics_calculator import JavaMetricsCalculator
-# Dependency graph removed due to javalang incompatibility with modern Java
-# from refAgent.dependency_graph import JavaClassDependencyAnalyzer, draw_dependency_graph
+from refAgent.java_metrics_calculator import JavaMetricsCalculator, MetricsCache
+# Dependency graph: test selection and the "dependents" scheduling factor (javalang cannot parse every modern Java file)
+from refAgent.dependency_graph import JavaClassDependencyAnalyzer
 from refAgent.utilities import *
+from refAgent.workspaces import create_workspace, discard_workspace, stop_mvnd_daemons
+from refAgent.pmd_scanner import stream_god_classes
+from refAgent.run_journal import ClassJournal, journal_path, read_journal
+from refAgent.tracing import span, configure_tracing, summarize_trace, format_summary
 from settings import Settings
 import argparse
-from refAgent.agents import PlannerAgent, RefactoringGeneratorAgent, CompilerAgent, TestAgent
+from refAgent.agents import PlannerAgent, RefactoringGeneratorAgent, CompilerAgent, TestAgent, get_response_cache
+from refAgent.javac_parser import precheck_refactoring, weighted_method_complexity
+from refAgent.ck_metrics import compute_ck_metrics
+from refAgent.OpenaiLLM import tokens_used
+from refAgent.refactoring_plan import needs_refactoring, flagged_methods, format_instructions
+from refAgent.method_refactoring import extract_methods, splice_methods
+from refAgent.prompt import METHOD_REFACTORING_PROMPT
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import math
+import queue
 import subprocess
+import threading
+import time
 import os
 import re
 
-# === Parse project name argument ===
-parser = argparse.ArgumentParser(description="Refactor Java Project")
-parser.add_argument("project_name", type=str, help="Name of the project folder (e.g. gson)")
-args = parser.parse_args()
-project_name = args.project_name
-
 config = Settings()
 
-if __name__ == "__main__":
-    # Prepare needed folders
+DESIGNITE_JAR = "./code_smells/DesigniteJava.jar"
+MAX_ITERATIONS = 20
+
+_metrics_cache = None
+_metrics_cache_lock = threading.Lock()
+
+
+def get_metrics_cache():
+    """Return the process-wide metrics cache, or None when caching is disabled."""
+    global _metrics_cache
+    with _metrics_cache_lock:
+        if config.METRICS_CACHE_ENABLED and _metrics_cache is None:
+            _metrics_cache = MetricsCache(config.METRICS_CACHE_PATH, max_entries=config.METRICS_CACHE_MAX_ENTRIES)
+    return _metrics_cache
+
+
+def count_metrics_cache_use(results: dict, calculator: JavaMetricsCalculator):
+    """Add the last metrics computation of `calculator` to the per-class cache hit/miss counts."""
+    if calculator.cache_hit is None:
+        return
+    counts = results.setdefault("Metrics cache", {"hits": 0, "misses": 0})
+    counts["hits" if calculator.cache_hit else "misses"] += 1
+
+
+class WorkerWorkspace:
+    """Paths owned by a single worker of the refactoring pipeline.
+
+    Without a `worker_id` (a single worker) the historical shared locations are used
+    (`projects/after/<project>` and `code_smells/project/{before,after}`). With several
+    workers each one, worker 0 included, gets its own workspace of the project (hardlink
+    tree or overlay, see workspaces.py) and its own Designite scratch folders, so concurrent
+    classes never write into the same tree and the shared after tree only ever receives
+    accepted refactorings.
+    """
+
+    def __init__(self, project_name: str, worker_id: int = None):
+        self.worker_id = worker_id
+        canonical_after = os.path.expanduser(f"~/projects/after/{project_name}")
+
+        if worker_id is None:
+            self.project_dir_after = canonical_after
+            scratch = "code_smells/project"
+            tmp = "./code_smells/tmp"
+        else:
+            self.project_dir_after = os.path.expanduser(f"~/projects/workers/{worker_id}/{project_name}")
+            scratch = f"code_smells/project/worker{worker_id}"
+            tmp = f"./code_smells/tmp/worker{worker_id}"
+
+        self.canonical_after = canonical_after
+        self.before_input = f"{scratch}/before"
+        self.before_output = f"{tmp}/before"
+        self.after_input = f"{scratch}/after"
+        self.after_output = f"{tmp}/after"
+
+    def prepare(self):
+        """Create the scratch folders and, with several workers, a private workspace of the project."""
+        for path in (self.before_input, self.before_output, self.after_input, self.after_output):
+            os.makedirs(path, exist_ok=True)
+
+        if self.project_dir_after != self.canonical_after:
+            strategy = create_workspace(self.canonical_after, self.project_dir_after, config.WORKSPACE_STRATEGY)
+            print(f"Worker {self.worker_id}: workspace {self.project_dir_after} ({strategy})")
+
+    def sync_published(self, relative_paths: list):
+        """Bring refactorings other workers published to the shared after tree into this workspace,
+        so candidates are compiled and tested together with every accepted refactoring so far."""
+        if self.project_dir_after == self.canonical_after:
+            return
+        for relative_path in relative_paths:
+            with open(os.path.join(self.canonical_after, relative_path), "r", encoding="utf-8") as f:
+                code = f.read()
+            target = os.path.join(self.project_dir_after, relative_path)
+            with open(target, "r", encoding="utf-8") as f:
+                if f.read() == code:
+                    continue
+            write_to_java_file(file_path=target, java_code=code)
+
+    def teardown(self):
+        """Discard the private workspace of a worker (constant time, see discard_workspace) and
+        stop the mvnd daemons of the shared after tree, which is kept."""
+        if self.project_dir_after != self.canonical_after:
+            discard_workspace(self.project_dir_after)
+        else:
+            stop_mvnd_daemons(self.project_dir_after, wait=False)
+
+    def after_path(self, before_file: str, project_directory: str) -> str:
+        """Map a file under `projects/before/<project>` to this worker's after tree."""
+        return os.path.join(self.project_dir_after, os.path.relpath(before_file, project_directory))
+
+    def canonical_after_path(self, before_file: str, project_directory: str) -> str:
+        """Map a file under `projects/before/<project>` to the shared after tree."""
+        return os.path.join(self.canonical_after, os.path.relpath(before_file, project_directory))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Refactor Java Project")
+    parser.add_argument("project_name", type=str, help="Name of the project folder (e.g. gson)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of god classes to refactor concurrently (default: 1)")
+    parser.add_argument("--select-tests", action="store_true",
+                        help="Run only the tests that reach the refactored class (dependency graph); "
+                             "the accepted candidate is still verified against the full suite")
+    parser.add_argument("--candidates", type=int, default=1,
+                        help="Candidates requested from the generator per iteration (best-of-N, default: 1)")
+    parser.add_argument("--build-top", type=int, default=1,
+                        help="With --candidates, how many screened candidates are built and tested per iteration (default: 1)")
+    parser.add_argument("--tag", type=str, default=None,
+                        help="Tag of the checked-out project, used to key PMD's analysis cache (default: git describe)")
+    parser.add_argument("--budget-minutes", type=float, default=None,
+                        help="Start no new god class after this many minutes; classes run highest priority first")
+    parser.add_argument("--budget-tokens", type=int, default=None,
+                        help="Start no new god class once the LLM calls have used this many tokens")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run: skip finished classes, resume partial ones from their journal")
+    parser.add_argument("--method-level", action="store_true",
+                        help="Send only the methods the planner flagged (with the class context) to the generator "
+                             "and splice the rewritten methods back into the class")
+    return parser.parse_args(argv)
+
+
+def project_tag(project_directory: str, tag: str = None) -> str:
+    """The tag of the analyzed checkout: `tag` when given, else `git describe`, else "untagged"."""
+    if tag:
+        return tag
+    result = subprocess.run(["git", "-C", project_directory, "describe", "--tags", "--always"],
+                            capture_output=True, text=True)
+    if result.returncode != 0 or not result.stdout.strip():
+        return "untagged"
+    return result.stdout.strip()
+
+
+def detect_god_classes(project_name: str, project_directory: str, tag: str = None):
+    """Yield (file path, PMD GodClass metrics) for the non-test god classes of the project as PMD reports them.
+
+    PMD's incremental cache is kept per project and tag under `data/pmd/cache/`.
+    """
+    safe_tag = re.sub(r"[^\w.-]", "_", project_tag(project_directory, tag))
+    cache_file = f"data/pmd/cache/{project_name}-{safe_tag}.cache"
+    for file_path, pmd_metrics in stream_god_classes(project_directory, report_file=f"data/pmd/{project_name}_god_classes.xml",
+                                                      cache_file=cache_file, log_file=f"data/pmd/{project_name}_pmd.log"):
+        if find_non_test_files([file_path]):
+            yield file_path, pmd_metrics
+
+
+def report_test_failure(target_class: str, refactoring_generator, process, results: dict):
+    """Feed a failed Maven test run back to the generator and record it in the results."""
+    test_summary = process.stderr.strip() or "Tests failed."
+    print(f"[{target_class}] Tests failed. Feeding back to model...")
+    try:
+        refactoring_generator.llm.message_history.append({"role": "user", "content": f"Test failures:\n{test_summary}"})
+    except:
+        pass
+    print("Test failure output:")
+    print(test_summary)
+    results["Compilation"] = True
+    results["Test passed"] = False
+    results["is improved"] = False
+
+
+def screen_candidates(original_code: str, candidates: list):
+    """Cheaply screen generated classes before any Maven build.
+
+    Returns:
+        (screened, rejected) - `screened` holds (code, local WMC) for candidates that
+        parse and keep the public API, most promising (lowest WMC, then shortest) first;
+        `rejected` holds (code, feedback) for the others.
+    """
+    screened, rejected = [], []
+    for code in candidates:
+        is_valid, feedback = precheck_refactoring(original_code, code)
+        if is_valid:
+            screened.append((code, weighted_method_complexity(code)))
+        else:
+            rejected.append((code, feedback))
+    screened.sort(key=lambda item: (item[1], len(item[0])))
+    return screened, rejected
+
+
+def priority_factors(file: str, pmd_metrics: dict = None, class_metrics: dict = None,
+                     dependency_analyzer: JavaClassDependencyAnalyzer = None) -> dict:
+    """Collect the metrics a god class is prioritized by: WMC, LCOM, LOC and number of dependents.
+
+    PMD's WMC and the Designite batch metrics are used when available; the rest is
+    computed in-process from the source (see ck_metrics.py).
+    """
+    target_class = extract_class_name(file)
+    factors = {"WMC": (pmd_metrics or {}).get("WMC"), "LCOM": None, "LOC": None, "dependents": 0}
+
+    type_metrics = (class_metrics or {}).get(target_class, {}).get("Class Metrics", {})
+    factors["LCOM"] = type_metrics.get("Lack of Cohesion of Methods (LCOM)")
+    factors["LOC"] = type_metrics.get("Lines of Code (LOC)")
+    if factors["WMC"] is None:
+        factors["WMC"] = type_metrics.get("Weighted Methods per Class (WMC)")
+    for key in ("WMC", "LCOM", "LOC"):
+        if isinstance(factors[key], float) and math.isnan(factors[key]):
+            factors[key] = None  # column missing from the Designite output
+
+    if None in (factors["WMC"], factors["LCOM"], factors["LOC"]):
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                code = f.read()
+            ck = compute_ck_metrics(code).get(target_class, {}).get("class_metrics", {})
+        except Exception:  # javalang cannot parse every modern Java construct
+            ck = {}
+        for key, name in (("WMC", "Weighted Methods per Class (WMC)"), ("LCOM", "Lack of Cohesion of Methods (LCOM)"),
+                          ("LOC", "Lines of Code (LOC)")):
+            if factors[key] is None:
+                factors[key] = ck.get(name, 0)
+
+    if dependency_analyzer is not None and target_class:
+        factors["dependents"] = len(dependency_analyzer.find_dependent_classes(target_class, file))
+    return factors
+
+
+def priority_score(factors: dict) -> float:
+    """Expected payoff of refactoring a class: weighted sum of log-scaled WMC, LOC and dependents plus LCOM.
+
+    The weights come from `Settings.SCHEDULER_WEIGHTS`; LCOM is in [0, 1] (-1, "not applicable", counts as 0).
+    """
+    weights = config.SCHEDULER_WEIGHTS
+    lcom = factors.get("LCOM") or 0
+    return (weights.get("WMC", 0) * math.log1p(max(factors.get("WMC") or 0, 0))
+            + weights.get("LCOM", 0) * (lcom if not math.isnan(lcom) and lcom > 0 else 0)
+            + weights.get("LOC", 0) * math.log1p(max(factors.get("LOC") or 0, 0))
+            + weights.get("dependents", 0) * math.log1p(factors.get("dependents") or 0))
+
+
+class GodClassScheduler:
+    """Hands god classes to the workers highest score first, within an optional time and token budget.
+
+    Classes are added while PMD streams them in. Without a budget a worker takes the best
+    class known so far; with a budget, workers wait until the scan is complete (`close`) so
+    the budget is spent on the best classes overall. Once the budget is exhausted no new
+    class is started and the remaining ones are recorded as skipped.
+    """
+
+    def __init__(self, budget_minutes: float = None, budget_tokens: int = None):
+        self.deadline = time.monotonic() + budget_minutes * 60 if budget_minutes else None
+        self.budget_tokens = budget_tokens
+        self.tokens = 0
+        self.wait_for_all = bool(budget_minutes or budget_tokens)
+        self.entries = {}  # file -> {"score", "factors", "status"}
+        self._heap = []
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def add(self, file: str, factors: dict):
+        score = priority_score(factors)
+        with self._condition:
+            self.entries[file] = {"score": round(score, 3), "factors": factors, "status": "queued"}
+            heapq.heappush(self._heap, (-score, len(self.entries), file))
+            self._condition.notify()
+
+    def close(self):
+        """No more classes will be added."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def record_tokens(self, tokens: int):
+        with self._condition:
+            self.tokens += tokens
+
+    def budget_exhausted(self) -> str:
+        """The exhausted budget ("time" or "tokens"), or an empty string."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "time"
+        if self.budget_tokens is not None and self.tokens >= self.budget_tokens:
+            return "tokens"
+        return ""
+
+    def next(self):
+        """Block until a class is available and return it; None when all are handed out or the budget is spent."""
+        with self._condition:
+            while not self._closed and (not self._heap or self.wait_for_all):
+                self._condition.wait()
+            exhausted = self.budget_exhausted()
+            if exhausted:
+                while self._heap:
+                    _, _, file = heapq.heappop(self._heap)
+                    self.entries[file]["status"] = f"skipped ({exhausted} budget exhausted)"
+                return None
+            if not self._heap:
+                return None
+            _, _, file = heapq.heappop(self._heap)
+            self.entries[file]["status"] = "processed"
+            return file
+
+    def summary(self) -> list:
+        """Every class with its score, factors and status, highest score first."""
+        with self._condition:
+            return sorted(({"file": file, **entry} for file, entry in self.entries.items()),
+                          key=lambda entry: -entry["score"])
+
+
+def process_god_class(file: str, project_name: str, project_directory: str, workspace: WorkerWorkspace,
+                      dependency_analyzer: JavaClassDependencyAnalyzer = None, candidates: int = 1, build_top: int = 1,
+                      before_metrics: dict = None, pmd_metrics: dict = None, resume: bool = False,
+                      method_level: bool = False, on_tokens=None) -> dict:
+    """Run the metrics → planner → generator/compile/test pipeline for one god class.
+
+    `before_metrics` are the class metrics from the batch phase; when missing or empty
+    they are computed here for this class alone. `pmd_metrics` are the WMC/ATFD/TCC values
+    PMD reported for the class.
+
+    When `dependency_analyzer` is given, each candidate is tested only against the
+    test classes that reach the god class; the accepted candidate is then checked
+    against the full suite. With `candidates` > 1, each iteration asks for that many
+    candidates in parallel, screens them locally and builds only the `build_top` best.
+
+    With `method_level`, the generator gets only the methods flagged by the plan plus the
+    class context and returns those methods, which are spliced back into the class (see
+    method_refactoring.py); without a parsed plan the full class is sent as usual.
+
+    Progress is checkpointed in `results/<project>/<class>/journal.json` (see run_journal.py).
+    With `resume`, a finished class is skipped and a partial one continues from its last
+    iteration with the saved plan, candidates and conversation instead of new LLM calls.
+
+    `on_tokens` is called once with the LLM tokens the class consumed, also when it ends
+    early or raises.
+
+    Returns the per-class results dictionary, which is also exported to
+    `results/<project>/<class>/metrics.json`.
+    """
     results = {}
-    os.makedirs(f"results/{project_name}", exist_ok=True)
-    os.makedirs(f"data/paths/{project_name}", exist_ok=True)
-    os.makedirs("data/pmd", exist_ok=True)
-
-    # PMD Integration: Run PMD to detect god classes first
-    pmd_bin_path = os.path.expanduser("~/pmd-bin-7.19.0/bin/pmd")
-    project_directory = os.path.expanduser(f"~/projects/before/{project_name}")
-    pmd_output_file = f"data/pmd/{project_name}_god_classes.txt"
-
-    pmd_command = [
-        pmd_bin_path,
-        "check",
-        "-d", project_directory,
-        "-R", "category/java/design.xml/GodClass",
-        "-f", "text"
-    ]
-
-    print(f"Running PMD on {project_directory} to detect god classes...")
-    with open(pmd_output_file, "w") as output:
-        result = subprocess.run(pmd_command, stdout=output, stderr=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            print("PMD warning/error:", result.stderr)
-
-    print(f"PMD output saved to {pmd_output_file}")
-
-    # Parse PMD output to extract unique god class file paths
-    god_class_files = set()
-    with open(pmd_output_file, "r") as f:
-        for line in f:
-            match = re.match(r"^(.*?):\d+:\s*GodClass:", line)
-            if match:
-                file_path = match.group(1)
-                god_class_files.add(file_path)
-
-    god_class_files = find_non_test_files(list(god_class_files))
-
-    if not god_class_files:
-        print(f"No god classes detected in {project_name}. Skipping refactoring.")
+    target_class = extract_class_name(file)
+    class_directory = os.path.dirname(file)
+
+    if target_class is None:
+        print(f"Could not extract class name from {file}. Skipping.")
+        return results
+
+    os.makedirs(f"results/{project_name}/{target_class}", exist_ok=True)
+    journal = ClassJournal(journal_path(project_name, target_class), file, resume=resume)
+    if journal.finished:
+        print(f"[{target_class}] Finished in a previous run. Skipping.")
+        return journal.state.get("results", {})
+    results = journal.state.get("results", results)
+    if pmd_metrics:
+        results["PMD metrics"] = pmd_metrics
+
+    # === Metrics: Before refactoring (usually precomputed by the batch phase) ===
+    before_calculator = JavaMetricsCalculator(workspace.before_input, workspace.before_output, DESIGNITE_JAR,
+                                              backend=config.METRICS_BACKEND, cache=get_metrics_cache())
+    before_calculator.parse_java_code(file)
+    before_metrics = before_metrics or journal.state.get("before_metrics")
+    if before_metrics:
+        before_calculator.load_metrics(before_metrics)
     else:
-        print(f"Detected {len(god_class_files)} god classes. Proceeding with RefAgent...")
+        copy_file(class_directory, workspace.before_input, target_class + ".java")
+        before_metrics = before_calculator.compute_metrics_for_class()
+        count_metrics_cache_use(results, before_calculator)
+        if config.METRICS_CROSS_CHECK and config.METRICS_BACKEND == "python":
+            results["Metrics cross-check mismatches"] = before_calculator.cross_check()
+        before_calculator.clean_repository()
+
+    Before_java_code = before_calculator.java_code
+    results["CKO metrics"] = before_metrics
+    if journal.state["status"] == "started":
+        journal.update(status="metrics", before_metrics=before_metrics, results=results)
+
+    path_to_java_file_after = workspace.after_path(file, project_directory)
+
+    # === Agents (local model only) ===
+    api_key = config.API_KEY  # "unused" for Ollama
+    planner = PlannerAgent(api_key, model=config.MODEL_NAME)
+    refactoring_generator = RefactoringGeneratorAgent(api_key, model=config.MODEL_NAME)
+    compiler = CompilerAgent(api_key, model=config.MODEL_NAME)
+    test_agent = TestAgent(api_key, model=config.MODEL_NAME)
+    agents = (planner, refactoring_generator, compiler, test_agent)
+
+    try:
+        if "instruction" in journal.state:
+            # Resumed: reuse the saved plan and decision
+            Instruction = journal.state["instruction"]
+            plan = journal.state.get("plan")
+            do_refactor = journal.state["decision"]
+            planner.llm.message_history[:] = journal.state.get("planner_history", [])
+            print(f"[{target_class}] Resuming with the saved plan")
+        else:
+            with span("plan", target_class=target_class) as attributes:
+                # Planner: structured per-method plan
+                plan, plan_reply = planner.plan_methods(before_calculator.java_code, before_calculator.as_string())
+                if plan is not None:
+                    # Decided locally; only the flagged methods' instructions go to the generator
+                    do_refactor = needs_refactoring(plan)
+                    Instruction = format_instructions(plan)
+                    attributes.update(methods=len(plan), flagged=len(flagged_methods(plan)))
+                else:
+                    print(f"[{target_class}] Could not parse the plan, asking the planner whether to refactor")
+                    Instruction = plan_reply
+                    decision_query = f"""
+                    From this set of instructions, does at least one method need improvement?
+                    Instruction: {Instruction}
+                    Answer only True or False.
+                    """
+                    do_refactor = 'true' in planner.decide(decision_query).lower()
+            journal.update(status="planned", instruction=Instruction, plan=plan, decision=do_refactor,
+                           planner_history=planner.llm.message_history, results=results)
+        results["Instruction"] = Instruction
+        if plan is not None:
+            results["Plan"] = plan
+
+        if isinstance(do_refactor, str):
+            # Journals written before structured plans hold the planner's raw True/False reply
+            do_refactor = 'true' in do_refactor.lower()
+        if not do_refactor:
+            print(f"No refactoring needed for {target_class}")
+            write_to_java_file(file_path=path_to_java_file_after, java_code=Before_java_code)
+            journal.update(status="done", verdict=False, results=results)
+            return results
+
+        # === Test selection from the dependency graph ===
+        selected_tests = None
+        if dependency_analyzer is not None:
+            # Qualified names as Surefire path patterns (com/example/FooTest), understood by old and new Surefire versions
+            selected_tests = [name.replace(".", "/") for name in dependency_analyzer.find_affected_tests(target_class, file)]
+            total_tests = len(dependency_analyzer.list_test_classes())
+            print(f"[{target_class}] Selected {len(selected_tests)} of {total_tests} test classes from the dependency graph")
+            results["Selected tests"] = len(selected_tests)
+            results["Total tests"] = total_tests
+            if not selected_tests:
+                print(f"[{target_class}] No dependent tests found, falling back to the full test suite")
+
+        # === Iterative Refactoring Loop (max 20) ===
+        project_dir_after = workspace.project_dir_after
+        write_to_java_file(file_path=f"results/{project_name}/{target_class}/original_java_code.java", java_code=Before_java_code)
+
+        def evaluate_candidate(improvement: str) -> bool:
+            """Build, test and judge one screened candidate; True when it is accepted."""
+            # Save improved version
+            write_to_java_file(file_path=path_to_java_file_after, java_code=improvement)
+
+            # === Compile ===
+            print(f"[{target_class}] Compiling improved code...")
+            is_compiled, compile_summary = compiler.compile_and_summarize(project_dir_after, Before_java_code, improvement, changed_file=path_to_java_file_after)
+            # Candidates rejected by the javac fast path never reach Maven
+            counter = "Maven builds" if compiler.last_compiler == "maven" else "javac rejections"
+            results[counter] = results.get(counter, 0) + 1
+
+            if not is_compiled:
+                print(f"[{target_class}] Compilation failed. Feeding back to model...")
+                try:
+                    refactoring_generator.llm.message_history.append({"role": "user", "content": f"Compilation errors:\n{compile_summary}"})
+                except:
+                    pass
+                print("LLM compilation summary:")
+                print(compile_summary)
+                return False
+
+            # === Test (selected tests, or the full suite) ===
+            if selected_tests:
+                print(f"[{target_class}] Running {len(selected_tests)} selected test classes...")
+                process = run_maven_test(selected_tests, project_dir=project_dir_after,
+                                         backend=config.MAVEN_BACKEND, timeout=config.MAVEN_TEST_TIMEOUT)
+            else:
+                print(f"[{target_class}] Running full test suite...")
+                process = run_maven_test(project_dir=project_dir_after, backend=config.MAVEN_BACKEND, timeout=config.MAVEN_TEST_TIMEOUT)
 
-    # Process only god classes
-    for file in god_class_files:
-        try:
-            target_class = extract_class_name(file)
-            class_directory = os.path.dirname(file)
+            if process.returncode != 0:
+                report_test_failure(target_class, refactoring_generator, process, results)
+                return False
 
-            if target_class is None:
-                print(f"Could not extract class name from {file}. Skipping.")
-                continue
+            print(f"[{target_class}] Compilation and tests PASSED!")
 
-            os.makedirs(f"results/{project_name}/{target_class}", exist_ok=True)
+            # === After metrics ===
+            write_to_java_file(file_path=f"{workspace.after_input}/{target_class}.java", java_code=improvement)
+            after_calculator = JavaMetricsCalculator(workspace.after_input, workspace.after_output, DESIGNITE_JAR,
+                                                     backend=config.METRICS_BACKEND, cache=get_metrics_cache())
+            after_calculator.parse_java_code(path_to_java_file_after)
+            after_metrics = after_calculator.compute_metrics_for_class()
+            count_metrics_cache_use(results, after_calculator)
+            after_calculator.clean_repository()
 
-            # === Metrics: Before refactoring ===
-            input_path = "code_smells/project/before"
-            output_path = "./code_smells/tmp/before"
-            designite_jar = "./code_smells/DesigniteJava.jar"
+            # === Improvement check via LLM ===
+            improvement_query = f"""
+            Compare these two versions and their CKO metrics.
+            Has code quality, readability, maintainability improved?
 
-            os.makedirs(input_path, exist_ok=True)
-            os.makedirs(output_path, exist_ok=True)
+            Before:
+            {Before_java_code}
+            Metrics: {before_metrics}
 
-            copy_file(class_directory, input_path, target_class + ".java")
+            After:
+            {improvement}
+            Metrics: {after_metrics}
 
-            before_calculator = JavaMetricsCalculator(input_path, output_path, designite_jar)
-            before_calculator.parse_java_code(file)
-            before_metrics = before_calculator.compute_metrics_for_class()
-            before_calculator.clean_repository()
+            Answer only True or False.
+            """
+            with span("judge", target_class=target_class):
+                is_better = planner.decide(improvement_query)
+            if 'true' not in str(is_better).lower():
+                print(f"[{target_class}] No improvement detected. Continuing...")
+                results["is improved"] = False
+                return False
+
+            if selected_tests:
+                # Selected tests only approximate the impact; verify the final candidate on the full suite
+                print(f"[{target_class}] Verifying accepted candidate against the full test suite...")
+                process = run_maven_test(project_dir=project_dir_after, backend=config.MAVEN_BACKEND, timeout=config.MAVEN_TEST_TIMEOUT)
+                if process.returncode != 0:
+                    report_test_failure(target_class, refactoring_generator, process, results)
+                    return False
+
+            print(f"Successful improvement for {target_class}!")
+            # Candidates are only packaged; the accepted one is installed for later module builds
+            process = install_module(project_dir_after, path_to_java_file_after, offline=config.MAVEN_OFFLINE,
+                                     backend=config.MAVEN_BACKEND, timeout=config.MAVEN_COMPILE_TIMEOUT)
+            if process.returncode != 0:
+                print(f"[{target_class}] Could not install the accepted module into the local repository: "
+                      f"{(process.stdout + process.stderr).strip()[-500:]}")
+            results["Compilation"] = True
+            results["Test passed"] = True
+            results["is improved"] = True
+            results["CKO metrics After"] = after_metrics
+            return True
+
+        # === Method-level generation: only the flagged methods and the class context go to the model ===
+        method_extract = None
+        if method_level and plan is not None:
+            method_extract = extract_methods(Before_java_code, flagged_methods(plan), target_class)
+            if method_extract is None:
+                print(f"[{target_class}] Could not extract the flagged methods, sending the full class")
+            else:
+                print(f"[{target_class}] Method-level refactoring of {', '.join(method_extract['targets'])}")
+                results["Method-level targets"] = method_extract["targets"]
+        generator_prompt = METHOD_REFACTORING_PROMPT if method_extract is not None else None
+
+        def checkpoint_iteration(next_iteration: int):
+            """Record that iteration `next_iteration` - 1 was evaluated without an accepted candidate."""
+            journal.update(status="iterating", iteration=next_iteration, generated=None,
+                           generator_history=refactoring_generator.llm.message_history, results=results)
+
+        accepted_code = None
+        start_iteration = journal.state.get("iteration", 0)
+        if "generator_history" in journal.state:
+            refactoring_generator.llm.message_history[:] = journal.state["generator_history"]
+            print(f"[{target_class}] Resuming at iteration {start_iteration + 1}")
+        for i in range(start_iteration, MAX_ITERATIONS):
+            print(f"--- Refactoring iteration {i+1}/{MAX_ITERATIONS} for {target_class} ---")
+
+            if method_extract is not None:
+                query = f"""
+            Instructions: {Instruction}
+            CKO Metrics: {before_metrics}
+            Improve only the following methods of {target_class} while preserving behavior, syntax, semantics, comments, and annotations.
+            Keep their signatures and do not alter external method behavior.
+            Return only the improved methods, and any new private helpers, in a code block.
+
+            Class context:
+            {method_extract["context"]}
+
+            Methods to improve:
+            {method_extract["methods"]}
+            """
+            else:
+                query = f"""
+            Instructions: {Instruction}
+            CKO Metrics: {before_metrics}
+            Improve the following Java class while preserving behavior, syntax, semantics, comments, and annotations.
+            Do not alter external method behavior.
+            Return only the full improved Java class in a code block.
+
+            Original code:
+            {Before_java_code}
+            """
 
-            Before_java_code = before_calculator.java_code
-            results["CKO metrics"] = before_metrics
+            if journal.state.get("generated") and journal.state.get("iteration") == i:
+                # Resumed: candidates of this iteration were generated before the interruption
+                generated = journal.state["generated"]
+                abort_reasons = journal.state.get("abort_reasons") or [None] * len(generated)
+                print(f"[{target_class}] Re-evaluating {len(generated)} saved candidate(s)")
+            else:
+                # Retries need fresh samples, so only the first request may be answered from the LLM cache
+                with span("generate", target_class=target_class, iteration=i + 1, candidates=candidates):
+                    if candidates > 1:
+                        generated = refactoring_generator.generate_candidates(query, candidates, use_cache=(i == 0),
+                                                                              prompt_override=generator_prompt)
+                    else:
+                        generated = [refactoring_generator.run(query, use_refactoring_generator_prompt=True, prompt_override=generator_prompt,
+                                                               use_cache=(i == 0))]
+                abort_reasons = refactoring_generator.abort_reasons(len(generated))
+                if refactoring_generator.llm.call_log:
+                    prompt_size = refactoring_generator.llm.call_log[-1]
+                    print(f"[{target_class}] Generator prompt ~{prompt_size['estimated_prompt_tokens']} tokens "
+                          f"(full history would be ~{prompt_size['unbounded_prompt_tokens']})")
+                journal.update(status="iterating", iteration=i, generated=generated, abort_reasons=abort_reasons,
+                               generator_history=refactoring_generator.llm.message_history, results=results)
+
+            # Method-level replies are spliced into the class; the history keeps the reply itself.
+            # Replies cancelled while streaming are truncated: rejected with the reason, not a parse error
+            classes, early_rejected, reply_for = [], [], {}
+            for k, reply in enumerate(generated):
+                improvement, early_feedback = reply, ""
+                if abort_reasons[k]:
+                    early_feedback = f"Reply cancelled: {abort_reasons[k]}."
+                elif method_extract is not None:
+                    improvement, early_feedback = splice_methods(Before_java_code, reply, method_extract["targets"], target_class)
+                suffix = f"_cand{k+1}" if candidates > 1 else ""
+                write_to_java_file(file_path=f"results/{project_name}/{target_class}/improved_java_code_iter{i+1}{suffix}.java",
+                                   java_code=improvement or reply)
+                if early_feedback:
+                    early_rejected.append((reply, early_feedback))
+                else:
+                    classes.append(improvement)
+                    reply_for[improvement] = reply
+
+            # === Syntax / public API pre-check and local ranking (no Maven) ===
+            screened, rejected = screen_candidates(Before_java_code, classes)
+            rejected = early_rejected + [(reply_for[improvement], feedback) for improvement, feedback in rejected]
+            results["Pre-check rejections"] = results.get("Pre-check rejections", 0) + len(rejected)
+            if not screened:
+                improvement, precheck_feedback = rejected[0]
+                print(f"[{target_class}] Pre-check failed for all {len(generated)} candidate(s), skipping build. Feeding back to model...")
+                print(precheck_feedback)
+                if candidates > 1:
+                    refactoring_generator.record_candidate(query, improvement, prompt_override=generator_prompt)
+                refactoring_generator.llm.message_history.append({"role": "user", "content": f"Rejected before compilation:\n{precheck_feedback}"})
+                checkpoint_iteration(i + 1)
+                continue
 
-            path_to_java_file = file
-            path_to_java_file_after = path_to_java_file.replace("before", "after")
+            if candidates > 1:
+                print(f"[{target_class}] {len(screened)}/{len(generated)} candidates passed the pre-check; "
+                      f"building the best {min(build_top, len(screened))} (local WMC: {[wmc for _, wmc in screened]})")
+
+            for improvement, _ in screened[:build_top]:
+                if candidates > 1:
+                    refactoring_generator.record_candidate(query, reply_for[improvement], prompt_override=generator_prompt)
+                with span("evaluate", target_class=target_class, iteration=i + 1) as attributes:
+                    attributes["accepted"] = evaluate_candidate(improvement)
+                if attributes["accepted"]:
+                    accepted_code = improvement
+                    break
 
-            # === Agents (local model only) ===
-            api_key = config.API_KEY  # "unused" for Ollama
-            planner = PlannerAgent(api_key, model=config.MODEL_NAME)
-            refactoring_generator = RefactoringGeneratorAgent(api_key, model=config.MODEL_NAME)
-            compiler = CompilerAgent(api_key, model=config.MODEL_NAME)
-            test_agent = TestAgent(api_key, model=config.MODEL_NAME)
+            if accepted_code is not None:
+                results["Iterations"] = i + 1
+                break
+            checkpoint_iteration(i + 1)
+
+        else:
+            print(f"Max iterations reached for {target_class} without success.")
+
+        # Restore original if no success
+        if results.get("is improved") != True:
+            write_to_java_file(file_path=path_to_java_file_after, java_code=Before_java_code)
+        elif path_to_java_file_after != workspace.canonical_after_path(file, project_directory):
+            # Publish the accepted refactoring from the worker copy to the shared after tree
+            write_to_java_file(file_path=workspace.canonical_after_path(file, project_directory), java_code=accepted_code)
+
+        # Save final results
+        results["Generator prompt tokens"] = refactoring_generator.llm.call_log
+        results["LLM tokens"] = sum(tokens_used(agent.llm.call_log) for agent in agents)
+        export_dict_to_json(results, f"results/{project_name}/{target_class}/metrics.json")
+        journal.update(status="done", generated=None, accepted_code=accepted_code,
+                       verdict=results.get("is improved") == True, results=results)
+        return results
+    finally:
+        # Counted however the class ends: accepted, rejected, "no refactoring needed" or an exception
+        results["LLM tokens"] = sum(tokens_used(agent.llm.call_log) for agent in agents)
+        if on_tokens is not None:
+            on_tokens(results["LLM tokens"])
+
+
+def skip_or_reset_for_resume(project_name: str, project_directory: str, file: str) -> bool:
+    """With --resume: True when the class finished in a previous run. For a class that was
+    interrupted, the original code is put back in the shared after tree, since the
+    interruption may have left an unverified candidate there."""
+    target_class = extract_class_name(file)
+    state = read_journal(journal_path(project_name, target_class), file) if target_class else {}
+    if state.get("status") == "done":
+        print(f"[{target_class}] Finished in a previous run. Skipping.")
+        return True
+    if state:
+        with open(file, "r", encoding="utf-8") as f:
+            original_code = f.read()
+        write_to_java_file(file_path=WorkerWorkspace(project_name).canonical_after_path(file, project_directory),
+                           java_code=original_code)
+    return False
+
+
+def verify_published(project_name: str, published: list) -> dict:
+    """Build and test the shared after tree once all workers are done.
+
+    Each worker tested its candidates in its own workspace, which holds only the refactorings
+    published before its class started; this run checks all accepted refactorings together.
+    The outcome is exported to `results/<project>/integration.json`.
+    """
+    project_dir_after = os.path.expanduser(f"~/projects/after/{project_name}")
+    print(f"Verifying the {len(published)} accepted refactoring(s) together in {project_dir_after}...")
+    report = {"refactored files": published, "compiled": False, "tests passed": False}
+    with span("integration", classes=len(published)) as attributes:
+        process = compile_project_with_maven(project_dir_after, backend=config.MAVEN_BACKEND, timeout=config.MAVEN_COMPILE_TIMEOUT)
+        report["compiled"] = process.returncode == 0
+        if report["compiled"]:
+            process = run_maven_test(project_dir=project_dir_after, backend=config.MAVEN_BACKEND, timeout=config.MAVEN_TEST_TIMEOUT)
+            report["tests passed"] = process.returncode == 0
+        attributes.update(compiled=report["compiled"], tests_passed=report["tests passed"])
+    if not report["tests passed"]:
+        print(f"The accepted refactorings do not {'pass the tests' if report['compiled'] else 'compile'} together; "
+              f"review {', '.join(published)} in {project_dir_after}")
+        print(process.stdout[-2000:] + process.stderr[-2000:])
+    else:
+        print("The accepted refactorings compile and pass the tests together.")
+    export_dict_to_json(report, f"results/{project_name}/integration.json")
+    return report
 
-            # Planner: Generate improvement instructions
-            Instruction = planner.analyze_methods(before_calculator.java_code, before_calculator.as_string())
-            results["Instruction"] = Instruction
 
-            # Decide if refactoring is needed
-            decision_query = f"""
-            From this set of instructions, does at least one method need improvement?
-            Instruction: {Instruction}
-            Answer only True or False.
-            """
-            do_refactor = planner.send(None, decision_query)
-            if 'true' not in do_refactor.lower():
-                print(f"No refactoring needed for {target_class}")
-                write_to_java_file(file_path=path_to_java_file_after, java_code=Before_java_code)
-                continue
+def main(argv=None):
+    args = parse_args(argv)
+    project_name = args.project_name
+    workers = max(1, args.workers)
 
-            # === Iterative Refactoring Loop (max 20) ===
-            project_dir_after = os.path.expanduser(f"~/projects/after/{project_name}")
+    # Prepare needed folders
+    os.makedirs(f"results/{project_name}", exist_ok=True)
+    os.makedirs(f"data/paths/{project_name}", exist_ok=True)
+    os.makedirs("data/pmd", exist_ok=True)
 
-            for i in range(20):
-                print(f"--- Refactoring iteration {i+1}/20 for {target_class} ---")
+    project_directory = os.path.expanduser(f"~/projects/before/{project_name}")
 
-                query = f"""
-                Instructions: {Instruction}
-                CKO Metrics: {before_metrics}
-                Improve the following Java class while preserving behavior, syntax, semantics, comments, and annotations.
-                Do not alter external method behavior.
-                Return only the full improved Java class in a code block.
-
-                Original code:
-                {Before_java_code}
-                """
-
-                improvement = refactoring_generator.run(query, use_refactoring_generator_prompt=True)
-
-                # Save improved version
-                write_to_java_file(file_path=path_to_java_file_after, java_code=improvement)
-                write_to_java_file(file_path=f"results/{project_name}/{target_class}/original_java_code.java", java_code=Before_java_code)
-                write_to_java_file(file_path=f"results/{project_name}/{target_class}/improved_java_code_iter{i+1}.java", java_code=improvement)
-
-                # === Compile ===
-                print("Compiling improved code...")
-                is_compiled, compile_summary = compiler.compile_and_summarize(project_dir_after, Before_java_code, improvement)
-
-                if not is_compiled:
-                    print("Compilation failed. Feeding back to model...")
-                    try:
-                        refactoring_generator.llm.message_history.append({"role": "user", "content": f"Compilation errors:\n{compile_summary}"})
-                    except:
-                        pass
-                    print("LLM compilation summary:")
-                    print(compile_summary)
-                    continue  # Next iteration
-
-                # === Test (full suite, since graph skipped) ===
-                print("Running full test suite...")
-                process = run_maven_test(project_dir=project_dir_after)
+    # One JSONL trace per run; the per-stage summary is exported at the end
+    trace_path = None
+    if config.TRACING_ENABLED:
+        trace_path = f"results/{project_name}/traces/{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        configure_tracing(trace_path)
+
+    # Also built without --select-tests while the scheduler weighs dependents; the persistent
+    # index re-parses only the files changed since the previous run
+    dependency_analyzer = None
+    if args.select_tests or config.SCHEDULER_WEIGHTS.get("dependents"):
+        print(f"Building dependency graph of {project_directory}...")
+        dependency_analyzer = JavaClassDependencyAnalyzer(None)
+        with span("dependency_graph"):
+            dependency_analyzer.analyze_project(project_directory, index_path=f"data/index/{project_name}.sqlite")
+        if dependency_analyzer.parse_errors:
+            print(f"{len(dependency_analyzer.parse_errors)} files could not be parsed; see data/index/{project_name}_parse_errors.json")
+            export_dict_to_json(dependency_analyzer.parse_errors, f"data/index/{project_name}_parse_errors.json")
+
+    # PMD Integration: god classes enter the pipeline as PMD reports them
+    god_classes = {}  # file path -> PMD GodClass metrics (WMC, ATFD, TCC)
+
+    def detected_god_classes():
+        for file_path, pmd_metrics in detect_god_classes(project_name, project_directory, args.tag):
+            god_classes[file_path] = pmd_metrics
+            print(f"God class detected: {file_path} {pmd_metrics}")
+            yield file_path
+
+    god_class_stream = detected_god_classes()
+
+    # Batch "before" metrics: one Designite run for every god class instead of one per class
+    before_metrics_by_file = {}
+    if config.METRICS_BACKEND == "designite":
+        # The batch needs the complete list, so wait for the scan to finish
+        god_class_stream = list(god_class_stream)
+        if god_class_stream:
+            batch_calculator = JavaMetricsCalculator("code_smells/project/batch/before", "./code_smells/tmp/batch/before",
+                                                     DESIGNITE_JAR, backend=config.METRICS_BACKEND, cache=get_metrics_cache())
+            os.makedirs(batch_calculator.output_path, exist_ok=True)
+            before_metrics_by_file = batch_calculator.compute_metrics_for_files(god_class_stream)
+
+    # One workspace per worker, all created from the untouched after tree before the first class
+    # starts; a class borrows a free workspace for its whole pipeline
+    workspaces = [WorkerWorkspace(project_name)] if workers == 1 else [WorkerWorkspace(project_name, k) for k in range(workers)]
+    free_workspaces = queue.Queue()
+    for workspace in workspaces:
+        workspace.prepare()
+        free_workspaces.put(workspace)
+
+    # Files of the accepted refactorings published to the shared after tree, relative to the project
+    published = []
+    published_lock = threading.Lock()
+
+    def run_with_workspace(file):
+        workspace = free_workspaces.get()
+        try:
+            with published_lock:
+                workspace.sync_published(published)
+            results = process_god_class(file, project_name, project_directory, workspace,
+                                        dependency_analyzer if args.select_tests else None,
+                                        candidates=max(1, args.candidates), build_top=max(1, args.build_top),
+                                        before_metrics=before_metrics_by_file.get(file), pmd_metrics=god_classes.get(file),
+                                        resume=args.resume, method_level=args.method_level,
+                                        on_tokens=scheduler.record_tokens)
+            if results.get("is improved") == True:
+                with published_lock:
+                    published.append(os.path.relpath(file, project_directory))
+            return results
+        finally:
+            free_workspaces.put(workspace)
+
+    # Classes are handed out by priority score, within the optional time/token budget
+    scheduler = GodClassScheduler(budget_minutes=args.budget_minutes, budget_tokens=args.budget_tokens)
+
+    def worker_loop():
+        while (file := scheduler.next()) is not None:
+            try:
+                with span("class", file=file) as attributes:
+                    results = run_with_workspace(file)
+                    attributes.update(improved=results.get("is improved") == True, iterations=results.get("Iterations"),
+                                      llm_tokens=results.get("LLM tokens", 0))
+            except Exception as e:
+                print(f"Error processing {file}: {e}")
 
-                if process.returncode != 0:
-                    test_summary = process.stderr.strip() or "Tests failed."
-                    print("Tests failed. Feeding back to model...")
-                    try:
-                        refactoring_generator.llm.message_history.append({"role": "user", "content": f"Test failures:\n{test_summary}"})
-                    except:
-                        pass
-                    print("Test failure output:")
-                    print(test_summary)
-                    results["Compilation"] = True
-                    results["Test passed"] = False
-                    results["is improved"] = False
+    # Process only god classes
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        worker_futures = [executor.submit(worker_loop) for _ in range(workers)]
+        try:
+            for file in god_class_stream:
+                if args.resume and skip_or_reset_for_resume(project_name, project_directory, file):
                     continue
+                scheduler.add(file, priority_factors(file, god_classes.get(file), before_metrics_by_file.get(file),
+                                                     dependency_analyzer))
+        finally:
+            scheduler.close()
+        for future in worker_futures:
+            future.result()
+
+    export_dict_to_json(god_classes, f"data/pmd/{project_name}_god_classes.json")
+    schedule = scheduler.summary()
+    export_dict_to_json(schedule, f"results/{project_name}/schedule.json")
+    if not god_classes:
+        print(f"No god classes detected in {project_name}. Skipping refactoring.")
+    else:
+        skipped = [entry for entry in schedule if entry["status"].startswith("skipped")]
+        print(f"Processed {len(schedule) - len(skipped)} of {len(god_classes)} god classes detected by PMD "
+              f"({len(skipped)} skipped, {scheduler.tokens} LLM tokens used); see results/{project_name}/schedule.json")
 
-                print("Compilation and tests PASSED!")
-
-                # === After metrics ===
-                after_input = "code_smells/project/after"
-                after_output = "./code_smells/tmp/after"
-                os.makedirs(after_input, exist_ok=True)
-                os.makedirs(after_output, exist_ok=True)
-
-                write_to_java_file(file_path=f"{after_input}/{target_class}.java", java_code=improvement)
-                after_calculator = JavaMetricsCalculator(after_input, after_output, designite_jar)
-                after_calculator.parse_java_code(path_to_java_file_after)
-                after_metrics = after_calculator.compute_metrics_for_class()
-                after_calculator.clean_repository()
-
-                # === Improvement check via LLM ===
-                improvement_query = f"""
-                Compare these two versions and their CKO metrics.
-                Has code quality, readability, maintainability improved?
-
-                Before:
-                {Before_java_code}
-                Metrics: {before_metrics}
-
-                After:
-                {improvement}
-                Metrics: {after_metrics}
-
-                Answer only True or False.
-                """
-                is_better = planner.send(None, improvement_query)
-                if 'true' in str(is_better).lower():
-                    print(f"Successful improvement for {target_class}!")
-                    results["Compilation"] = True
-                    results["Test passed"] = True
-                    results["is improved"] = True
-                    results["CKO metrics After"] = after_metrics
-                    break
-                else:
-                    print("No improvement detected. Continuing...")
-                    results["is improved"] = False
+    if workers > 1 and published:
+        verify_published(project_name, published)
 
-            else:
-                print(f"Max iterations reached for {target_class} without success.")
+    for workspace in workspaces:
+        workspace.teardown()
+
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        print(f"LLM response cache: {response_cache.stats()}")
+    metrics_cache = get_metrics_cache()
+    if metrics_cache is not None:
+        print(f"Metrics cache: {metrics_cache.stats()}")
 
-            # Restore original if no success
-            if results.get("is improved") != True:
-                write_to_java_file(file_path=path_to_java_file_after, java_code=Before_java_code)
+    if trace_path is not None:
+        configure_tracing(None)
+        if os.path.exists(trace_path):
+            summary = summarize_trace(trace_path)
+            export_dict_to_json(summary, f"results/{project_name}/trace_summary.json")
+            table = format_summary(summary)
+            with open(f"results/{project_name}/trace_summary.txt", "w", encoding="utf-8") as f:
+                f.write(table + "\n")
+            print(table)
 
-            # Save final results
-            export_dict_to_json(results, f"results/{project_name}/{target_class}/metrics.json")
+    print("Refactoring pipeline completed.")
 
-        except Exception as e:
-            print(f"Error processing {file}: {e}")
-            continue
 
-    print("Refactoring pipeline completed.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,116 @@
-from refAgent.OpenaiLLM import OpenAILLM
-from refAgent.prompt import REFACTORING_GENERATOR_PROMPT, PLANNER_PROMPT, COMPILER_PROMPT, TEST_SUMMARY_PROMPT, MULTI_TEST_SUMMARY_PROMPT
-from refAgent.utilities import compile_project_with_maven, run_maven_test
+from refAgent.OpenaiLLM import OpenAILLM, AsyncOpenAILLM, ResponseCache, HistoryPolicy, build_messages, STREAM_STOP
+from refAgent.prompt import REFACTORING_GENERATOR_PROMPT, PLANNER_PROMPT, PLANNER_JSON_PROMPT, COMPILER_PROMPT, TEST_SUMMARY_PROMPT, MULTI_TEST_SUMMARY_PROMPT
+from refAgent.refactoring_plan import RESPONSE_FORMATS, parse_plan
+from refAgent.javac_parser import declared_method_names
+from refAgent.utilities import (compile_project_with_maven, run_maven_test, find_maven_module, read_cached_classpath,
+                                cache_module_classpath, mark_cached_classpath_unusable, find_direct_dependents,
+                                compile_with_javac)
+import os
+import re
 from typing import Optional
+import asyncio
+import threading
+from refAgent.tracing import span
 from settings import Settings
 
 # Load settings once for default token limits
 _config = Settings()
 
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide LLM response cache, or None when caching is disabled."""
+    global _response_cache
+    with _response_cache_lock:
+        if _config.LLM_CACHE_ENABLED and _response_cache is None:
+            _response_cache = ResponseCache(_config.LLM_CACHE_PATH, max_entries=_config.LLM_CACHE_MAX_ENTRIES)
+    return _response_cache
+
+
+def make_history_policy() -> Optional[HistoryPolicy]:
+    """Return the configured conversation budget, or None to resend the whole history."""
+    if _config.LLM_PROMPT_TOKEN_BUDGET is None:
+        return None
+    return HistoryPolicy(max_prompt_tokens=_config.LLM_PROMPT_TOKEN_BUDGET)
+
+
+class AnswerStreamMonitor:
+    """Stream monitor for True/False questions: the reply ends at the first True or False."""
+
+    ANSWER = re.compile(r"\b(true|false)\b", re.IGNORECASE)
+
+    def __call__(self, reply: str) -> Optional[str]:
+        return STREAM_STOP if self.ANSWER.search(reply) else None
+
+
+class CodeStreamMonitor:
+    """Stream monitor for generated classes or methods (one instance per reply).
+
+    The reply ends once the code block is closed (anything after it is commentary) and is
+    cancelled when `prose_chars` of prose precede the code, or when the same block of up to
+    `MAX_PERIOD` non-blank lines repeats `max_repeats` times in a row (a degenerate loop
+    that would otherwise run until max_tokens).
+    """
+
+    CODE_START = re.compile(r"(package|import|public|protected|private|abstract|final|static|synchronized|void|class|interface|enum|@|/\*|//)")
+    MAX_PERIOD = 10
+    MIN_BLOCK_CHARS = 12  # Blocks of closing braces and the like repeat legitimately
+
+    def __init__(self, prose_chars: int, max_repeats: int):
+        self.prose_chars = prose_chars
+        self.max_repeats = max_repeats
+        self.lines = []  # stripped non-blank lines received so far
+        self.fences = 0
+        self._in_code = False
+        self._scanned = 0  # offset of the first character not yet split into lines
+
+    def __call__(self, reply: str) -> Optional[str]:
+        if not self._in_code:
+            fence = reply.find("```")
+            prefix = (reply if fence < 0 else reply[:fence]).strip()
+            if prefix and not self.CODE_START.match(prefix):
+                if len(prefix) >= self.prose_chars:
+                    return "prose before the code block"
+                if fence < 0:
+                    return None
+            elif not prefix and fence < 0:
+                return None
+            self._in_code = True
+
+        end = reply.rfind("\n") + 1
+        if end <= self._scanned:
+            return None
+        new_lines = reply[self._scanned:end].split("\n")[:-1]
+        self._scanned = end
+        for line in new_lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("```"):
+                self.fences += 1
+                if self.fences == 2:
+                    return STREAM_STOP
+                continue
+            self.lines.append(line)
+            if self._repeating():
+                return f"the same lines repeat {self.max_repeats} times in a row"
+        return None
+
+    def _repeating(self) -> bool:
+        lines = self.lines
+        for period in range(1, self.MAX_PERIOD + 1):
+            needed = period * self.max_repeats
+            if len(lines) < needed:
+                break
+            block = lines[-period:]
+            if sum(len(line) for line in block) < self.MIN_BLOCK_CHARS:
+                continue
+            if all(lines[-needed + i] == block[i % period] for i in range(needed - period)):
+                return True
+        return False
+
 
 class BaseAgent:
     """Minimal base agent that wraps an LLM instance and provides a send helper.
@@ -15,32 +119,75 @@ class BaseAgent:
     """
 
     def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None):
-        self.llm = OpenAILLM(api_key)
+        self.api_key = api_key
+        self.llm = OpenAILLM(api_key, base_url=_config.LLM_BASE_URL, cache=get_response_cache(), history_policy=make_history_policy())
+        self._async_llm = None
         self.model = model
         # per-agent max tokens (fallback to global default)
         self.max_tokens = max_tokens if max_tokens is not None else _config.DEFAULT_MAX_TOKENS
 
-    def send(self, system_prompt: Optional[str], user_query: str, max_tokens: Optional[int] = None) -> str:
-        """Call the underlying LLM and return a cleaned string reply.
-
-        This method strips surrounding triple-backtick code fences if present.
+    @property
+    def async_llm(self) -> AsyncOpenAILLM:
+        """Async client for `asend`, created on first use; it shares the conversation of `self.llm`."""
+        if self._async_llm is None:
+            self._async_llm = AsyncOpenAILLM(self.api_key, base_url=_config.LLM_BASE_URL, cache=get_response_cache(),
+                                             max_concurrency=_config.LLM_MAX_CONCURRENCY,
+                                             history_policy=self.llm.history_policy)
+            self._async_llm.message_history = self.llm.message_history
+            self._async_llm.call_log = self.llm.call_log
+        return self._async_llm
+
+    @staticmethod
+    def clean_reply(reply):
+        """Strip surrounding triple-backtick code fences from an LLM reply, if present.
+
+        Text after the closing fence (e.g. the start of commentary in a stream that was
+        stopped there) is dropped as well.
         """
-        # prefer explicit call-time max_tokens, otherwise use agent default
-        tokens = max_tokens if max_tokens is not None else self.max_tokens
-        reply = self.llm.query_llm(system_prompt, user_query, model=self.model, max_tokens=tokens)
-
         if not isinstance(reply, str):
             return reply
 
         text = reply.strip()
-        if text.startswith("```") and text.endswith("```"):
+        if text.startswith("```"):
             lines = text.splitlines()
-            if len(lines) >= 3:
-                return "\n".join(lines[1:-1])
-            return ""
+            closing = next((i for i in range(1, len(lines)) if lines[i].strip().startswith("```")), None)
+            if closing is not None:
+                return "\n".join(lines[1:closing])
+            if text.endswith("```"):
+                return ""
 
         return text
 
+    def send(self, system_prompt: Optional[str], user_query: str, max_tokens: Optional[int] = None, use_cache: bool = True,
+             stream_monitor=None, response_format: Optional[dict] = None) -> str:
+        """Call the underlying LLM and return a cleaned string reply.
+
+        This method strips surrounding triple-backtick code fences if present.
+        Pass `use_cache=False` to bypass the response cache and get a fresh sample, a
+        `stream_monitor` (e.g. `CodeStreamMonitor`) to stream the reply and end it early,
+        and a `response_format` to request JSON output from servers that support it.
+        """
+        # prefer explicit call-time max_tokens, otherwise use agent default
+        tokens = max_tokens if max_tokens is not None else self.max_tokens
+        # The LLM wrapper adds the prompt/completion token counts to the span
+        with span("llm.send", agent=self.__class__.__name__):
+            reply = self.llm.query_llm(system_prompt, user_query, model=self.model, max_tokens=tokens, use_cache=use_cache,
+                                       stream_monitor=stream_monitor, response_format=response_format)
+        return self.clean_reply(reply)
+
+    async def asend(self, system_prompt: Optional[str], user_query: str, max_tokens: Optional[int] = None, use_cache: bool = True, record_history: bool = True,
+                    stream_monitor=None) -> str:
+        """Async variant of `send`; independent calls can be awaited together (e.g. `asyncio.gather`).
+
+        Pass `record_history=False` for fan-out calls whose replies should not enter the conversation.
+        """
+        tokens = max_tokens if max_tokens is not None else self.max_tokens
+        with span("llm.send", agent=self.__class__.__name__, concurrent=True):
+            reply = await self.async_llm.query_llm(system_prompt, user_query, model=self.model, max_tokens=tokens,
+                                                   use_cache=use_cache, record_history=record_history,
+                                                   stream_monitor=stream_monitor)
+        return self.clean_reply(reply)
+
 
 class RefactoringGeneratorAgent(BaseAgent):
     """Agent that executes the strict executor prompt workflow.
@@ -54,9 +201,54 @@ class RefactoringGeneratorAgent(BaseAgent):
         default = _config.REFRACTORING_GENERATOR_MAX_TOKENS if max_tokens is None else max_tokens
         super().__init__(api_key, model=model, max_tokens=default)
 
-    def run(self, user_query: str, use_refactoring_generator_prompt: bool = True, prompt_override: Optional[str] = None, max_tokens: Optional[int] = None):
+    @staticmethod
+    def stream_monitor() -> Optional[CodeStreamMonitor]:
+        """A fresh monitor for one generated class, or None when streaming is disabled."""
+        if not _config.LLM_STREAMING:
+            return None
+        return CodeStreamMonitor(_config.LLM_STREAM_PROSE_CHARS, _config.LLM_STREAM_MAX_REPEATS)
+
+    def run(self, user_query: str, use_refactoring_generator_prompt: bool = True, prompt_override: Optional[str] = None, max_tokens: Optional[int] = None, use_cache: bool = True):
         system_prompt = prompt_override if prompt_override is not None else (REFACTORING_GENERATOR_PROMPT if use_refactoring_generator_prompt else None)
-        return self.send(system_prompt, user_query, max_tokens=max_tokens)
+        return self.send(system_prompt, user_query, max_tokens=max_tokens, use_cache=use_cache, stream_monitor=self.stream_monitor())
+
+    async def arun(self, user_query: str, use_refactoring_generator_prompt: bool = True, prompt_override: Optional[str] = None, max_tokens: Optional[int] = None, use_cache: bool = True, record_history: bool = True):
+        """Async variant of `run`."""
+        system_prompt = prompt_override if prompt_override is not None else (REFACTORING_GENERATOR_PROMPT if use_refactoring_generator_prompt else None)
+        return await self.asend(system_prompt, user_query, max_tokens=max_tokens, use_cache=use_cache, record_history=record_history,
+                                stream_monitor=self.stream_monitor())
+
+    def generate_candidates(self, user_query: str, n: int, use_cache: bool = True, max_tokens: Optional[int] = None,
+                            prompt_override: Optional[str] = None) -> list:
+        """Request `n` independent candidates concurrently from the same conversation state.
+
+        Candidates are not added to the history; call `record_candidate` for the one
+        that is actually built so later feedback refers to it. Only the first request
+        may be answered from the response cache (identical prompts share one key).
+        """
+        async def fan_out():
+            try:
+                return await asyncio.gather(*[
+                    self.arun(user_query, prompt_override=prompt_override, max_tokens=max_tokens,
+                              use_cache=(use_cache and k == 0), record_history=False)
+                    for k in range(n)
+                ])
+            finally:
+                # The loop ends with asyncio.run; its connections must not outlive it
+                await AsyncOpenAILLM.aclose_clients()
+        return list(asyncio.run(fan_out()))
+
+    def abort_reasons(self, n: int) -> list:
+        """Why each of the last `n` replies was cancelled while streaming (None when it was not),
+        in request order; `generate_candidates` logs its requests in candidate order."""
+        entries = self.llm.call_log[-n:] if n else []
+        return [None] * (n - len(entries)) + [entry.get("abort_reason") for entry in entries]
+
+    def record_candidate(self, user_query: str, candidate: str, prompt_override: Optional[str] = None):
+        """Append a request and the chosen candidate to the conversation history."""
+        system_prompt = prompt_override if prompt_override is not None else REFACTORING_GENERATOR_PROMPT
+        self.llm.message_history.extend(build_messages(system_prompt, user_query))
+        self.llm.message_history.append({"role": "assistant", "content": candidate})
 
 
 
@@ -83,9 +275,45 @@ class PlannerAgent(BaseAgent):
             The raw string reply from the LLM (expected JSON-like). The caller
             can parse this string into a Python dict if desired.
         """
-        system_prompt = PLANNER_PROMPT
+        return self.send(PLANNER_PROMPT, self._analysis_query(java_code, cko_metrics), max_tokens=max_tokens)
+
+    async def aanalyze_methods(self, java_code: str, cko_metrics: str, max_tokens: Optional[int] = None) -> str:
+        """Async variant of `analyze_methods`, e.g. to plan several classes concurrently."""
+        return await self.asend(PLANNER_PROMPT, self._analysis_query(java_code, cko_metrics), max_tokens=max_tokens)
+
+    def plan_methods(self, java_code: str, cko_metrics: str, max_tokens: Optional[int] = None) -> tuple[Optional[list], str]:
+        """Ask for a structured plan and parse it (see refactoring_plan.py).
 
-        query = f"""
+        With `PLANNER_OUTPUT` "json_schema" or "json_object" the server is asked to constrain its
+        output to JSON; when it rejects the request the plan is asked for once more with the JSON
+        format described in the prompt only. "text" uses the historical free-text planner prompt.
+
+        Returns:
+            (plan, reply) - `plan` is the list of {"name", "needs_refactor", "instruction"}
+            entries, or None when the reply could not be parsed or flags a method the class
+            does not declare; `reply` is the raw reply.
+        """
+        output = _config.PLANNER_OUTPUT
+        if output == "text":
+            reply = self.analyze_methods(java_code, cko_metrics, max_tokens=max_tokens)
+            return parse_plan(reply, declared_method_names(java_code)), reply
+
+        query = self._structured_query(java_code, cko_metrics)
+        reply = self.send(PLANNER_JSON_PROMPT, query, max_tokens=max_tokens, response_format=RESPONSE_FORMATS[output])
+        if reply.startswith("Local LLM Error"):
+            print(f"Planner request with response_format '{output}' failed ({reply}); retrying without it")
+            reply = self.send(PLANNER_JSON_PROMPT, query, max_tokens=max_tokens)
+        return parse_plan(reply, declared_method_names(java_code)), reply
+
+    def decide(self, query: str, max_tokens: Optional[int] = None) -> str:
+        """Ask a True/False question in the planner conversation; when streaming, the reply
+        ends as soon as it contains True or False."""
+        monitor = AnswerStreamMonitor() if _config.LLM_STREAMING else None
+        return self.send(None, query, max_tokens=max_tokens, stream_monitor=monitor)
+
+    @staticmethod
+    def _analysis_query(java_code: str, cko_metrics: str) -> str:
+        return f"""
                 For each method in the provided Java class :
                 {java_code}
 
@@ -102,7 +330,17 @@ class PlannerAgent(BaseAgent):
                 Avoid using natural lanquage explanation
                 """
 
-        return self.send(system_prompt, query, max_tokens=max_tokens)
+    @staticmethod
+    def _structured_query(java_code: str, cko_metrics: str) -> str:
+        return f"""
+                For each method in the provided Java class :
+                {java_code}
+
+                Class CKO metrics :
+                {cko_metrics}
+
+                Return the JSON object described in the instructions.
+                """
 
 
 class CompilerAgent(BaseAgent):
@@ -115,21 +353,84 @@ class CompilerAgent(BaseAgent):
     Returns:
         (is_compiled: bool, summary: str) - when compilation fails, `summary` contains the
         LLM-produced summary/suggestions; when compilation succeeds, `summary` is an empty string.
+
+    `last_compiler` tells which step decided the last result: "javac" (fast-path rejection)
+    or "maven".
     """
 
     def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None):
         default = _config.COMPILER_MAX_TOKENS if max_tokens is None else max_tokens
         super().__init__(api_key, model=model, max_tokens=default)
-
-    def compile_and_summarize(self, project_dir: str, original_code: str, refactored_code: str, max_tokens: Optional[int] = None) -> tuple[bool, str]:
+        self.last_compiler = None
+
+    @staticmethod
+    def _javac_sources(project_dir: str, module: str, changed_file: str) -> list:
+        source_root = os.path.join(project_dir, module, "src", "main", "java")
+        if not os.path.isdir(source_root):
+            return [changed_file]
+        return [changed_file] + find_direct_dependents(source_root, changed_file)
+
+    def _javac_fast_path(self, project_dir: str, changed_file: Optional[str]):
+        """Compile the changed class and its direct dependents with javac when a usable cached
+        classpath exists for its module. Returns the javac process, or None when not applicable."""
+        if not (_config.JAVAC_FAST_PATH and changed_file):
+            return None
+        module = find_maven_module(project_dir, changed_file)
+        cached = read_cached_classpath(project_dir, module) if module is not None else None
+        if not cached or not cached.get("usable"):
+            return None
+        try:
+            return compile_with_javac(project_dir, module, self._javac_sources(project_dir, module, changed_file),
+                                      cached["classpath"], timeout=_config.JAVAC_TIMEOUT)
+        except OSError as e:  # javac not on PATH
+            print(f"javac fast path unavailable: {e}")
+            return None
+
+    def _prepare_javac_fast_path(self, project_dir: str, changed_file: str):
+        """After a successful Maven build, cache the module classpath and check that javac
+        accepts the same code; modules where it does not keep using Maven only."""
+        module = find_maven_module(project_dir, changed_file)
+        if module is None or read_cached_classpath(project_dir, module) is not None:
+            return
+        classpath = cache_module_classpath(project_dir, module, offline=_config.MAVEN_OFFLINE,
+                                           backend=_config.MAVEN_BACKEND, timeout=_config.MAVEN_COMPILE_TIMEOUT)
+        if classpath is None:
+            return
+        try:
+            process = compile_with_javac(project_dir, module, self._javac_sources(project_dir, module, changed_file),
+                                         classpath, timeout=_config.JAVAC_TIMEOUT)
+        except OSError:
+            process = None
+        if process is None or process.returncode != 0:
+            print(f"javac does not reproduce the Maven build of module '{module}'; fast path disabled for it.")
+            mark_cached_classpath_unusable(project_dir, module)
+
+    def compile_and_summarize(self, project_dir: str, original_code: str, refactored_code: str, max_tokens: Optional[int] = None, changed_file: Optional[str] = None) -> tuple[bool, str]:
         """
         Compile the project using Maven.
+        When `changed_file` is given, only the owning module and its dependents are rebuilt
+        (see `compile_project_with_maven`). If the module has a cached compile classpath,
+        the changed class and its direct dependents are first compiled with javac; only
+        code that javac accepts goes on to the Maven build.
         On success: return (True, "")
         On failure: generate LLM summary of errors and return (False, summary)
         """
-        from refAgent.utilities import compile_project_with_maven  # Safe import
-
-        process = compile_project_with_maven(project_dir=project_dir)
+        process = self._javac_fast_path(project_dir, changed_file)
+        if process is not None and process.returncode != 0:
+            self.last_compiler = "javac"
+        else:
+            self.last_compiler = "maven"
+            fast_path_used = process is not None
+            process = compile_project_with_maven(
+                project_dir=project_dir,
+                changed_file=changed_file,
+                incremental=_config.MAVEN_INCREMENTAL_COMPILE,
+                offline=_config.MAVEN_OFFLINE,
+                backend=_config.MAVEN_BACKEND,
+                timeout=_config.MAVEN_COMPILE_TIMEOUT,
+            )
+            if process.returncode == 0 and changed_file and _config.JAVAC_FAST_PATH and not fast_path_used:
+                self._prepare_javac_fast_path(project_dir, changed_file)
 
         if process.returncode == 0:
             return True, ""  # Compilation succeeded
@@ -182,7 +483,8 @@ class TestAgent(BaseAgent):
         Returns:
             (process: CompletedProcess, summary: str)
         """
-        process = run_maven_test(class_name, method_name=method_name, project_dir=project_dir, verify=verify)
+        process = run_maven_test(class_name, method_name=method_name, project_dir=project_dir, verify=verify,
+                                 backend=_config.MAVEN_BACKEND, timeout=_config.MAVEN_TEST_TIMEOUT)
 
         if process.returncode == 0:
             return process, ""
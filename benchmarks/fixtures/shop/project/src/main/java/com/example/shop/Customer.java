@@ -0,0 +1,31 @@
+package com.example.shop;
+
+public class Customer {
+    private final String name;
+    private final String email;
+    private final String country;
+    private final String tier;
+
+    public Customer(String name, String email, String country, String tier) {
+        this.name = name;
+        this.email = email;
+        this.country = country;
+        this.tier = tier;
+    }
+
+    public String getName() {
+        return name;
+    }
+
+    public String getEmail() {
+        return email;
+    }
+
+    public String getCountry() {
+        return country;
+    }
+
+    public String getTier() {
+        return tier;
+    }
+}
@@ -0,0 +1,38 @@
+package com.example.shop;
+
+import java.util.ArrayList;
+import java.util.List;
+
+public class Order {
+    private final String id;
+    private final Customer customer;
+    private final List<OrderItem> items;
+    private String status;
+
+    public Order(String id, Customer customer, List<OrderItem> items) {
+        this.id = id;
+        this.customer = customer;
+        this.items = new ArrayList<>(items);
+        this.status = "NEW";
+    }
+
+    public String getId() {
+        return id;
+    }
+
+    public Customer getCustomer() {
+        return customer;
+    }
+
+    public List<OrderItem> getItems() {
+        return items;
+    }
+
+    public String getStatus() {
+        return status;
+    }
+
+    public void setStatus(String status) {
+        this.status = status;
+    }
+}
@@ -0,0 +1,265 @@
+package com.example.shop;
+
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+
+public class OrderManager {
+    private final Map<String, Customer> customers = new HashMap<>();
+    private final Map<String, Product> inventory = new HashMap<>();
+    private final Map<String, Order> orders = new LinkedHashMap<>();
+    private final Map<String, Double> coupons = new HashMap<>();
+    private final List<String> auditLog = new ArrayList<>();
+    private final Map<String, String> suppliers = new HashMap<>();
+    private final Map<String, Integer> reorderQuantities = new HashMap<>();
+    private double freeShippingThreshold = 100.0;
+    private int lowStockThreshold = 3;
+
+    public void addCustomer(Customer customer) {
+        if (customer == null) {
+            throw new IllegalArgumentException("customer is required");
+        }
+        if (customer.getEmail() == null || !customer.getEmail().contains("@")) {
+            throw new IllegalArgumentException("invalid email: " + customer.getEmail());
+        }
+        if (customers.containsKey(customer.getEmail())) {
+            throw new IllegalStateException("duplicate customer: " + customer.getEmail());
+        }
+        customers.put(customer.getEmail(), customer);
+    }
+
+    public void addProduct(Product product) {
+        if (product == null || product.getSku() == null) {
+            throw new IllegalArgumentException("product with a sku is required");
+        }
+        if (product.getPrice() < 0 || product.getStock() < 0) {
+            throw new IllegalArgumentException("negative price or stock for " + product.getSku());
+        }
+        inventory.put(product.getSku(), product);
+    }
+
+    public void addCoupon(String code, double percent) {
+        if (code == null || code.isEmpty()) {
+            throw new IllegalArgumentException("coupon code is required");
+        }
+        if (percent <= 0 || percent > 50) {
+            throw new IllegalArgumentException("coupon percent must be in (0, 50]");
+        }
+        coupons.put(code, percent);
+    }
+
+    public void registerSupplier(String sku, String supplier, int reorderQuantity) {
+        if (sku == null || supplier == null) {
+            throw new IllegalArgumentException("sku and supplier are required");
+        }
+        suppliers.put(sku, supplier);
+        reorderQuantities.put(sku, reorderQuantity > 0 ? reorderQuantity : 1);
+    }
+
+    public String supplierFor(String sku) {
+        String supplier = suppliers.get(sku);
+        return supplier == null ? "unknown" : supplier;
+    }
+
+    public int reorderQuantityFor(String sku) {
+        Integer quantity = reorderQuantities.get(sku);
+        return quantity == null ? 0 : quantity;
+    }
+
+    public void setFreeShippingThreshold(double threshold) {
+        this.freeShippingThreshold = threshold;
+    }
+
+    public void setLowStockThreshold(int threshold) {
+        this.lowStockThreshold = threshold;
+    }
+
+    public Order placeOrder(String id, String customerEmail, List<OrderItem> items) {
+        if (id == null || orders.containsKey(id)) {
+            throw new IllegalArgumentException("missing or duplicate order id: " + id);
+        }
+        Customer customer = customers.get(customerEmail);
+        if (customer == null) {
+            throw new IllegalArgumentException("unknown customer: " + customerEmail);
+        }
+        if (items == null || items.isEmpty()) {
+            throw new IllegalArgumentException("an order needs at least one item");
+        }
+        for (OrderItem item : items) {
+            Product product = inventory.get(item.getProduct().getSku());
+            if (product == null) {
+                throw new IllegalArgumentException("unknown product: " + item.getProduct().getSku());
+            }
+            if (item.getQuantity() <= 0) {
+                throw new IllegalArgumentException("quantity must be positive for " + product.getSku());
+            }
+            if (product.getStock() < item.getQuantity()) {
+                throw new IllegalStateException("not enough stock for " + product.getSku());
+            }
+        }
+        for (OrderItem item : items) {
+            Product product = inventory.get(item.getProduct().getSku());
+            product.setStock(product.getStock() - item.getQuantity());
+        }
+        Order order = new Order(id, customer, items);
+        orders.put(id, order);
+        auditLog.add("placed " + id + " for " + customer.getEmail());
+        return order;
+    }
+
+    public double calculateTotal(String orderId, String couponCode) {
+        Order order = orders.get(orderId);
+        if (order == null) {
+            throw new IllegalArgumentException("unknown order: " + orderId);
+        }
+        double subtotal = 0;
+        for (OrderItem item : order.getItems()) {
+            double line = item.getProduct().getPrice() * item.getQuantity();
+            if ("BOOKS".equals(item.getProduct().getCategory())) {
+                line = line * 0.95;
+            } else if ("ELECTRONICS".equals(item.getProduct().getCategory()) && item.getQuantity() >= 3) {
+                line = line * 0.9;
+            }
+            subtotal += line;
+        }
+        String tier = order.getCustomer().getTier();
+        if ("GOLD".equals(tier)) {
+            subtotal = subtotal * 0.9;
+        } else if ("SILVER".equals(tier)) {
+            subtotal = subtotal * 0.95;
+        }
+        if (couponCode != null) {
+            Double percent = coupons.get(couponCode);
+            if (percent == null) {
+                throw new IllegalArgumentException("unknown coupon: " + couponCode);
+            }
+            subtotal = subtotal * (100 - percent) / 100;
+        }
+        double shipping = 0;
+        if (subtotal < freeShippingThreshold) {
+            String country = order.getCustomer().getCountry();
+            if ("US".equals(country)) {
+                shipping = 5;
+            } else if ("CA".equals(country) || "MX".equals(country)) {
+                shipping = 10;
+            } else {
+                shipping = 20;
+            }
+        }
+        double taxRate;
+        String country = order.getCustomer().getCountry();
+        if ("US".equals(country)) {
+            taxRate = 0.07;
+        } else if ("DE".equals(country) || "FR".equals(country)) {
+            taxRate = 0.2;
+        } else {
+            taxRate = 0.1;
+        }
+        double total = subtotal * (1 + taxRate) + shipping;
+        return Math.round(total * 100) / 100.0;
+    }
+
+    public void cancelOrder(String orderId) {
+        Order order = orders.get(orderId);
+        if (order == null) {
+            throw new IllegalArgumentException("unknown order: " + orderId);
+        }
+        if ("SHIPPED".equals(order.getStatus()) || "DELIVERED".equals(order.getStatus())) {
+            throw new IllegalStateException("order already shipped: " + orderId);
+        }
+        if ("CANCELLED".equals(order.getStatus())) {
+            return;
+        }
+        for (OrderItem item : order.getItems()) {
+            Product product = inventory.get(item.getProduct().getSku());
+            if (product != null) {
+                product.setStock(product.getStock() + item.getQuantity());
+            }
+        }
+        order.setStatus("CANCELLED");
+        auditLog.add("cancelled " + orderId);
+    }
+
+    public void shipOrder(String orderId) {
+        Order order = orders.get(orderId);
+        if (order == null) {
+            throw new IllegalArgumentException("unknown order: " + orderId);
+        }
+        if (!"NEW".equals(order.getStatus())) {
+            throw new IllegalStateException("only new orders can be shipped: " + orderId);
+        }
+        order.setStatus("SHIPPED");
+        auditLog.add("shipped " + orderId);
+    }
+
+    public void deliverOrder(String orderId) {
+        Order order = orders.get(orderId);
+        if (order == null) {
+            throw new IllegalArgumentException("unknown order: " + orderId);
+        }
+        if (!"SHIPPED".equals(order.getStatus())) {
+            throw new IllegalStateException("only shipped orders can be delivered: " + orderId);
+        }
+        order.setStatus("DELIVERED");
+        auditLog.add("delivered " + orderId);
+    }
+
+    public List<String> lowStockReport() {
+        List<String> report = new ArrayList<>();
+        for (Product product : inventory.values()) {
+            if (product.getStock() == 0) {
+                report.add(product.getSku() + ": out of stock");
+            } else if (product.getStock() <= lowStockThreshold) {
+                report.add(product.getSku() + ": " + product.getStock() + " left");
+            }
+        }
+        report.sort(null);
+        return report;
+    }
+
+    public String customerSummary(String email) {
+        Customer customer = customers.get(email);
+        if (customer == null) {
+            return "unknown customer";
+        }
+        int placed = 0;
+        int cancelled = 0;
+        int items = 0;
+        for (Order order : orders.values()) {
+            if (!order.getCustomer().getEmail().equals(email)) {
+                continue;
+            }
+            if ("CANCELLED".equals(order.getStatus())) {
+                cancelled++;
+            } else {
+                placed++;
+                for (OrderItem item : order.getItems()) {
+                    items += item.getQuantity();
+                }
+            }
+        }
+        String tier = customer.getTier() == null ? "STANDARD" : customer.getTier();
+        return customer.getName() + " (" + tier + "): " + placed + " orders, " + items + " items, " + cancelled + " cancelled";
+    }
+
+    public Map<String, Integer> unitsSoldByCategory() {
+        Map<String, Integer> units = new HashMap<>();
+        for (Order order : orders.values()) {
+            if ("CANCELLED".equals(order.getStatus())) {
+                continue;
+            }
+            for (OrderItem item : order.getItems()) {
+                String category = item.getProduct().getCategory() == null ? "OTHER" : item.getProduct().getCategory();
+                Integer current = units.get(category);
+                units.put(category, current == null ? item.getQuantity() : current + item.getQuantity());
+            }
+        }
+        return units;
+    }
+
+    public List<String> getAuditLog() {
+        return new ArrayList<>(auditLog);
+    }
+}
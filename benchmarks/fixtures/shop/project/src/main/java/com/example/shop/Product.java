@@ -0,0 +1,41 @@
+package com.example.shop;
+
+public class Product {
+    private final String sku;
+    private final String name;
+    private final String category;
+    private final double price;
+    private int stock;
+
+    public Product(String sku, String name, String category, double price, int stock) {
+        this.sku = sku;
+        this.name = name;
+        this.category = category;
+        this.price = price;
+        this.stock = stock;
+    }
+
+    public String getSku() {
+        return sku;
+    }
+
+    public String getName() {
+        return name;
+    }
+
+    public String getCategory() {
+        return category;
+    }
+
+    public double getPrice() {
+        return price;
+    }
+
+    public int getStock() {
+        return stock;
+    }
+
+    public void setStock(int stock) {
+        this.stock = stock;
+    }
+}
@@ -0,0 +1,72 @@
+package com.example.shop;
+
+import static org.junit.Assert.assertEquals;
+import static org.junit.Assert.assertTrue;
+
+import java.util.Arrays;
+import java.util.Map;
+import org.junit.Before;
+import org.junit.Test;
+
+public class OrderManagerTest {
+    private OrderManager manager;
+    private Product book;
+    private Product laptop;
+
+    @Before
+    public void setUp() {
+        manager = new OrderManager();
+        manager.addCustomer(new Customer("Ada", "ada@example.com", "US", "GOLD"));
+        manager.addCustomer(new Customer("Bert", "bert@example.com", "DE", null));
+        book = new Product("B1", "Refactoring", "BOOKS", 40.0, 10);
+        laptop = new Product("E1", "Laptop", "ELECTRONICS", 900.0, 4);
+        manager.addProduct(book);
+        manager.addProduct(laptop);
+        manager.addCoupon("TEN", 10);
+    }
+
+    @Test
+    public void placingAnOrderReservesStock() {
+        manager.placeOrder("o1", "ada@example.com", Arrays.asList(new OrderItem(book, 2)));
+        assertEquals(8, book.getStock());
+    }
+
+    @Test
+    public void totalAppliesCategoryTierCouponShippingAndTax() {
+        manager.placeOrder("o1", "ada@example.com", Arrays.asList(new OrderItem(book, 2)));
+        // 80 * 0.95 = 76, GOLD 68.4, coupon 61.56, US tax 7% and shipping 5
+        assertEquals(70.87, manager.calculateTotal("o1", "TEN"), 0.001);
+        manager.placeOrder("o2", "bert@example.com", Arrays.asList(new OrderItem(laptop, 3)));
+        // 2700 * 0.9 = 2430, no shipping above the threshold, DE tax 20%
+        assertEquals(2916.0, manager.calculateTotal("o2", null), 0.001);
+    }
+
+    @Test
+    public void cancellingReturnsStockAndShippedOrdersCannotBeCancelled() {
+        manager.placeOrder("o1", "ada@example.com", Arrays.asList(new OrderItem(book, 3)));
+        manager.cancelOrder("o1");
+        assertEquals(10, book.getStock());
+        manager.placeOrder("o2", "ada@example.com", Arrays.asList(new OrderItem(book, 1)));
+        manager.shipOrder("o2");
+        try {
+            manager.cancelOrder("o2");
+            throw new AssertionError("shipped order was cancelled");
+        } catch (IllegalStateException expected) {
+            assertTrue(expected.getMessage().contains("o2"));
+        }
+    }
+
+    @Test
+    public void reportsAndSummaries() {
+        manager.placeOrder("o1", "ada@example.com", Arrays.asList(new OrderItem(laptop, 2), new OrderItem(book, 1)));
+        manager.placeOrder("o2", "ada@example.com", Arrays.asList(new OrderItem(book, 1)));
+        manager.cancelOrder("o2");
+        assertEquals(Arrays.asList("E1: 2 left"), manager.lowStockReport());
+        assertEquals("Ada (GOLD): 1 orders, 3 items, 1 cancelled", manager.customerSummary("ada@example.com"));
+        Map<String, Integer> units = manager.unitsSoldByCategory();
+        assertEquals(Integer.valueOf(2), units.get("ELECTRONICS"));
+        assertEquals(Integer.valueOf(1), units.get("BOOKS"));
+        assertEquals(Arrays.asList("placed o1 for ada@example.com", "placed o2 for ada@example.com", "cancelled o2"),
+                manager.getAuditLog());
+    }
+}
@@ -0,0 +1,291 @@
+package com.example.shop;
+
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+
+public class OrderManager {
+    private final Map<String, Customer> customers = new HashMap<>();
+    private final Map<String, Product> inventory = new HashMap<>();
+    private final Map<String, Order> orders = new LinkedHashMap<>();
+    private final Map<String, Double> coupons = new HashMap<>();
+    private final List<String> auditLog = new ArrayList<>();
+    private final Map<String, String> suppliers = new HashMap<>();
+    private final Map<String, Integer> reorderQuantities = new HashMap<>();
+    private double freeShippingThreshold = 100.0;
+    private int lowStockThreshold = 3;
+
+    public void addCustomer(Customer customer) {
+        if (customer == null) {
+            throw new IllegalArgumentException("customer is required");
+        }
+        String email = customer.getEmail();
+        if (email == null || !email.contains("@")) {
+            throw new IllegalArgumentException("invalid email: " + email);
+        }
+        if (customers.containsKey(email)) {
+            throw new IllegalStateException("duplicate customer: " + email);
+        }
+        customers.put(email, customer);
+    }
+
+    public void addProduct(Product product) {
+        if (product == null || product.getSku() == null) {
+            throw new IllegalArgumentException("product with a sku is required");
+        }
+        if (product.getPrice() < 0 || product.getStock() < 0) {
+            throw new IllegalArgumentException("negative price or stock for " + product.getSku());
+        }
+        inventory.put(product.getSku(), product);
+    }
+
+    public void addCoupon(String code, double percent) {
+        if (code == null || code.isEmpty()) {
+            throw new IllegalArgumentException("coupon code is required");
+        }
+        if (percent <= 0 || percent > 50) {
+            throw new IllegalArgumentException("coupon percent must be in (0, 50]");
+        }
+        coupons.put(code, percent);
+    }
+
+    public void registerSupplier(String sku, String supplier, int reorderQuantity) {
+        if (sku == null || supplier == null) {
+            throw new IllegalArgumentException("sku and supplier are required");
+        }
+        suppliers.put(sku, supplier);
+        reorderQuantities.put(sku, reorderQuantity > 0 ? reorderQuantity : 1);
+    }
+
+    public String supplierFor(String sku) {
+        String supplier = suppliers.get(sku);
+        return supplier == null ? "unknown" : supplier;
+    }
+
+    public int reorderQuantityFor(String sku) {
+        Integer quantity = reorderQuantities.get(sku);
+        return quantity == null ? 0 : quantity;
+    }
+
+    public void setFreeShippingThreshold(double threshold) {
+        this.freeShippingThreshold = threshold;
+    }
+
+    public void setLowStockThreshold(int threshold) {
+        this.lowStockThreshold = threshold;
+    }
+
+    public Order placeOrder(String id, String customerEmail, List<OrderItem> items) {
+        if (id == null || orders.containsKey(id)) {
+            throw new IllegalArgumentException("missing or duplicate order id: " + id);
+        }
+        Customer customer = customers.get(customerEmail);
+        if (customer == null) {
+            throw new IllegalArgumentException("unknown customer: " + customerEmail);
+        }
+        if (items == null || items.isEmpty()) {
+            throw new IllegalArgumentException("an order needs at least one item");
+        }
+        for (OrderItem item : items) {
+            checkAvailable(item);
+        }
+        for (OrderItem item : items) {
+            adjustStock(item, -item.getQuantity());
+        }
+        Order order = new Order(id, customer, items);
+        orders.put(id, order);
+        auditLog.add("placed " + id + " for " + customer.getEmail());
+        return order;
+    }
+
+    private void checkAvailable(OrderItem item) {
+        Product product = inventory.get(item.getProduct().getSku());
+        if (product == null) {
+            throw new IllegalArgumentException("unknown product: " + item.getProduct().getSku());
+        }
+        if (item.getQuantity() <= 0) {
+            throw new IllegalArgumentException("quantity must be positive for " + product.getSku());
+        }
+        if (product.getStock() < item.getQuantity()) {
+            throw new IllegalStateException("not enough stock for " + product.getSku());
+        }
+    }
+
+    private void adjustStock(OrderItem item, int delta) {
+        Product product = inventory.get(item.getProduct().getSku());
+        if (product != null) {
+            product.setStock(product.getStock() + delta);
+        }
+    }
+
+    public double calculateTotal(String orderId, String couponCode) {
+        Order order = requireOrder(orderId);
+        double subtotal = 0;
+        for (OrderItem item : order.getItems()) {
+            subtotal += lineTotal(item);
+        }
+        subtotal = subtotal * tierFactor(order.getCustomer().getTier());
+        subtotal = applyCoupon(subtotal, couponCode);
+        String country = order.getCustomer().getCountry();
+        double shipping = subtotal < freeShippingThreshold ? shippingCost(country) : 0;
+        double total = subtotal * (1 + taxRate(country)) + shipping;
+        return Math.round(total * 100) / 100.0;
+    }
+
+    private static double lineTotal(OrderItem item) {
+        double line = item.getProduct().getPrice() * item.getQuantity();
+        String category = item.getProduct().getCategory();
+        if ("BOOKS".equals(category)) {
+            return line * 0.95;
+        }
+        if ("ELECTRONICS".equals(category) && item.getQuantity() >= 3) {
+            return line * 0.9;
+        }
+        return line;
+    }
+
+    private static double tierFactor(String tier) {
+        if ("GOLD".equals(tier)) {
+            return 0.9;
+        }
+        if ("SILVER".equals(tier)) {
+            return 0.95;
+        }
+        return 1.0;
+    }
+
+    private double applyCoupon(double subtotal, String couponCode) {
+        if (couponCode == null) {
+            return subtotal;
+        }
+        Double percent = coupons.get(couponCode);
+        if (percent == null) {
+            throw new IllegalArgumentException("unknown coupon: " + couponCode);
+        }
+        return subtotal * (100 - percent) / 100;
+    }
+
+    private static double shippingCost(String country) {
+        if ("US".equals(country)) {
+            return 5;
+        }
+        if ("CA".equals(country) || "MX".equals(country)) {
+            return 10;
+        }
+        return 20;
+    }
+
+    private static double taxRate(String country) {
+        if ("US".equals(country)) {
+            return 0.07;
+        }
+        if ("DE".equals(country) || "FR".equals(country)) {
+            return 0.2;
+        }
+        return 0.1;
+    }
+
+    public void cancelOrder(String orderId) {
+        Order order = requireOrder(orderId);
+        if ("SHIPPED".equals(order.getStatus()) || "DELIVERED".equals(order.getStatus())) {
+            throw new IllegalStateException("order already shipped: " + orderId);
+        }
+        if ("CANCELLED".equals(order.getStatus())) {
+            return;
+        }
+        for (OrderItem item : order.getItems()) {
+            adjustStock(item, item.getQuantity());
+        }
+        order.setStatus("CANCELLED");
+        auditLog.add("cancelled " + orderId);
+    }
+
+    public void shipOrder(String orderId) {
+        transition(orderId, "NEW", "SHIPPED", "only new orders can be shipped: ");
+    }
+
+    public void deliverOrder(String orderId) {
+        transition(orderId, "SHIPPED", "DELIVERED", "only shipped orders can be delivered: ");
+    }
+
+    private void transition(String orderId, String from, String to, String error) {
+        Order order = requireOrder(orderId);
+        if (!from.equals(order.getStatus())) {
+            throw new IllegalStateException(error + orderId);
+        }
+        order.setStatus(to);
+        auditLog.add(to.toLowerCase() + " " + orderId);
+    }
+
+    private Order requireOrder(String orderId) {
+        Order order = orders.get(orderId);
+        if (order == null) {
+            throw new IllegalArgumentException("unknown order: " + orderId);
+        }
+        return order;
+    }
+
+    public List<String> lowStockReport() {
+        List<String> report = new ArrayList<>();
+        for (Product product : inventory.values()) {
+            if (product.getStock() == 0) {
+                report.add(product.getSku() + ": out of stock");
+            } else if (product.getStock() <= lowStockThreshold) {
+                report.add(product.getSku() + ": " + product.getStock() + " left");
+            }
+        }
+        report.sort(null);
+        return report;
+    }
+
+    public String customerSummary(String email) {
+        Customer customer = customers.get(email);
+        if (customer == null) {
+            return "unknown customer";
+        }
+        int placed = 0;
+        int cancelled = 0;
+        int items = 0;
+        for (Order order : orders.values()) {
+            if (!order.getCustomer().getEmail().equals(email)) {
+                continue;
+            }
+            if ("CANCELLED".equals(order.getStatus())) {
+                cancelled++;
+            } else {
+                placed++;
+                items += itemCount(order);
+            }
+        }
+        String tier = customer.getTier() == null ? "STANDARD" : customer.getTier();
+        return customer.getName() + " (" + tier + "): " + placed + " orders, " + items + " items, " + cancelled + " cancelled";
+    }
+
+    private static int itemCount(Order order) {
+        int items = 0;
+        for (OrderItem item : order.getItems()) {
+            items += item.getQuantity();
+        }
+        return items;
+    }
+
+    public Map<String, Integer> unitsSoldByCategory() {
+        Map<String, Integer> units = new HashMap<>();
+        for (Order order : orders.values()) {
+            if ("CANCELLED".equals(order.getStatus())) {
+                continue;
+            }
+            for (OrderItem item : order.getItems()) {
+                String category = item.getProduct().getCategory() == null ? "OTHER" : item.getProduct().getCategory();
+                units.merge(category, item.getQuantity(), Integer::sum);
+            }
+        }
+        return units;
+    }
+
+    public List<String> getAuditLog() {
+        return new ArrayList<>(auditLog);
+    }
+}
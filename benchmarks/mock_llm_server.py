@@ -0,0 +1,287 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from refAgent.prompt import (REFACTORING_GENERATOR_PROMPT, METHOD_REFACTORING_PROMPT, PLANNER_PROMPT, PLANNER_JSON_PROMPT,
+                             COMPILER_PROMPT, TEST_SUMMARY_PROMPT, MULTI_TEST_SUMMARY_PROMPT)
+from refAgent.refactoring_plan import parse_plan
+
+# Request kinds, recognised from the prompts RefAgent_main and agents.py send
+KINDS = ("plan", "decision", "generate", "compile_summary", "test_summary", "judge", "other")
+
+DEFAULT_PLAN = "{\n\tMethod1: (yes, split the method into smaller private helpers)\n}"
+SUMMARY_REPLY = json.dumps({"summary": "Scripted summary from the mock LLM.",
+                            "suggestions": ["Fix the reported error.", "Keep the public API unchanged."]})
+CLASS_DECLARATION = re.compile(r"^\s*(?:(?:public|abstract|final)\s+)*class\s+(\w+)", re.MULTILINE)
+
+
+def load_scripts(responses_dir):
+    """
+    Read the scripted replies of every class from `responses_dir/<ClassName>/`:
+    the `*.java` files in name order are the successive generator replies (the last one
+    repeats once the script is exhausted), and an optional `plan.txt` is the planner reply
+    (free-text format; sent as a JSON plan when the request asks for JSON).
+    :return: {class name: {"generate": [code, ...], "plan": text or None}}
+    """
+    scripts = {}
+    if not responses_dir or not os.path.isdir(responses_dir):
+        return scripts
+    for class_name in sorted(os.listdir(responses_dir)):
+        class_dir = os.path.join(responses_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        replies = []
+        for name in sorted(os.listdir(class_dir)):
+            if name.endswith(".java"):
+                with open(os.path.join(class_dir, name), "r", encoding="utf-8") as f:
+                    replies.append(f.read())
+        plan = None
+        if os.path.exists(os.path.join(class_dir, "plan.txt")):
+            with open(os.path.join(class_dir, "plan.txt"), "r", encoding="utf-8") as f:
+                plan = f.read().strip()
+        scripts[class_name] = {"generate": replies, "plan": plan}
+    return scripts
+
+
+def classify(messages):
+    """The kind of a chat request (see KINDS) from its system prompt and latest user message."""
+    system = next((m["content"] for m in messages if m["role"] == "system"), None)
+    latest = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    # Follow-up questions are sent without a system prompt, but inherit the planner's from the history
+    if "does at least one method need improvement" in latest:
+        return "decision"
+    if "Compare these two versions" in latest:
+        return "judge"
+    if system in (PLANNER_PROMPT, PLANNER_JSON_PROMPT):
+        return "plan"
+    if system in (REFACTORING_GENERATOR_PROMPT, METHOD_REFACTORING_PROMPT):
+        return "generate"
+    if system == COMPILER_PROMPT:
+        return "compile_summary"
+    if system in (TEST_SUMMARY_PROMPT, MULTI_TEST_SUMMARY_PROMPT):
+        return "test_summary"
+    return "other"
+
+
+def target_class(messages):
+    """Name of the first class declared in the user messages (the class being refactored)."""
+    for m in messages:
+        if m["role"] == "user":
+            match = CLASS_DECLARATION.search(m["content"] or "")
+            if match:
+                return match.group(1)
+    return None
+
+
+def class_body(code):
+    """The members of a scripted class, as a method-level reply: everything between the class
+    declaration line and the final closing brace (kept when the script is truncated)."""
+    lines = code.strip().splitlines()
+    start = next((i + 1 for i, line in enumerate(lines) if CLASS_DECLARATION.match(line)), 0)
+    end = len(lines) - 1 if len(lines) > start and lines[-1].strip() == "}" else len(lines)
+    return "\n".join(lines[start:end])
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def token_pieces(text, size=4):
+    """Split a reply into the pieces streamed as successive chunks (about one token each)."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class MockLLMServer:
+    def __init__(self, responses_dir=None, latency_ms=0.0, ms_per_token=0.0, host="127.0.0.1", port=0):
+        """
+        Deterministic stand-in for the OpenAI-compatible chat completions endpoint used by
+        OpenAILLM/AsyncOpenAILLM (POST /v1/chat/completions). Generator requests are answered
+        from the per-class scripts of `responses_dir` (see load_scripts; method-level
+        requests with the members of the scripted class), the planner with the
+        scripted plan (as JSON when asked for it), yes/no questions with "True" and summaries with a fixed JSON object.
+        Every reply waits `latency_ms` plus `ms_per_token` per completion token; with
+        `"stream": true` the reply is sent as server-sent events, one chunk per token.
+        Requests per kind are counted in `counts`, completion tokens actually sent in
+        `completion_tokens` and streams closed by the client before the end in `cancelled`;
+        `port=0` picks a free port.
+        """
+        self.scripts = load_scripts(responses_dir)
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+        self.counts = {kind: 0 for kind in KINDS}
+        self.generated = {}  # class name -> generator requests answered
+        self.completion_tokens = 0
+        self.cancelled = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reply_for(self, messages, json_plan=False):
+        """The scripted reply to a chat request; also counts the request."""
+        kind = classify(messages)
+        with self._lock:
+            self.counts[kind] += 1
+            class_name = target_class(messages)
+            script = self.scripts.get(class_name, {})
+            if kind == "generate":
+                replies = script.get("generate") or []
+                served = self.generated.get(class_name, 0)
+                self.generated[class_name] = served + 1
+                if not replies:
+                    return "```java\n// No scripted reply for this class\n```"
+                reply = replies[min(served, len(replies) - 1)].strip()
+                # Method-level requests get the scripted class's members; the pipeline keeps the flagged methods and new helpers
+                if next((m["content"] for m in messages if m["role"] == "system"), None) == METHOD_REFACTORING_PROMPT:
+                    reply = class_body(reply)
+                return "```java\n" + reply + "\n```"
+        if kind == "plan":
+            plan = script.get("plan") or DEFAULT_PLAN
+            return json.dumps({"methods": parse_plan(plan)}) if json_plan else plan
+        if kind in ("decision", "judge"):
+            return "True"
+        if kind in ("compile_summary", "test_summary"):
+            return SUMMARY_REPLY
+        return "False"
+
+    def count_tokens(self, completion_tokens, cancelled=False):
+        with self._lock:
+            self.completion_tokens += completion_tokens
+            self.cancelled += int(cancelled)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                messages = request.get("messages") or []
+                json_plan = bool(request.get("response_format")) or any(
+                    m["role"] == "system" and m["content"] == PLANNER_JSON_PROMPT for m in messages)
+                reply = server.reply_for(messages, json_plan=json_plan)
+                prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+                if request.get("stream"):
+                    self.stream_reply(request, reply, prompt_tokens)
+                    return
+
+                completion_tokens = estimate_tokens(reply)
+                delay = server.latency_ms + server.ms_per_token * completion_tokens
+                if delay > 0:
+                    time.sleep(delay / 1000)
+                server.count_tokens(completion_tokens)
+
+                body = json.dumps({
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "mock"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": reply}}],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def stream_reply(self, request, reply, prompt_tokens):
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+                def chunk(delta, finish_reason=None, usage=None):
+                    payload = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": request.get("model", "mock"),
+                        "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    }
+                    if usage:
+                        payload["usage"] = usage
+                    self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                if server.latency_ms > 0:
+                    time.sleep(server.latency_ms / 1000)
+                sent = 0
+                try:
+                    chunk({"role": "assistant", "content": ""})
+                    for piece in token_pieces(reply):
+                        if server.ms_per_token > 0:
+                            time.sleep(server.ms_per_token / 1000)
+                        chunk({"content": piece})
+                        sent += 1
+                    chunk({}, finish_reason="stop")
+                    if (request.get("stream_options") or {}).get("include_usage"):
+                        chunk({}, usage={"prompt_tokens": prompt_tokens, "completion_tokens": sent,
+                                         "total_tokens": prompt_tokens + sent})
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading: generation is cancelled like on a real server
+                    server.count_tokens(sent, cancelled=True)
+                    self.close_connection = True
+                    return
+                server.count_tokens(sent)
+
+            def log_message(self, format, *args):
+                pass  # keep the pipeline output readable
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve scripted chat completions for offline RefAgent runs")
+    parser.add_argument("--responses", default=None, help="Folder with <ClassName>/*.java scripted generator replies")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed delay per reply")
+    parser.add_argument("--ms-per-token", type=float, default=0.0, help="Extra delay per completion token")
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(args.responses, args.latency_ms, args.ms_per_token, port=args.port).start()
+    print(f"Mock LLM listening on {server.base_url} (set Settings.LLM_BASE_URL to use it)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+        print(json.dumps({"requests": server.counts, "completion_tokens": server.completion_tokens,
+                          "cancelled": server.cancelled}, indent=2))
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import argparse
+import tempfile
+from refAgent import RefAgent_main
+from refAgent.utilities import run_maven
+from refAgent.workspaces import create_workspace
+from refAgent.benchmarks.mock_llm_server import MockLLMServer
+from settings import Settings
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Per-class counters of RefAgent_main.process_god_class reported for every god class
+CLASS_COUNTERS = ("Iterations", "Pre-check rejections", "javac rejections", "Maven builds", "LLM tokens")
+# Trace spans counted as build and test invocations
+BUILD_SPANS = ("javac", "maven.compile", "maven.classpath", "maven.install")
+TEST_SPANS = ("maven.test",)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run RefAgent offline against the bundled fixture projects and a mock LLM")
+    parser.add_argument("fixtures", nargs="*", help="Fixture names under benchmarks/fixtures (default: all)")
+    parser.add_argument("--workdir", default=None,
+                        help="Folder used as HOME and working directory of the run (default: a temporary folder)")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory afterwards")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mock LLM delay per reply")
+    parser.add_argument("--ms-per-token", type=float, default=0.0, help="Mock LLM extra delay per completion token")
+    parser.add_argument("--no-streaming", action="store_true", help="Wait for full LLM replies (LLM_STREAMING = False)")
+    parser.add_argument("--output", default=None, help="Also write the report as JSON to this file")
+    parser.add_argument("--metrics-backend", choices=("designite", "python"), default=None,
+                        help="METRICS_BACKEND for the run (default: the one in settings.py)")
+    # Passed through to RefAgent_main
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--candidates", type=int, default=1)
+    parser.add_argument("--build-top", type=int, default=1)
+    parser.add_argument("--select-tests", action="store_true")
+    parser.add_argument("--method-level", action="store_true")
+    return parser.parse_args(argv)
+
+
+def stage_project(fixture_dir, name, home):
+    """Lay out the fixture the way run_refAgent.sh does: ~/projects/before/<name>, a copy
+    of it at ~/projects/after/<name>, built once with Maven. Returns the Maven process."""
+    before = os.path.join(home, "projects", "before", name)
+    after = os.path.join(home, "projects", "after", name)
+    shutil.rmtree(before, ignore_errors=True)
+    shutil.copytree(os.path.join(fixture_dir, "project"), before)
+    strategy = create_workspace(before, after, "copy")
+    print(f"[{name}] Workspace {after} ({strategy}); building with Maven...")
+    return run_maven(["clean", "install", "-DskipTests", "-q"], project_dir=after,
+                     backend=Settings.MAVEN_BACKEND, timeout=Settings.MAVEN_COMPILE_TIMEOUT)
+
+
+def collect_report(name, wall_s, server):
+    """Read back what the pipeline exported for `name`: per-stage timings, per-class counters
+    and build/test invocations, plus the requests the mock LLM answered."""
+    stages = {}
+    if os.path.exists(f"results/{name}/trace_summary.json"):
+        with open(f"results/{name}/trace_summary.json", "r", encoding="utf-8") as f:
+            stages = json.load(f)
+
+    classes = {}
+    for metrics_file in sorted(glob.glob(f"results/{name}/*/metrics.json")):
+        with open(metrics_file, "r", encoding="utf-8") as f:
+            results = json.load(f)
+        entry = {counter: results.get(counter, 0) for counter in CLASS_COUNTERS}
+        entry["improved"] = results.get("is improved") is True
+        classes[os.path.basename(os.path.dirname(metrics_file))] = entry
+
+    return {
+        "wall_s": round(wall_s, 3),
+        "stages": stages,
+        "classes": classes,
+        "builds": {span_name: stages[span_name]["count"] for span_name in BUILD_SPANS if span_name in stages},
+        "tests": {span_name: stages[span_name]["count"] for span_name in TEST_SPANS if span_name in stages},
+        "llm_requests": dict(server.counts),
+        "llm_completion_tokens": server.completion_tokens,
+        "llm_cancelled_streams": server.cancelled,
+    }
+
+
+def format_report(name, report):
+    lines = [f"=== {name}: {report['wall_s']:.2f}s wall clock ==="]
+    for class_name, entry in report["classes"].items():
+        lines.append(f"{class_name}: improved={entry['improved']} iterations={entry['Iterations']} "
+                     f"pre-check rejections={entry['Pre-check rejections']} javac rejections={entry['javac rejections']} "
+                     f"Maven builds={entry['Maven builds']} LLM tokens={entry['LLM tokens']}")
+    lines.append(f"Build invocations: {report['builds']}  Test invocations: {report['tests']}")
+    lines.append(f"LLM requests: {report['llm_requests']}")
+    lines.append(f"LLM completion tokens sent: {report['llm_completion_tokens']} "
+                 f"({report['llm_cancelled_streams']} streams cancelled)")
+    lines.append(f"{'stage':<28} {'count':>6} {'total_s':>10} {'p50_s':>9} {'p95_s':>9}")
+    for stage, row in report["stages"].items():
+        lines.append(f"{stage:<28} {row['count']:>6} {row['total_s']:>10.3f} {row['p50_s']:>9.3f} {row['p95_s']:>9.3f}")
+    return "\n".join(lines)
+
+
+def run_fixture(name, args, home):
+    fixture_dir = os.path.join(FIXTURES_DIR, name)
+    build = stage_project(fixture_dir, name, home)
+    if build.returncode != 0:
+        print(f"[{name}] Initial Maven build failed, skipping:\n{build.stdout[-2000:]}{build.stderr[-2000:]}")
+        return {"error": "initial build failed"}
+
+    server = MockLLMServer(os.path.join(fixture_dir, "responses"), args.latency_ms, args.ms_per_token).start()
+    Settings.LLM_BASE_URL = server.base_url
+    try:
+        pipeline_args = [name, "--tag", "benchmark", "--workers", str(args.workers),
+                         "--candidates", str(args.candidates), "--build-top", str(args.build_top)]
+        if args.select_tests:
+            pipeline_args.append("--select-tests")
+        if args.method_level:
+            pipeline_args.append("--method-level")
+        started = time.perf_counter()
+        RefAgent_main.main(pipeline_args)
+        return collect_report(name, time.perf_counter() - started, server)
+    finally:
+        server.stop()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.fixtures or sorted(d for d in os.listdir(FIXTURES_DIR) if os.path.isdir(os.path.join(FIXTURES_DIR, d)))
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="refagent-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+
+    # The pipeline resolves projects under ~ and writes results/, data/ and code_smells/ under
+    # the working directory; both point at the scratch folder for the duration of the run.
+    # LLM replies must come from the mock, never from a response cache of an earlier run.
+    saved_settings = {key: getattr(Settings, key)
+                      for key in ("LLM_BASE_URL", "LLM_CACHE_ENABLED", "LLM_STREAMING", "TRACING_ENABLED", "METRICS_BACKEND")}
+    saved_home, saved_cwd = os.environ.get("HOME"), os.getcwd()
+    designite_jar = os.path.abspath(RefAgent_main.DESIGNITE_JAR)
+    Settings.LLM_CACHE_ENABLED = False
+    if args.no_streaming:
+        Settings.LLM_STREAMING = False
+    Settings.TRACING_ENABLED = True
+    if args.metrics_backend:
+        Settings.METRICS_BACKEND = args.metrics_backend
+    os.environ["HOME"] = workdir
+    os.chdir(workdir)
+    if os.path.exists(designite_jar) and not os.path.exists(RefAgent_main.DESIGNITE_JAR):
+        os.makedirs(os.path.dirname(RefAgent_main.DESIGNITE_JAR), exist_ok=True)
+        os.symlink(designite_jar, RefAgent_main.DESIGNITE_JAR)
+    reports = {}
+    try:
+        for name in names:
+            reports[name] = run_fixture(name, args, workdir)
+    finally:
+        os.chdir(saved_cwd)
+        if saved_home is not None:
+            os.environ["HOME"] = saved_home
+        for key, value in saved_settings.items():
+            setattr(Settings, key, value)
+
+    for name, report in reports.items():
+        if "error" not in report:
+            print(format_report(name, report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Benchmark report saved to {args.output}")
+
+    if args.keep or args.workdir:
+        print(f"Working directory kept at {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if all("error" not in report for report in reports.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import javalang
+from javac_parser import parse, cyclomatic_complexity, type_members
+
+# Bumped whenever a metric definition changes, so cached results can be told apart
+CK_METRICS_VERSION = 1
+
+def _closing_lines(code):
+    """Map the position of every '{' token to the line of its matching '}'."""
+    closing = {}
+    stack = []
+    for token in javalang.tokenizer.tokenize(code):
+        if isinstance(token, javalang.tokenizer.Separator):
+            if token.value == "{":
+                stack.append(token.position)
+            elif token.value == "}" and stack:
+                closing[stack.pop()] = token.position[0]
+    return closing
+
+def _declaration_lines(node, open_braces, closing):
+    """Return (first line, last line) of a declaration, annotations included.
+
+    The last line is the line of the closing brace of the first block opened after
+    the declaration starts; declarations without a body (abstract/interface methods)
+    end on their first line.
+    """
+    start = node.position[0]
+    for annotation in getattr(node, "annotations", None) or []:
+        if annotation.position is not None:
+            start = min(start, annotation.position[0])
+
+    if isinstance(node, javalang.tree.MethodDeclaration) and node.body is None:
+        return start, node.position[0]
+
+    for position in open_braces:
+        if tuple(position) >= tuple(node.position):
+            return start, closing.get(position, position[0])
+    return start, node.position[0]
+
+def _field_names(type_decl):
+    names = set()
+    for field in type_members(type_decl):
+        if not isinstance(field, javalang.tree.FieldDeclaration):
+            continue
+        for declarator in field.declarators:
+            names.add(declarator.name)
+    return names
+
+def _used_fields(method, fields):
+    used = set()
+    for _, ref in method.filter(javalang.tree.MemberReference):
+        if ref.member in fields and ref.qualifier in (None, "", "this"):
+            used.add(ref.member)
+    return used
+
+def _called_methods(method, method_names):
+    called = set()
+    for _, call in method.filter(javalang.tree.MethodInvocation):
+        if call.member in method_names and call.qualifier in (None, "", "this"):
+            called.add(call.member)
+    return called
+
+def lack_of_cohesion(type_decl):
+    """LCOM as connected components of the method graph divided by the number of methods.
+
+    Two methods are connected when they use a common field of the type or one calls
+    the other. Constructors are ignored. Returns -1.0 when the type has no methods
+    or no fields, as Designite does.
+    """
+    methods = [member for member in type_members(type_decl) if isinstance(member, javalang.tree.MethodDeclaration)]
+    fields = _field_names(type_decl)
+    if not methods or not fields:
+        return -1.0
+
+    method_names = {method.name for method in methods}
+    uses = [_used_fields(method, fields) for method in methods]
+    calls = [_called_methods(method, method_names) for method in methods]
+
+    parent = list(range(len(methods)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(methods)):
+        for j in range(i + 1, len(methods)):
+            if uses[i] & uses[j] or methods[j].name in calls[i] or methods[i].name in calls[j]:
+                parent[find(i)] = find(j)
+
+    components = len({find(i) for i in range(len(methods))})
+    return components / len(methods)
+
+def compute_ck_metrics(code):
+    """Compute Designite-style method and type metrics for every type in `code`.
+
+    Returns a dict keyed by type name with the same layout `JavaMetricsCalculator`
+    builds from Designite's CSV files:
+        {type: {"methods": [{"Method Name", "Cyclomatic Complexity (CC)",
+                             "Lines of Code (LOC)", "Parameter Count (PC)"}, ...],
+                "class_metrics": {"Number of Fields (NOF)", ..., "Lack of Cohesion of Methods (LCOM)"}}}
+    Raises javalang errors when the code does not parse.
+    """
+    tree = parse(code)
+    closing = _closing_lines(code)
+    open_braces = sorted(closing)
+
+    metrics = {}
+    for _, type_decl in tree.filter(javalang.tree.TypeDeclaration):
+        members = [
+            member for member in type_members(type_decl)
+            if isinstance(member, (javalang.tree.MethodDeclaration, javalang.tree.ConstructorDeclaration))
+        ]
+
+        method_metrics = []
+        for member in members:
+            start, end = _declaration_lines(member, open_braces, closing)
+            method_metrics.append({
+                "Method Name": member.name,
+                "Cyclomatic Complexity (CC)": cyclomatic_complexity(member),
+                "Lines of Code (LOC)": end - start + 1,
+                "Parameter Count (PC)": len(member.parameters),
+            })
+
+        fields = [field for field in type_members(type_decl) if isinstance(field, javalang.tree.FieldDeclaration)]
+        start, end = _declaration_lines(type_decl, open_braces, closing)
+        metrics[type_decl.name] = {
+            "methods": method_metrics,
+            "class_metrics": {
+                "Number of Fields (NOF)": sum(len(field.declarators) for field in fields),
+                "Number of Public Fields (NOPF)": sum(len(field.declarators) for field in fields if "public" in field.modifiers),
+                "Number of Methods (NOM)": len(members),
+                "Number of Public Methods (NOPM)": sum(1 for member in members if "public" in member.modifiers),
+                "Lines of Code (LOC)": end - start + 1,
+                "Weighted Methods per Class (WMC)": sum(m["Cyclomatic Complexity (CC)"] for m in method_metrics),
+                "Lack of Cohesion of Methods (LCOM)": lack_of_cohesion(type_decl),
+            },
+        }
+    return metrics
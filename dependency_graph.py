@@ -2,115 +2,376 @@ import javalang
 import networkx as nx
 import matplotlib.pyplot as plt
 import os
+import re
 import json
+import hashlib
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from refAgent.utilities import create_directory_if_not_exists
-from javac_parser import parse
+from javac_parser import parse, describe_parse_error, type_members
+
+TEST_CLASS_PATTERN = re.compile(r"^(Test\w*|\w+Tests?|\w+TestCase|\w+IT)$")
+
+def is_test_class(class_name, file_path=None):
+    """Heuristic used to tell test classes apart: Maven test folder or usual naming conventions."""
+    if file_path and f"{os.sep}src{os.sep}test{os.sep}" in file_path:
+        return True
+    return bool(TEST_CLASS_PATTERN.match(class_name))
+
+def _type_name(type_node):
+    """Dotted name of a type as written, e.g. `Map.Entry` or `com.example.Order` (no type arguments)."""
+    parts = []
+    while type_node is not None:
+        parts.append(type_node.name)
+        type_node = getattr(type_node, "sub_type", None)
+    return ".".join(parts)
+
+def summarize_java_source(code, file_path=None):
+    """Parse one Java compilation unit into compact per-class summaries.
+
+    Only what the dependency graph needs is kept (no AST), so summaries can be
+    stored in the index and merged cheaply. Type names are kept as written; they
+    are resolved to fully qualified names once every class is known (see
+    `JavaClassDependencyAnalyzer`). Raises javalang errors on invalid code.
+    """
+    tree = parse(code)
+    package = tree.package.name if tree.package else ""
+    imports, on_demand = set(), set()
+    for _, node in tree.filter(javalang.tree.Import):
+        if node.wildcard:
+            on_demand.add(node.path)
+        else:
+            # `import static a.B.member` makes the class a.B a dependency
+            imports.add(node.path.rpartition(".")[0] if node.static else node.path)
+
+    summaries = []
+    # Classes, interfaces, enums and annotation types (javalang has no records)
+    for path, node in tree.filter(javalang.tree.TypeDeclaration):
+        enclosing = [parent.name for parent in path if isinstance(parent, javalang.tree.TypeDeclaration)]
+        qualified = ".".join(([package] if package else []) + enclosing + [node.name])
+        # A class extends one type, an interface a list of them
+        extends = getattr(node, "extends", None) or []
+        summaries.append({
+            'name': node.name,
+            'qualified': qualified,
+            'package': package,
+            'nested': bool(enclosing),
+            'file': file_path,
+            'abstract': 'abstract' in node.modifiers or not isinstance(node, (javalang.tree.ClassDeclaration, javalang.tree.EnumDeclaration)),
+            'imports': sorted(imports),
+            'on_demand_imports': sorted(on_demand),
+            'extends': [_type_name(base) for base in (extends if isinstance(extends, list) else [extends])],
+            'implements': [_type_name(iface) for iface in (getattr(node, "implements", None) or [])],
+            'methods': [member.name for member in type_members(node) if isinstance(member, javalang.tree.MethodDeclaration)],
+            # Qualifiers of method calls (`Foo.bar()` -> Foo) and every type the class mentions
+            'invokes': sorted({call.qualifier for _, call in node.filter(javalang.tree.MethodInvocation) if call.qualifier}),
+            'references': sorted({_type_name(ref) for _, ref in node.filter(javalang.tree.ReferenceType)}),
+        })
+    return summaries
+
+# Below this many files the process pool start-up costs more than it saves
+PARALLEL_PARSE_MIN_FILES = 64
+
+def _hash_source(data):
+    return hashlib.sha1(data).hexdigest()
+
+def _summarize_file(file_path):
+    """Process-pool entry point: read, hash and summarize one file without raising.
+
+    Returns:
+        (file_path, sha1, summaries or None, error message or None)
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    try:
+        return file_path, _hash_source(data), summarize_java_source(data.decode('utf-8', errors='replace'), file_path), None
+    except Exception as e:  # JavaSyntaxError, LexerError, or a javalang crash on unusual syntax
+        return file_path, _hash_source(data), None, describe_parse_error(e)
+
+def summarize_files(file_paths, workers=None):
+    """Summarize many files, fanning javalang parsing out across processes.
+
+    Yields `_summarize_file` results in input order. Small batches, or `workers` <= 1,
+    are parsed in the current process.
+    """
+    file_paths = list(file_paths)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(file_paths) < PARALLEL_PARSE_MIN_FILES:
+        for file_path in file_paths:
+            yield _summarize_file(file_path)
+        return
+
+    chunksize = max(1, len(file_paths) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_summarize_file, file_paths, chunksize=chunksize)
+
+def _iter_java_files(directory):
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith(".java"):
+                yield os.path.join(root, file)
+
+class DependencyIndex:
+    """Persistent, project-wide index of class summaries stored in SQLite.
+
+    Rows are keyed by file path and content hash, so `update` only re-parses files
+    that changed since the previous run. Files that fail to parse are stored with
+    their error and are not retried until their content changes.
+    """
+
+    SCHEMA_VERSION = 3
+
+    def __init__(self, db_path):
+        directory_path = os.path.dirname(db_path)
+        if directory_path:
+            create_directory_if_not_exists(directory_path)
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self.connection.executescript("""
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS classes;
+            """)
+        self.connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, sha1 TEXT NOT NULL, summaries TEXT, error TEXT);
+            CREATE TABLE IF NOT EXISTS classes (name TEXT NOT NULL, qualified TEXT NOT NULL, path TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS classes_by_name ON classes (name);
+            PRAGMA user_version = {self.SCHEMA_VERSION};
+        """)
+
+    def update(self, directory, workers=None):
+        """Bring the index in line with the `.java` files under `directory`.
+
+        Changed files are parsed in parallel (see `summarize_files`).
+
+        Returns:
+            A dict with the number of `parsed`, `reused` and `removed` files and the
+            `errors` (path -> message) of files that could not be parsed.
+        """
+        known = dict(self.connection.execute("SELECT path, sha1 FROM files"))
+        stats = {"parsed": 0, "reused": 0, "removed": 0, "errors": {}}
+        seen = set()
+        changed = []
+
+        for file_path in _iter_java_files(directory):
+            seen.add(file_path)
+            with open(file_path, 'rb') as f:
+                sha1 = _hash_source(f.read())
+            if known.get(file_path) == sha1:
+                stats["reused"] += 1
+            else:
+                changed.append(file_path)
+
+        for file_path, sha1, summaries, error in summarize_files(changed, workers=workers):
+            if error is not None:
+                stats["errors"][file_path] = error
+            self._store(file_path, sha1, summaries, error)
+            stats["parsed"] += 1
+
+        for file_path in set(known) - seen:
+            self.connection.execute("DELETE FROM files WHERE path = ?", (file_path,))
+            self.connection.execute("DELETE FROM classes WHERE path = ?", (file_path,))
+            stats["removed"] += 1
+
+        self.connection.commit()
+        return stats
+
+    def _store(self, file_path, sha1, summaries, error):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files (path, sha1, summaries, error) VALUES (?, ?, ?, ?)",
+            (file_path, sha1, json.dumps(summaries, separators=(",", ":")) if summaries is not None else None, error),
+        )
+        self.connection.execute("DELETE FROM classes WHERE path = ?", (file_path,))
+        self.connection.executemany(
+            "INSERT INTO classes (name, qualified, path) VALUES (?, ?, ?)",
+            [(summary['name'], summary['qualified'], file_path) for summary in summaries or []],
+        )
+
+    def iter_file_summaries(self):
+        """Yield the list of class summaries of every successfully parsed file."""
+        for (summaries,) in self.connection.execute("SELECT summaries FROM files WHERE summaries IS NOT NULL"):
+            yield json.loads(summaries)
+
+    def parse_errors(self):
+        """Return path -> error message for every indexed file that could not be parsed."""
+        return dict(self.connection.execute("SELECT path, error FROM files WHERE error IS NOT NULL"))
+
+    def files_for_class(self, class_name):
+        """Return the files declaring a class with this simple or fully qualified name."""
+        return [path for (path,) in self.connection.execute(
+            "SELECT path FROM classes WHERE name = ? OR qualified = ?", (class_name, class_name))]
+
+    def close(self):
+        self.connection.close()
+
 class JavaClassDependencyAnalyzer:
+    """Class dependency graph of a project, keyed by fully qualified class name.
+
+    `target_class` and the `target_class` arguments below may be a simple or a fully
+    qualified name; a simple name shared by several classes is disambiguated by the
+    declaring file when one is given, and otherwise stands for all of them.
+    """
+
     def __init__(self, target_class):
         self.target_class = target_class
-        self.classes = {}
+        self.classes = {}  # qualified name -> class info
         self.dependencies = nx.DiGraph()
-    def analyze(self, code):
+        # file path -> parse error message, for files javalang could not parse
+        self.parse_errors = {}
+        self._by_simple_name = {}
+        self._dependents = None  # qualified name -> qualified names of the classes using it, built on demand
+    def analyze(self, code, file_path=None):
         try:
-            tree =parse(code)
-            imports = set()
-            class_name = None
-
-            # First, collect imports
-            for path, node in tree.filter(javalang.tree.Import):
-                if isinstance(node, javalang.tree.Import):
-                    # Collect imports
-                    imports.add(node.path.split(".")[-1])
-
-            # Check if the target class is imported
-            if self.target_class in imports:
-                # Traverse the tree again to find the class declaration and add dependency
-                for path, node in tree:
-                    if isinstance(node, javalang.tree.ClassDeclaration):
-                        class_name = node.name
-                        self.dependencies.add_edge(self.target_class, class_name)
-                        self.classes[class_name] = {
-                            'name': class_name,
-                            'methods': [],
-                            'dependencies': set()
-                        }
-                        break  # We only need to add this class if it imports the target class
-
-            for path, node in tree:
-                if isinstance(node, javalang.tree.ClassDeclaration):
-                    class_name = node.name
-                    self.classes[class_name] = {
-                        'name': class_name,
-                        'methods': [],
-                        'dependencies': set()
-                    }
-
-                    # Inheritance (extends)
-                    if node.extends:
-                        base_class = node.extends.name
-                        if base_class == self.target_class:
-                            self.dependencies.add_edge(self.target_class, class_name)
-                        self.classes[class_name]['dependencies'].add(base_class)
-                        self.dependencies.add_edge(class_name, base_class)
-
-                    # Interfaces (implements)
-                    if node.implements:
-                        for iface in node.implements:
-                            iface_name = iface.name
-                            if iface_name == self.target_class:
-                                self.dependencies.add_edge(self.target_class, class_name)
-                            self.classes[class_name]['dependencies'].add(iface_name)
-                            self.dependencies.add_edge(class_name, iface_name)
-
-                    # Method calls within the class
-                    for method in node.methods:
-                        
-                        self.classes[class_name]['methods'].append(method.name)
-                        if method.body is not None: 
-                            for expr in method.body:
-                                if isinstance(expr, javalang.tree.MethodInvocation):
-                                    called_class = expr.qualifier or ""
-                                    self.classes[class_name]['dependencies'].add(called_class)
-                                    if called_class == self.target_class:
-                                        self.dependencies.add_edge(class_name, called_class)
-                    
-
-        except javalang.parser.JavaSyntaxError as e:
-            print(f"Syntax error in file: {e}")
-
-    def analyze_project(self, directory):
-        # Recursively find all Java files in the project directory
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if file.endswith(".java"):
-                    file_path = os.path.join(root, file)
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        code = f.read()
-                        self.analyze(code)
+            self.add_summaries(summarize_java_source(code, file_path))
+        except Exception as e:  # JavaSyntaxError, LexerError, or a javalang crash on unusual syntax
+            self.parse_errors[file_path or "<source>"] = describe_parse_error(e)
+
+    def add_summaries(self, summaries):
+        """Merge the class summaries of one file into the graph; its edges are resolved by `build_graph`."""
+        for summary in summaries:
+            qualified = summary['qualified']
+            self.classes[qualified] = {
+                'name': summary['name'],
+                'qualified': qualified,
+                'package': summary['package'],
+                'nested': summary['nested'],
+                'file': summary['file'],
+                'abstract': summary['abstract'],
+                'methods': list(summary['methods']),
+                'imports': summary['imports'],
+                'on_demand_imports': summary['on_demand_imports'],
+                # Names as written in the source; resolved by `resolve`
+                'dependencies': set(summary['extends']) | set(summary['implements'])
+                                | set(summary['references']) | set(summary['invokes']) | set(summary['imports']),
+            }
+            self._by_simple_name.setdefault(summary['name'], set()).add(qualified)
+            self.dependencies.add_node(qualified)
+        self._dependents = None
+
+    def resolve(self, name, info):
+        """The qualified name of the project class `name` denotes inside the class `info`, or None.
+
+        Follows Java's lookup order: member types of the class and its enclosing classes,
+        single-type imports, the same package, then on-demand imports. Fully qualified
+        names are taken as they are; for `Outer.Inner` the outer class is resolved.
+        """
+        if name in self.classes:
+            return name
+        first = name.split(".")[0]
+        scope = info['qualified']
+        while len(scope) > len(info['package']):
+            candidate = f"{scope}.{first}"
+            if candidate in self.classes:
+                return candidate
+            scope = scope.rpartition(".")[0]
+        for imported in info['imports']:
+            if imported == first or imported.endswith("." + first):
+                return imported if imported in self.classes else None
+        candidate = f"{info['package']}.{first}" if info['package'] else first
+        if candidate in self.classes:
+            return candidate
+        for prefix in info['on_demand_imports']:
+            if f"{prefix}.{first}" in self.classes:
+                return f"{prefix}.{first}"
+        return None
+
+    def qualified_names(self, class_name, file_path=None):
+        """The analyzed classes a simple or qualified `class_name` may refer to."""
+        if class_name in self.classes:
+            return {class_name}
+        candidates = self._by_simple_name.get(class_name, set())
+        if file_path and len(candidates) > 1:
+            in_file = {q for q in candidates
+                       if self.classes[q]['file'] and os.path.abspath(self.classes[q]['file']) == os.path.abspath(file_path)}
+            candidates = in_file or candidates
+        return set(candidates)
+
+    def build_graph(self):
+        """Resolve the dependencies of every analyzed class into the edges of `self.dependencies`
+        (class -> class it uses). Called by `analyze_project` and whenever classes were added since."""
+        if self._dependents is None:
+            self.dependencies = nx.DiGraph()
+            self.dependencies.add_nodes_from(self.classes)
+            self._dependents = {}
+            for qualified, info in self.classes.items():
+                for name in info['dependencies']:
+                    dependency = self.resolve(name, info)
+                    if dependency is not None and dependency != qualified:
+                        self.dependencies.add_edge(qualified, dependency)
+                        self._dependents.setdefault(dependency, set()).add(qualified)
+        return self.dependencies
+
+    def analyze_project(self, directory, index_path=None, workers=None):
+        """Analyze every Java file under `directory`, parsing across `workers` processes.
+
+        With `index_path`, summaries come from a persistent `DependencyIndex` and only
+        files changed since the last run are parsed again. Files that cannot be parsed
+        are collected in `self.parse_errors`.
+        """
+        if index_path:
+            index = DependencyIndex(index_path)
+            try:
+                stats = index.update(directory, workers=workers)
+                print(f"Dependency index {index_path}: {stats['parsed']} parsed, {stats['reused']} reused, "
+                      f"{stats['removed']} removed, {len(stats['errors'])} failed to parse")
+                for summaries in index.iter_file_summaries():
+                    self.add_summaries(summaries)
+                self.parse_errors.update(index.parse_errors())
+            finally:
+                index.close()
+        else:
+            # Recursively find all Java files in the project directory
+            for file_path, _, summaries, error in summarize_files(_iter_java_files(directory), workers=workers):
+                if error is not None:
+                    self.parse_errors[file_path] = error
+                else:
+                    self.add_summaries(summaries)
+        self.build_graph()
+
+    def find_dependent_classes(self, target_class=None, file_path=None):
+        """Return the qualified names of every analyzed class that reaches `target_class`
+        directly or through other classes."""
+        targets = self.qualified_names(target_class or self.target_class, file_path)
+        self.build_graph()
+        dependents = self._dependents
+        reached = set()
+        pending = list(targets)
+        while pending:
+            current = pending.pop()
+            for class_name in dependents.get(current, ()):
+                if class_name not in reached and class_name not in targets:
+                    reached.add(class_name)
+                    pending.append(class_name)
+        return reached
+
+    def list_test_classes(self):
+        """Return the qualified names of all concrete, top-level test classes found in the analyzed project."""
+        return sorted(
+            qualified for qualified, info in self.classes.items()
+            if is_test_class(info['name'], info.get('file')) and not info.get('abstract') and not info.get('nested')
+        )
+
+    def find_affected_tests(self, target_class=None, file_path=None):
+        """Return the qualified names of the concrete test classes whose code reaches `target_class`."""
+        dependents = self.find_dependent_classes(target_class, file_path)
+        return [name for name in self.list_test_classes() if name in dependents]
     
     def export_to_json(self, filename):
-        # Create a directed graph
-        G = nx.DiGraph()
-        # Convert the networkx graph to a dictionary
-        graph_data = nx.readwrite.json_graph.node_link_data(self.dependencies)
-
-        # Add nodes to the graph
-        for node in graph_data["nodes"]:
-            G.add_node(node["id"])
-        # Add edges to the graph
-        for link in graph_data["links"]:
-            G.add_edge(link["source"], link["target"])
+        """Write the subgraph of the target class and the classes that reach it as node-link JSON.
 
+        Edges point from a class to the class it depends on. The subgraph is taken from
+        `self.dependencies`, so no project file is parsed again.
+        """
         # Verify if the target class exists in the graph
-        if self.target_class not in G.nodes:
+        targets = self.qualified_names(self.target_class)
+        if not targets:
             print(f"Target class '{self.target_class}' does not exist in the graph.")
             return
 
-        # Get the subgraph for the target class and its connected components
-        subgraph_nodes = nx.descendants(G, self.target_class) | {self.target_class}
-        self.dependencies = G.subgraph(subgraph_nodes)
-
-        graph_data = nx.readwrite.json_graph.node_link_data(self.dependencies)
+        # Get the subgraph for the target class and its dependents
+        subgraph_nodes = self.find_dependent_classes() | targets
+        graph_data = nx.readwrite.json_graph.node_link_data(self.dependencies.subgraph(subgraph_nodes))
         
         # Extract the directory path from the filename
         directory_path = os.path.dirname(filename)
@@ -1,22 +1,76 @@
 import javalang
 import os
+import re
 import glob
+import shutil
+import csv
+import json
+import hashlib
 import subprocess
-import pandas as pd
 from collections import defaultdict
+from refAgent.ck_metrics import compute_ck_metrics, CK_METRICS_VERSION
+from refAgent.utilities import DiskCache
+from refAgent.tracing import span
+
+class MetricsCache(DiskCache):
+    def __init__(self, db_path, max_entries=50000):
+        """
+        On-disk cache of `compute_metrics_for_class` results.
+        Entries are keyed by the measured source text and the backend version, so an
+        unchanged class (a duplicate candidate, a resumed run) is never measured twice.
+        """
+        super().__init__(db_path, max_entries=max_entries, table="metrics")
+
+    @staticmethod
+    def make_key(backend_version, sources, target_classes=None):
+        digest = hashlib.sha256(backend_version.encode("utf-8"))
+        for source in sources:
+            digest.update(b"\0" + source.encode("utf-8"))
+        if target_classes is not None:
+            digest.update(b"\0" + ",".join(sorted(target_classes)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_metrics(self, key):
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+
+    def put_metrics(self, key, final_metrics):
+        self.put(key, json.dumps(final_metrics))
+
+# Designite jar identity by (path, size, mtime), so the jar is hashed once per process
+_jar_digests = {}
+
+def _designite_version(designite_jar):
+    stat = os.stat(designite_jar)
+    identity = (os.path.abspath(designite_jar), stat.st_size, stat.st_mtime)
+    if identity not in _jar_digests:
+        with open(designite_jar, 'rb') as f:
+            _jar_digests[identity] = hashlib.sha1(f.read()).hexdigest()
+    return f"designite-{_jar_digests[identity]}"
 
 class JavaMetricsCalculator:
-    def __init__(self, input_path, output_path, designite_jar):
+    BACKENDS = ("designite", "python")
+
+    def __init__(self, input_path, output_path, designite_jar, backend="designite", cache=None):
         """
         Initialize the calculator with paths for input code, output metrics, and DesigniteJava.jar.
         :param input_path: Path to the folder containing Java code.
         :param output_path: Path to store DesigniteJava outputs.
         :param designite_jar: Path to the DesigniteJava jar file.
+        :param backend: "designite" runs DesigniteJava.jar; "python" computes the same metrics
+                        in-process from the javalang AST (see ck_metrics.py).
+        :param cache: Optional MetricsCache; `cache_hit` tells whether the last
+                      `compute_metrics_for_class` call was served from it (None when not consulted).
         """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown metrics backend '{backend}', expected one of {self.BACKENDS}")
         self.metrics = defaultdict(dict)
         self.input_path = input_path
         self.output_path = output_path
         self.designite_jar = designite_jar
+        self.backend = backend
+        self.cache = cache
+        self.cache_hit = None
         self.method_metrics_file = os.path.join(output_path, 'methodMetrics.csv')
         self.type_metrics_file = os.path.join(output_path, 'typeMetrics.csv')
         self.java_code = None
@@ -34,47 +88,107 @@ class JavaMetricsCalculator:
             "-i", self.input_path,
             "-o", self.output_path
         ]
-        try:
-            print("Executing DesigniteJava tool...")
-            subprocess.run(command, check=True)
-            print("DesigniteJava execution completed successfully.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error executing DesigniteJava: {e}")
+        with span("designite", input_path=self.input_path) as attributes:
+            try:
+                print("Executing DesigniteJava tool...")
+                subprocess.run(command, check=True)
+                print("DesigniteJava execution completed successfully.")
+            except subprocess.CalledProcessError as e:
+                attributes["returncode"] = e.returncode
+                print(f"Error executing DesigniteJava: {e}")
+
+    # Designite CSV columns that are read, with the type each value is converted to
+    METHOD_COLUMNS = {
+        "Type Name": str,
+        "MethodName": str,
+        "CC": int,  # Cyclomatic Complexity
+        "LOC": int,  # Lines of Code
+        "PC": int,  # Parameter Count
+    }
+    TYPE_COLUMNS = {
+        "Type Name": str,
+        "NOF": int,
+        "NOPF": int,
+        "NOM": int,
+        "NOPM": int,
+        "LOC": int,
+        "WMC": int,
+        "LCOM": float,
+    }
+    # Columns rows cannot be attributed without; a missing metric column is only reported
+    KEY_COLUMNS = ("Type Name", "MethodName")
 
-    def parse_metrics(self):
+    @staticmethod
+    def _stream_csv(file_path, columns, target_classes=None):
+        """
+        Yield the rows of a Designite CSV as dicts holding only `columns`, converted to their types.
+        Rows whose 'Type Name' is not in `target_classes` are skipped before any conversion.
+        Metric columns missing from the file (e.g. renamed by another Designite version) are
+        reported once and read as NaN; a missing key column raises a ValueError naming it.
+        """
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            header = [name.strip() for name in header]
+            missing = [name for name in columns if name not in header]
+            missing_keys = [name for name in missing if name in JavaMetricsCalculator.KEY_COLUMNS]
+            if missing_keys:
+                raise ValueError(f"{file_path} has no {', '.join(repr(name) for name in missing_keys)} column"
+                                 f"{'s' if len(missing_keys) > 1 else ''} "
+                                 f"(found: {', '.join(header)}); unsupported DesigniteJava version?")
+            if missing:
+                print(f"{file_path} has no {', '.join(repr(name) for name in missing)} column"
+                      f"{'s' if len(missing) > 1 else ''}; reading NaN instead")
+            fields = [(name, header.index(name) if name in header else None, kind) for name, kind in columns.items()]
+            type_index = header.index("Type Name")
+            for row in reader:
+                if len(row) < len(header):
+                    continue
+                if target_classes is not None and row[type_index] not in target_classes:
+                    continue
+                record = {}
+                for name, index, kind in fields:
+                    if index is None:
+                        record[name] = float("nan")
+                        continue
+                    value = row[index]
+                    try:
+                        record[name] = kind(value)
+                    except ValueError:
+                        # e.g. "3.0" in an integer column, or NaN for metrics Designite could not compute
+                        try:
+                            record[name] = int(float(value)) if kind is int else float("nan")
+                        except ValueError:
+                            record[name] = float("nan")
+                yield record
+
+    def parse_metrics(self, target_classes=None):
         """
         Parse the generated CSV files for method and class-level metrics.
+        The files are streamed with the csv module, reading only the needed columns.
+        :param target_classes: Optional collection of type names to keep; other rows are skipped.
         """
         if not (os.path.exists(self.method_metrics_file) and os.path.exists(self.type_metrics_file)):
             print("Metrics files not found. Ensure DesigniteJava execution is successful.")
             return
 
-        # Read method metrics
-        method_metrics = pd.read_csv(self.method_metrics_file)
-        type_metrics = pd.read_csv(self.type_metrics_file)
+        if target_classes is not None:
+            target_classes = set(target_classes)
 
         # Process method metrics for each class
-        for _, row in method_metrics.iterrows():
-            class_name = row['Type Name']
-            method_name = row['MethodName']
-            cc = row['CC']  # Cyclomatic Complexity
-            loc = row['LOC']  # Lines of Code
-            pc = row['PC']  # Parameter Count
-
-            if class_name not in self.metrics:
-                self.metrics[class_name]['methods'] = []
-
-            self.metrics[class_name]['methods'].append({
-                "Method Name": method_name,
-                "Cyclomatic Complexity (CC)": cc,
-                "Lines of Code (LOC)": loc,
-                "Parameter Count (PC)": pc
+        for row in self._stream_csv(self.method_metrics_file, self.METHOD_COLUMNS, target_classes):
+            self.metrics[row['Type Name']].setdefault('methods', []).append({
+                "Method Name": row['MethodName'],
+                "Cyclomatic Complexity (CC)": row['CC'],
+                "Lines of Code (LOC)": row['LOC'],
+                "Parameter Count (PC)": row['PC']
             })
 
         # Process class/type metrics
-        for _, row in type_metrics.iterrows():
-            class_name = row['Type Name']
-            self.metrics[class_name]['class_metrics'] = {
+        for row in self._stream_csv(self.type_metrics_file, self.TYPE_COLUMNS, target_classes):
+            self.metrics[row['Type Name']]['class_metrics'] = {
                 "Number of Fields (NOF)": row['NOF'],
                 "Number of Public Fields (NOPF)": row['NOPF'],
                 "Number of Methods (NOM)": row['NOM'],
@@ -85,16 +199,73 @@ class JavaMetricsCalculator:
             }
         print("Metrics parsing completed.")
 
-    def compute_metrics_for_class(self):
+    def _sources(self):
+        """
+        Source texts the backend measures: the code loaded by `parse_java_code` (python
+        backend only), otherwise every .java file under input_path in path order.
+        """
+        if self.backend == "python" and self.java_code is not None:
+            return [self.java_code]
+        sources = []
+        for file_path in sorted(glob.glob(os.path.join(self.input_path, "**/*.java"), recursive=True)):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                sources.append(os.path.relpath(file_path, self.input_path) + "\n" + f.read())
+        return sources
+
+    def backend_version(self):
+        """Identity of the metric definitions in use, part of every cache key."""
+        if self.backend == "python":
+            return f"python-ck{CK_METRICS_VERSION}"
+        return _designite_version(self.designite_jar)
+
+    def compute_metrics_in_process(self):
+        """
+        Compute the metrics with the pure-Python backend.
+        Uses the code loaded by `parse_java_code` when available, otherwise every .java
+        file under input_path. Files that do not parse are skipped with a message.
+        """
+        if self.java_code is not None:
+            sources = [self.java_code]
+        else:
+            sources = []
+            for file_path in glob.glob(os.path.join(self.input_path, "**/*.java"), recursive=True):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    sources.append(f.read())
+
+        for code in sources:
+            try:
+                class_metrics = compute_ck_metrics(code)
+            except Exception as e:  # javalang cannot parse every modern Java construct
+                print(f"In-process metrics failed, source could not be parsed: {e}")
+                continue
+            for class_name, data in class_metrics.items():
+                self.metrics[class_name]['methods'] = data['methods']
+                self.metrics[class_name]['class_metrics'] = data['class_metrics']
+
+    def compute_metrics_for_class(self, target_classes=None):
         """
         Collect and return metrics for all classes in the project.
+        :param target_classes: Optional collection of type names to keep (Designite backend).
         :return: A dictionary containing method-level and class-level metrics.
         """
-        # Execute the Designite tool
-        self.run_designite()
+        with span("metrics", backend=self.backend) as attributes:
+            cache_key = None
+            if self.cache is not None:
+                cache_key = MetricsCache.make_key(self.backend_version(), self._sources(), target_classes)
+                cached = self.cache.get_metrics(cache_key)
+                self.cache_hit = attributes["cache_hit"] = cached is not None
+                if cached is not None:
+                    self.load_metrics(cached)
+                    return cached
+
+            if self.backend == "python":
+                self.compute_metrics_in_process()
+            else:
+                # Execute the Designite tool
+                self.run_designite()
 
-        # Parse the CSV files
-        self.parse_metrics()
+                # Parse the CSV files
+                self.parse_metrics(target_classes)
 
         # Prepare the metrics dictionary
         final_metrics = {}
@@ -105,8 +276,110 @@ class JavaMetricsCalculator:
                 "Class Metrics": class_metrics,
                 "Method Metrics": method_metrics
             }
+
+        # Failed runs produce no metrics; do not remember them
+        if cache_key is not None and final_metrics:
+            self.cache.put_metrics(cache_key, final_metrics)
         return final_metrics
 
+    def cross_check(self, tolerance=0.0):
+        """
+        Compare the in-process metrics with DesigniteJava on the same input.
+        Runs Designite on input_path (the Java files must still be there).
+        :return: List of (class, metric, python value, designite value) that differ by more than `tolerance`.
+        """
+        python_calculator = JavaMetricsCalculator(self.input_path, self.output_path, self.designite_jar, backend="python")
+        python_calculator.java_code = self.java_code
+        designite_calculator = JavaMetricsCalculator(self.input_path, self.output_path, self.designite_jar, backend="designite")
+        python_metrics = python_calculator.compute_metrics_for_class()
+        designite_metrics = designite_calculator.compute_metrics_for_class()
+
+        mismatches = []
+        for class_name, designite_data in designite_metrics.items():
+            python_data = python_metrics.get(class_name, {"Class Metrics": {}, "Method Metrics": []})
+            for metric, expected in designite_data["Class Metrics"].items():
+                actual = python_data["Class Metrics"].get(metric)
+                if actual is None or abs(float(actual) - float(expected)) > tolerance:
+                    mismatches.append((class_name, metric, actual, expected))
+            python_methods = {}
+            for method in python_data["Method Metrics"]:
+                python_methods.setdefault(method["Method Name"], []).append(method)
+            for method in designite_data["Method Metrics"]:
+                # Overloads are matched in declaration order
+                remaining = python_methods.get(method["Method Name"], [])
+                actual_method = remaining.pop(0) if remaining else {}
+                for metric, expected in method.items():
+                    if metric == "Method Name":
+                        continue
+                    actual = actual_method.get(metric)
+                    if actual is None or abs(float(actual) - float(expected)) > tolerance:
+                        mismatches.append((class_name, f"{method['Method Name']}.{metric}", actual, expected))
+        return mismatches
+
+    def load_metrics(self, final_metrics):
+        """
+        Load metrics in the `compute_metrics_for_class` format (e.g. a slice returned by
+        `compute_metrics_for_files`) so that `as_string` and `get_metrics` can use them.
+        """
+        self.metrics = defaultdict(dict)
+        for class_name, data in final_metrics.items():
+            self.metrics[class_name]['class_metrics'] = data.get("Class Metrics", {})
+            self.metrics[class_name]['methods'] = data.get("Method Metrics", [])
+
+    def compute_metrics_for_files(self, file_paths):
+        """
+        Compute metrics for many Java files at once.
+        With the Designite backend all files are staged under input_path and measured by a
+        single DesigniteJava run (one run per group of files when two files declare a type
+        with the same name). Each file then gets the metrics of the types it declares.
+        :param file_paths: Paths of the Java files to measure.
+        :return: Dictionary file path -> metrics in the `compute_metrics_for_class` format.
+        """
+        results = {}
+        if self.backend == "python":
+            for file_path in file_paths:
+                self.metrics = defaultdict(dict)
+                self.parse_java_code(file_path)
+                results[file_path] = self.compute_metrics_for_class()
+            return results
+
+        declared = {}
+        for file_path in file_paths:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                declared[file_path] = set(re.findall(r'\b(?:class|interface|enum)\s+(\w+)', f.read()))
+
+        pending = list(file_paths)
+        while pending:
+            # Designite metrics are keyed by type name, so a batch must not declare a name twice
+            batch, deferred, names = [], [], set()
+            for file_path in pending:
+                if declared[file_path] & names:
+                    deferred.append(file_path)
+                else:
+                    batch.append(file_path)
+                    names |= declared[file_path]
+            pending = deferred
+
+            self.clean_repository()
+            self.metrics = defaultdict(dict)
+            self.java_code = None
+            for index, file_path in enumerate(batch):
+                # One folder per file keeps same-named files from overwriting each other
+                staged_dir = os.path.join(self.input_path, str(index))
+                os.makedirs(staged_dir, exist_ok=True)
+                shutil.copy(file_path, os.path.join(staged_dir, os.path.basename(file_path)))
+
+            print(f"Computing metrics for {len(batch)} classes with a single DesigniteJava run...")
+            batch_metrics = self.compute_metrics_for_class(target_classes=names)
+            for file_path in batch:
+                results[file_path] = {
+                    class_name: metrics for class_name, metrics in batch_metrics.items()
+                    if class_name in declared[file_path]
+                }
+
+        self.clean_repository()
+        return results
+
     def get_metrics(self):
         """
         Get the computed metrics.
@@ -168,5 +441,9 @@ if __name__ == "__main__":
     metrics = calculator.compute_metrics_for_class()
     print(calculator.as_string())
 
+    # Parity check of the in-process backend against Designite on the same classes
+    for class_name, metric, python_value, designite_value in calculator.cross_check():
+        print(f"Mismatch {class_name} {metric}: python={python_value} designite={designite_value}")
+
 
 
@@ -1,4 +1,136 @@
+import javalang
 from javalang import parse as javalang_parse
 
 def parse(code):
-    return javalang_parse.parse(code)
\ No newline at end of file
+    return javalang_parse.parse(code)
+
+def describe_parse_error(error):
+    """Return a one-line, human readable description of a javalang parse/lexer error."""
+    if isinstance(error, javalang.parser.JavaSyntaxError):
+        message = error.description or "Syntax error"
+        token = getattr(error, "at", None)
+        position = getattr(token, "position", None)
+        if position is not None:
+            return f"{message} at line {position[0]}, column {position[1]} (near '{token.value}')"
+        return message
+    return str(error) or error.__class__.__name__
+
+def _type_to_string(type_node):
+    if type_node is None:
+        return "void"
+    name = type_node.name
+    arguments = getattr(type_node, "arguments", None)
+    if arguments:
+        name += "<" + ",".join(_type_to_string(arg.type) if getattr(arg, "type", None) else "?" for arg in arguments) + ">"
+    # Qualified names (java.util.List) are chained through `sub_type`
+    sub_type = getattr(type_node, "sub_type", None)
+    if sub_type is not None:
+        name += "." + _type_to_string(sub_type)
+    return name + "[]" * len(type_node.dimensions or [])
+
+def parameter_types(member):
+    """Comma-separated parameter types of a method/constructor node, e.g. `int,List<String>,String...`."""
+    return ",".join(_type_to_string(p.type) + ("..." if p.varargs else "") for p in member.parameters)
+
+def type_members(type_decl):
+    """Body declarations of a type (enum constants' bodies excluded).
+
+    Initializer blocks come back as plain lists; callers filter by node type.
+    """
+    body = type_decl.body
+    if isinstance(body, javalang.tree.EnumBody):
+        return body.declarations or []
+    return body or []
+
+def declared_method_names(code):
+    """Names of the methods and constructors declared in `code` (nested types included), or None when it does not parse."""
+    try:
+        tree = parse(code)
+    except Exception:
+        return None
+    names = {node.name for _, node in tree.filter(javalang.tree.MethodDeclaration)}
+    names.update(node.name for _, node in tree.filter(javalang.tree.ConstructorDeclaration))
+    return names
+
+def public_method_signatures(tree):
+    """Collect the public API of a parsed compilation unit.
+
+    Returns a set of strings `Type.method(ParamType,...)->ReturnType` for public
+    methods and `Type.<init>(ParamType,...)` for public constructors. Methods of
+    interfaces are implicitly public.
+    """
+    signatures = set()
+    for _, type_decl in tree.filter(javalang.tree.TypeDeclaration):
+        implicitly_public = isinstance(type_decl, javalang.tree.InterfaceDeclaration)
+        for member in type_members(type_decl):
+            if not isinstance(member, (javalang.tree.MethodDeclaration, javalang.tree.ConstructorDeclaration)):
+                continue
+            if "public" not in member.modifiers and not (implicitly_public and "private" not in member.modifiers):
+                continue
+            if isinstance(member, javalang.tree.MethodDeclaration):
+                signatures.add(f"{type_decl.name}.{member.name}({parameter_types(member)})->{_type_to_string(member.return_type)}")
+            elif isinstance(member, javalang.tree.ConstructorDeclaration):
+                signatures.add(f"{type_decl.name}.<init>({parameter_types(member)})")
+    return signatures
+
+def precheck_refactoring(original_code, refactored_code):
+    """Cheap in-process gate run before a Maven build.
+
+    Parses the refactored class and checks that every public method/constructor
+    signature of the original class is still present.
+
+    Returns:
+        (ok: bool, feedback: str) - `feedback` explains the rejection and is empty when ok.
+    """
+    try:
+        refactored_tree = parse(refactored_code)
+    except Exception as e:  # javalang raises JavaSyntaxError, LexerError and plain errors on truncated input
+        return False, f"The refactored class does not parse: {describe_parse_error(e)}. Return the complete Java class only."
+
+    try:
+        original_tree = parse(original_code)
+    except Exception:
+        # Nothing to compare against; let the build decide
+        return True, ""
+
+    try:
+        missing = sorted(public_method_signatures(original_tree) - public_method_signatures(refactored_tree))
+    except Exception as e:
+        # Nothing reliable to compare; let the build decide
+        print(f"Could not compare public signatures: {e}")
+        return True, ""
+    if missing:
+        return False, "The refactored class removed or changed public signatures that callers rely on:\n" + "\n".join(missing)
+
+    return True, ""
+
+# Statements/expressions that add a branch to a method's cyclomatic complexity
+_DECISION_NODES = (
+    javalang.tree.IfStatement, javalang.tree.WhileStatement, javalang.tree.DoStatement,
+    javalang.tree.ForStatement, javalang.tree.CatchClause, javalang.tree.TernaryExpression,
+)
+
+def cyclomatic_complexity(method):
+    """McCabe complexity of a method/constructor node.
+
+    1 + if/loops/catch/ternaries + one per `case` label (not `default`) + `&&`/`||`.
+    """
+    complexity = 1
+    for _, node in method.filter(javalang.tree.Node):
+        if isinstance(node, _DECISION_NODES):
+            complexity += 1
+        elif isinstance(node, javalang.tree.SwitchStatementCase):
+            complexity += len(node.case or [])
+        elif isinstance(node, javalang.tree.BinaryOperation) and node.operator in ("&&", "||"):
+            complexity += 1
+    return complexity
+
+def weighted_method_complexity(code):
+    """Sum of the cyclomatic complexity of every method and constructor in `code` (WMC)."""
+    tree = parse(code)
+    total = 0
+    for _, method in tree.filter(javalang.tree.MethodDeclaration):
+        total += cyclomatic_complexity(method)
+    for _, constructor in tree.filter(javalang.tree.ConstructorDeclaration):
+        total += cyclomatic_complexity(constructor)
+    return total
@@ -0,0 +1,291 @@
+import re
+import javalang
+from refAgent.javac_parser import parse, describe_parse_error, parameter_types
+
+# A reply made of member declarations is parsed inside this class; the wrapper shares the
+# reply's first line so parse errors keep the reply's line numbers.
+WRAPPER_CLASS = "RefAgentMethods"
+IMPORT_LINE = re.compile(r"^\s*import\s+(static\s+)?[\w.]+(\.\*)?\s*;\s*$")
+PACKAGE_LINE = re.compile(r"^\s*package\s+[\w.]+\s*;\s*$")
+TYPE_KEYWORDS = ("class", "interface")
+
+
+def _line_offsets(code):
+    return [0] + [match.end() for match in re.finditer("\n", code)]
+
+
+def _member_kind(node, type_name):
+    """(kind, name, key, names) of a class body declaration."""
+    if isinstance(node, javalang.tree.MethodDeclaration):
+        return "method", node.name, f"{node.name}({parameter_types(node)})", [node.name]
+    if isinstance(node, javalang.tree.ConstructorDeclaration):
+        return "constructor", type_name, f"<init>({parameter_types(node)})", [type_name]
+    if isinstance(node, javalang.tree.FieldDeclaration):
+        names = [declarator.name for declarator in node.declarators]
+        return "field", names[0], None, names
+    if isinstance(node, javalang.tree.TypeDeclaration):
+        return "type", node.name, None, [node.name]
+    return "other", None, None, []
+
+
+def class_members(code, class_name=None):
+    """
+    Source ranges of the members of the top-level class or interface `class_name` (default: the first type).
+    :return: (layout, members). `layout` holds the offsets of the class declaration ("start"),
+             its body braces ("open", "close"), the end of the package/import statements
+             ("imports_end", 0 without any) and the import statements ("imports").
+             Each member is {"kind", "name", "names", "key", "start", "code_start", "body", "end"}:
+             kind is method, constructor, field, type or other (initializers); `key` is
+             `name(ParamTypes)` for methods and `<init>(ParamTypes)` for constructors; `start`
+             includes the Javadoc and comments on the lines above `code_start`, the first token;
+             `body` is the offset of the `{` opening the body (None without one) and `end` the
+             offset after the closing `}` or `;`.
+    Raises javalang errors when the code does not parse and ValueError when the type is missing.
+    """
+    tree = parse(code)
+    type_decl = next((t for t in tree.types if class_name in (None, t.name)), None)
+    if type_decl is None or not isinstance(type_decl, (javalang.tree.ClassDeclaration, javalang.tree.InterfaceDeclaration)):
+        raise ValueError(f"No top-level class {class_name or ''} in the code")
+
+    tokens = list(javalang.tokenizer.tokenize(code))
+    line_offsets = _line_offsets(code)
+    offsets = [line_offsets[t.position[0] - 1] + t.position[1] - 1 for t in tokens]
+    ends = [offset + len(t.value) for offset, t in zip(offsets, tokens)]
+
+    # Package/import statements and the class declaration, at brace depth 0 outside parentheses
+    # (the braces of annotation arrays such as `@SuppressWarnings({"unchecked"})` end nothing)
+    layout = {"imports_end": 0, "imports": []}
+    depth, parens, statement_start, declaration_start, i = 0, 0, 0, None, 0
+    while i < len(tokens):
+        value = tokens[i].value
+        if depth == 0 and value in ("package", "import"):
+            end = next(j for j in range(i, len(tokens)) if tokens[j].value == ";")
+            layout["imports_end"] = ends[end]
+            if value == "import":
+                layout["imports"].append(" ".join(code[offsets[i]:ends[end]].split()))
+            i = statement_start = end + 1
+            continue
+        if depth == 0 and value in TYPE_KEYWORDS and i + 1 < len(tokens) and tokens[i + 1].value == type_decl.name:
+            declaration_start = statement_start
+            break
+        if value == "(":
+            parens += 1
+        elif value == ")":
+            parens -= 1
+        elif value == "{":
+            depth += 1
+        elif value == "}":
+            depth -= 1
+        if depth == 0 and parens == 0 and value in (";", "}"):
+            statement_start = i + 1
+        i += 1
+    if declaration_start is None:
+        raise ValueError(f"Could not locate the declaration of {type_decl.name}")
+    open_index = next(j for j in range(i, len(tokens)) if tokens[j].value == "{")
+    layout.update(start=offsets[declaration_start], open=offsets[open_index])
+
+    # Members: token spans at brace depth 1, ended by `;` or by the `}` closing a body
+    members = []
+    depth, parens, first, body, assigns = 1, 0, None, None, False
+    previous_end = ends[open_index]
+    for j in range(open_index + 1, len(tokens)):
+        value = tokens[j].value
+        if first is None:
+            if value == ";":
+                previous_end = ends[j]
+                continue
+            if value == "}":
+                layout["close"] = offsets[j]
+                break
+            first, body, assigns = j, None, False
+        finished = False
+        if value == "(":
+            parens += 1
+        elif value == ")":
+            parens -= 1
+        elif value == "{":
+            if depth == 1 and parens == 0 and body is None:
+                body = offsets[j]
+            depth += 1
+        elif value == "}":
+            depth -= 1
+            finished = depth == 1 and parens == 0 and not assigns
+        elif depth == 1 and parens == 0:
+            if value == "=":
+                assigns = True
+            finished = value == ";"
+        if finished:
+            code_start = offsets[first]
+            line_break = code.find("\n", previous_end, code_start)
+            start = code_start
+            if line_break >= 0:
+                start = line_break + 1
+                while code[start].isspace():
+                    start += 1
+            members.append({"kind": "other", "name": None, "names": [], "key": None, "start": start,
+                            "code_start": code_start, "body": body, "end": ends[j]})
+            previous_end, first = ends[j], None
+    if "close" not in layout:
+        raise ValueError(f"Unbalanced braces in the body of {type_decl.name}")
+
+    for node in type_decl.body:
+        if getattr(node, "position", None) is None:
+            continue
+        offset = line_offsets[node.position[0] - 1] + node.position[1] - 1
+        member = next((m for m in members if m["code_start"] <= offset < m["end"]), None)
+        if member is not None:
+            member["kind"], member["name"], member["key"], member["names"] = _member_kind(node, type_decl.name)
+    return layout, members
+
+
+def _dedent(text, first_indented=True):
+    """Remove the common indentation; with `first_indented=False` the first line carries none."""
+    lines = text.splitlines()
+    indents = [len(line) - len(line.lstrip()) for line in (lines if first_indented else lines[1:]) if line.strip()]
+    common = min(indents, default=0)
+    result = []
+    for k, line in enumerate(lines):
+        if not line.strip():
+            result.append("")
+        elif k == 0 and not first_indented:
+            result.append(line.strip())
+        else:
+            result.append(line[common:] if not line[:common].strip() else line.lstrip())
+    return "\n".join(result)
+
+
+def _indent_of(code, offset):
+    line = code[code.rfind("\n", 0, offset) + 1:]
+    return line[:len(line) - len(line.lstrip(" \t"))]
+
+
+def _indent(text, indent, first=True):
+    lines = text.split("\n")
+    return "\n".join(line if not line or (k == 0 and not first) else indent + line for k, line in enumerate(lines))
+
+
+def _member_source(code, member, with_comments=True):
+    """Dedented source of a member, with its Javadoc and leading comments by default."""
+    start = member["start"] if with_comments else member["code_start"]
+    line_start = code.rfind("\n", 0, start) + 1
+    if code[line_start:start].strip():
+        return _dedent(code[start:member["end"]], first_indented=False)
+    return _dedent(code[line_start:member["end"]])
+
+
+def _one_line(text):
+    return " ".join(text.split())
+
+
+def extract_methods(code, names, class_name=None):
+    """
+    The methods `names` of a class (every overload) with the context needed to rewrite them
+    alone: the imports, the class declaration, the fields and the signatures of the other members.
+    :return: {"targets": [key, ...], "methods": source, "context": source}, or None when the
+             class cannot be parsed or declares none of the methods.
+    """
+    try:
+        layout, members = class_members(code, class_name)
+    except Exception as e:
+        print(f"Could not extract methods from {class_name}: {describe_parse_error(e)}")
+        return None
+    targets = [m for m in members if m["kind"] == "method" and m["name"] in names]
+    if not targets:
+        return None
+
+    context = layout["imports"] + ([""] if layout["imports"] else [])
+    context.append(_one_line(code[layout["start"]:layout["open"]]) + " {")
+    for member in members:
+        if member in targets or member["kind"] == "other":
+            continue
+        if member["kind"] == "field":
+            declaration = _one_line(code[member["code_start"]:member["end"]])
+        elif member["kind"] == "type":
+            declaration = _one_line(code[member["code_start"]:member["body"]]) + " { ... }"
+        elif member["body"] is not None:
+            declaration = _one_line(code[member["code_start"]:member["body"]]) + ";"
+        else:
+            declaration = _one_line(code[member["code_start"]:member["end"]])
+        context.append("    " + declaration)
+    context.append("}")
+    return {
+        "targets": [m["key"] for m in targets],
+        "methods": "\n\n".join(_member_source(code, m) for m in targets),
+        "context": "\n".join(context),
+    }
+
+
+def _reply_members(text, class_name):
+    """Members of a reply: the class itself when the whole class came back, else the wrapped declarations."""
+    try:
+        return class_members(text, class_name)[1], text
+    except Exception:
+        pass
+    wrapped = f"class {WRAPPER_CLASS} {{ {text}\n}}"
+    return class_members(wrapped, WRAPPER_CLASS)[1], wrapped
+
+
+def splice_methods(code, reply, targets, class_name=None):
+    """
+    Splice a method-level reply back into the class `code`.
+
+    The reply must contain every method of `targets` (keys from `extract_methods`), with the
+    same signature; those methods replace the originals, Javadoc and comments included. Import lines and members the class
+    does not declare yet (new helper methods, fields, nested types) are added, the members
+    after the last target. Members the class already declares are left untouched (the model
+    echoing its context), so only the flagged methods can change.
+    :return: (class code, "") or (None, feedback for the model)
+    """
+    reply_imports, lines = [], []
+    for line in (reply or "").splitlines():
+        if IMPORT_LINE.match(line):
+            reply_imports.append(_one_line(line))
+            line = ""
+        lines.append("" if PACKAGE_LINE.match(line) else line)
+
+    try:
+        layout, members = class_members(code, class_name)
+        class_name = class_name or next(t.name for t in parse(code).types)
+    except Exception as e:
+        return None, f"The original class could not be parsed: {describe_parse_error(e)}"
+    try:
+        reply_members, text = _reply_members("\n".join(lines), class_name)
+    except Exception as e:
+        return None, (f"The refactored methods do not parse: {describe_parse_error(e)}. "
+                      f"Return only the refactored methods, inside one Java code block.")
+
+    declared = {key for m in members for key in ([m["key"]] if m["key"] else [f"{m['kind']}:{n}" for n in m["names"]])}
+    replacements, additions = {}, []
+    for member in reply_members:
+        if member["kind"] == "other":
+            continue
+        if member["kind"] == "type" and member["name"] == class_name:
+            return None, "Return only the refactored methods, not the whole class."
+        if member["key"] in targets:
+            replacements[member["key"]] = _member_source(text, member)
+        elif not ({member["key"]} if member["key"] else {f"{member['kind']}:{n}" for n in member["names"]}) & declared:
+            additions.append(_member_source(text, member))
+    missing = [key for key in targets if key not in replacements]
+    if missing:
+        return None, (f"The reply is missing methods to refactor ({', '.join(missing)}). "
+                      f"Return every refactored method, with its signature unchanged, inside one Java code block.")
+
+    edits = []
+    for member in members:
+        if member["key"] in replacements:
+            edits.append((member["start"], member["end"],
+                          _indent(replacements[member["key"]], _indent_of(code, member["start"]), first=False)))
+    if additions:
+        anchor = max((m for m in members if m["key"] in targets), key=lambda m: m["end"])
+        indent = _indent_of(code, anchor["start"])
+        edits.append((anchor["end"], anchor["end"], "".join("\n\n" + _indent(addition, indent) for addition in additions)))
+    missing_imports = [line for line in dict.fromkeys(reply_imports) if line not in layout["imports"]]
+    if missing_imports:
+        if layout["imports_end"]:
+            edits.append((layout["imports_end"], layout["imports_end"], "".join("\n" + line for line in missing_imports)))
+        else:
+            edits.append((0, 0, "".join(line + "\n" for line in missing_imports) + "\n"))
+
+    for start, end, replacement in sorted(edits, key=lambda edit: edit[0], reverse=True):
+        code = code[:start] + replacement + code[end:]
+    return code, ""
@@ -0,0 +1,87 @@
+import os
+import re
+import time
+import subprocess
+import xml.etree.ElementTree as ET
+from refAgent.tracing import record_span
+
+PMD_BIN_PATH = os.path.expanduser("~/pmd-bin-7.19.0/bin/pmd")
+GOD_CLASS_RULE = "category/java/design.xml/GodClass"
+
+# "Possible God Class (WMC=47, ATFD=13, TCC=5.263%)"
+GOD_CLASS_MESSAGE = re.compile(r"WMC=(?P<WMC>[\d.]+),\s*ATFD=(?P<ATFD>[\d.]+),\s*TCC=(?P<TCC>[\d.]+)%")
+
+
+def parse_god_class_message(message):
+    """Extract the metrics of a GodClass violation message: {"WMC", "ATFD", "TCC" (percent)}, or {}."""
+    match = GOD_CLASS_MESSAGE.search(message or "")
+    if not match:
+        return {}
+    return {
+        "WMC": int(float(match.group("WMC"))),
+        "ATFD": int(float(match.group("ATFD"))),
+        "TCC": float(match.group("TCC")),
+    }
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def stream_god_classes(project_directory, report_file, cache_file=None, log_file=None, pmd_bin_path=PMD_BIN_PATH):
+    """
+    Run PMD's GodClass rule with the XML report on stdout and yield (file path, metrics)
+    for every god class as soon as PMD has written its <file> element, so the caller can
+    start on the first class before the scan finishes.
+
+    :param report_file: The raw XML report is also saved here.
+    :param cache_file: PMD incremental analysis cache (`--cache`); unchanged files are not re-analyzed.
+    :param log_file: PMD's stderr goes here (defaults to report_file + ".log").
+    """
+    os.makedirs(os.path.dirname(report_file) or ".", exist_ok=True)
+    pmd_command = [
+        pmd_bin_path,
+        "check",
+        "-d", project_directory,
+        "-R", GOD_CLASS_RULE,
+        "-f", "xml",
+        "--no-progress",
+    ]
+    if cache_file:
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        pmd_command.extend(["--cache", cache_file])
+    else:
+        pmd_command.append("--no-cache")
+    log_file = log_file or report_file + ".log"
+
+    print(f"Running PMD on {project_directory} to detect god classes...")
+    start, started = time.time(), time.perf_counter()
+    reported = 0
+    parser = ET.XMLPullParser(events=("end",))
+    with open(report_file, "w", encoding="utf-8") as report, open(log_file, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(pmd_command, stdout=subprocess.PIPE, stderr=log, text=True, encoding="utf-8")
+        try:
+            for line in process.stdout:
+                report.write(line)
+                parser.feed(line)
+                for _, element in parser.read_events():
+                    if _local_name(element.tag) != "file":
+                        continue
+                    for violation in element:
+                        if _local_name(violation.tag) == "violation" and violation.get("rule") == "GodClass":
+                            reported += 1
+                            yield element.get("name"), parse_god_class_message(violation.text)
+                            break
+                    element.clear()
+        finally:
+            # Stop PMD if the consumer abandons the stream early
+            if process.poll() is None and not process.stdout.closed:
+                process.stdout.close()
+            returncode = process.wait()
+            # A generator cannot hold a span open across yields; time the whole scan instead
+            record_span("pmd", start, time.perf_counter() - started, god_classes=reported, returncode=returncode)
+
+    # PMD exits with 4 when violations were found
+    if returncode not in (0, 4):
+        print(f"PMD warning/error (exit code {returncode}), see {log_file}")
+    print(f"PMD report saved to {report_file}")
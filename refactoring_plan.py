@@ -0,0 +1,156 @@
+import re
+import json
+
+# Planner output: {"methods": [{"name", "needs_refactor", "instruction"}, ...]}
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "methods": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "needs_refactor": {"type": "boolean"},
+                    "instruction": {"type": "string"},
+                },
+                "required": ["name", "needs_refactor", "instruction"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["methods"],
+    "additionalProperties": False,
+}
+
+# `response_format` values of the chat completions API per PLANNER_OUTPUT setting
+RESPONSE_FORMATS = {
+    "json_schema": {"type": "json_schema", "json_schema": {"name": "refactoring_plan", "schema": PLAN_SCHEMA, "strict": True}},
+    "json_object": {"type": "json_object"},
+    "text": None,
+}
+
+# Replies that start out as JSON (a json fence, an array or an object with quoted keys) are never
+# read line by line: the lines of truncated JSON look like entries (`"name": "foo",`)
+JSON_START = re.compile(r"""^(```[ \t]*json\b|(```[^\n]*\n)?\s*(\[|\{\s*"))""", re.IGNORECASE)
+
+# Field names of PLAN_SCHEMA, never method names of a plan
+SCHEMA_KEYS = frozenset(("methods", "name", "needs_refactor", "instruction"))
+
+# One entry of the historical free-text format: `name: (yes, instruction),` or `name: No,`
+PLAN_LINE = re.compile(r"""^\s*["']?(?P<name>[A-Za-z_$][\w$]*)(?:\([^)]*\))?["']?\s*[:=]\s*(?P<value>.+?)\s*,?\s*$""")
+YES = re.compile(r"""^[\s"'(\[{]*(yes|true)\b[\s,:;\-]*""", re.IGNORECASE)
+NO = re.compile(r"""^[\s"'(\[{]*(no|false)\b""", re.IGNORECASE)
+
+
+def _entry_from_value(name, value):
+    """Plan entry for `name` from a free-text, boolean or object value, or None when unrecognized."""
+    if isinstance(value, bool):
+        return {"name": name, "needs_refactor": value, "instruction": ""}
+    if isinstance(value, dict):
+        flag = next((value[key] for key in ("needs_refactor", "needs_refactoring", "refactor") if key in value), None)
+        if isinstance(flag, str):
+            flag = bool(YES.match(flag))
+        if not isinstance(flag, bool):
+            return None
+        return {"name": name, "needs_refactor": flag, "instruction": str(value.get("instruction") or "").strip()}
+    if isinstance(value, str):
+        match = YES.match(value)
+        if match:
+            instruction = value[match.end():].strip().rstrip(",").strip()
+            # Drop the closers of the brackets/quotes opened before "yes", e.g. `(yes, instruction)`
+            for _ in range(sum(value[:match.start(1)].count(c) for c in "\"'([{")):
+                if instruction and instruction[-1] in "\"')]}":
+                    instruction = instruction[:-1].rstrip()
+            return {"name": name, "needs_refactor": True, "instruction": instruction}
+        if NO.match(value):
+            return {"name": name, "needs_refactor": False, "instruction": ""}
+    return None
+
+
+def _from_json(data):
+    if isinstance(data, dict) and isinstance(data.get("methods"), list):
+        entries = []
+        for item in data["methods"]:
+            if isinstance(item, dict) and isinstance(item.get("name"), str) and item["name"].strip():
+                entry = _entry_from_value(item["name"].strip(), item)
+                if entry is not None:
+                    entries.append(entry)
+        return entries
+    if isinstance(data, dict):
+        methods = data.get("methods") if isinstance(data.get("methods"), dict) else data
+        return [entry for entry in (_entry_from_value(str(name), value) for name, value in methods.items()
+                                    if str(name) not in SCHEMA_KEYS)
+                if entry is not None]
+    return []
+
+
+def _json_candidates(reply):
+    """The reply itself, then the outermost {...} span of it (fences or prose around the JSON)."""
+    yield reply
+    start, end = reply.find("{"), reply.rfind("}")
+    if 0 <= start < end:
+        yield reply[start:end + 1]
+
+
+def _from_lines(reply):
+    entries = []
+    for line in reply.splitlines():
+        match = PLAN_LINE.match(line)
+        if match and match.group("name") not in SCHEMA_KEYS:
+            entry = _entry_from_value(match.group("name"), match.group("value"))
+            if entry is not None:
+                entries.append(entry)
+    return entries
+
+
+def _check_names(entries, methods):
+    """`entries` without those naming no method of `methods`; None when a flagged entry names none
+    (skipping it could turn the plan into "no refactoring needed") or nothing is left."""
+    if methods is None:
+        return entries or None
+    known = [entry["name"].split("(")[0].strip() in methods for entry in entries]
+    if any(entry["needs_refactor"] and not ok for entry, ok in zip(entries, known)):
+        return None
+    return [entry for entry, ok in zip(entries, known) if ok] or None
+
+
+def parse_plan(reply, methods=None):
+    """
+    Parse a planner reply into [{"name", "needs_refactor", "instruction"}], in reply order.
+    Accepts the PLAN_SCHEMA object, other JSON shapes mapping method names to a verdict,
+    and the historical free-text format (`name: (yes, instruction)` / `name: No` per line),
+    which is not tried on replies that start out as JSON.
+    `methods` are the method names declared by the class (see javac_parser.declared_method_names);
+    when given, entries naming other methods are dropped and a flagged one makes the plan unparsed.
+    :return: The entries, or None when nothing could be recognized.
+    """
+    if not isinstance(reply, str) or not reply.strip():
+        return None
+    reply = reply.strip()
+    for candidate in _json_candidates(reply):
+        try:
+            entries = _from_json(json.loads(candidate))
+        except ValueError:
+            continue
+        if entries:
+            return _check_names(entries, methods)
+
+    if JSON_START.match(reply):
+        return None
+    return _check_names(_from_lines(reply), methods)
+
+
+def needs_refactoring(plan):
+    """True when at least one method of the plan is flagged."""
+    return any(entry["needs_refactor"] for entry in plan)
+
+
+def flagged_methods(plan):
+    return [entry["name"] for entry in plan if entry["needs_refactor"]]
+
+
+def format_instructions(plan):
+    """The instructions of the flagged methods only, one `- name: instruction` line each."""
+    return "\n".join(f"- {entry['name']}: {entry['instruction'] or 'improve readability and maintainability'}"
+                     for entry in plan if entry["needs_refactor"])
@@ -0,0 +1,49 @@
+import json
+from refAgent.utilities import write_json_atomic
+
+# Class states, in pipeline order
+STATUSES = ("started", "metrics", "planned", "iterating", "done")
+
+
+def journal_path(project_name, target_class):
+    return f"results/{project_name}/{target_class}/journal.json"
+
+
+def read_journal(path, file=None):
+    """Return the saved state at `path`, or {} when missing, unreadable or written for another `file`."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if file is not None and state.get("file") != file:
+        return {}
+    return state
+
+
+class ClassJournal:
+    def __init__(self, path, file, resume=False):
+        """
+        Durable state of one god class in a run, rewritten atomically after each step:
+            status           - one of STATUSES
+            before_metrics   - metrics of the original class
+            instruction, plan, decision, planner_history - planner output (plan is None when unparsed)
+            iteration        - iteration in progress (0-based)
+            generated        - candidates generated for `iteration` (None once it was evaluated)
+            abort_reasons    - per candidate, why its streamed reply was cancelled (None if it was not)
+            generator_history - generator conversation, for continuing from `iteration`
+            accepted_code, verdict, results - final outcome
+        Without `resume` any previous state is discarded.
+        """
+        self.path = path
+        self.state = read_journal(path, file) if resume else {}
+        if not self.state:
+            self.update(file=file, status="started")
+
+    @property
+    def finished(self):
+        return self.state.get("status") == "done"
+
+    def update(self, **fields):
+        self.state.update(fields)
+        write_json_atomic(self.state, self.path)
@@ -20,6 +20,16 @@ REPO_URL="https://github.com/$ORG_REPO.git"
 BEFORE_PATH="projects/before/$REPO"
 AFTER_PATH="projects/after/$REPO"
 ROOT_DIR="$(pwd)"
+WORKSPACE_STRATEGY="${WORKSPACE_STRATEGY:-copy}"  # copy (reflinked where supported), auto/hardlink, overlay or worktree
+
+# Workspace manager (same layouts as the Python entrypoint below)
+workspaces() {
+    if [ -f "$ROOT_DIR/refAgent/workspaces.py" ]; then
+        python3 -m refAgent.workspaces "$@"
+    else
+        python3 "$ROOT_DIR/workspaces.py" "$@"
+    fi
+}
 # === STEP 1: Clone specific tag only ===
 if [ -d "$BEFORE_PATH" ]; then
     echo "📁 Project already exists at $BEFORE_PATH. Skipping clone."
@@ -32,11 +42,9 @@ else
     }
 fi
 
-# === STEP 2: Copy to 'after' directory ===
-echo "📄 Copying project to $AFTER_PATH..."
-rm -rf "$AFTER_PATH"
-mkdir -p "$(dirname "$AFTER_PATH")"
-cp -r "$BEFORE_PATH" "$AFTER_PATH"
+# === STEP 2: Create the 'after' workspace (an independent copy of 'before') ===
+echo "📄 Creating workspace $AFTER_PATH ($WORKSPACE_STRATEGY)..."
+workspaces create --strategy "$WORKSPACE_STRATEGY" "$BEFORE_PATH" "$AFTER_PATH"
 
 # === STEP 3: Build using Maven ===
 echo "🔧 Building project in $AFTER_PATH..."
@@ -59,11 +67,11 @@ echo "🚀 Running Python script for project: $REPO... (repo root: $repo_root)"
 if [ -f "$repo_root/refAgent/RefAgent_main.py" ]; then
     # Run the package as a module so imports like `import refAgent.*` resolve
     echo "Using module: refAgent.RefAgent_main"
-    python3 -m refAgent.RefAgent_main "$REPO"
+    python3 -m refAgent.RefAgent_main "$REPO" --tag "$TAG"
 elif [ -f "$repo_root/RefAgent_main.py" ]; then
     # Fall back to running the top-level script directly (legacy layout)
     echo "Using script: $repo_root/RefAgent_main.py"
-    python3 "$repo_root/RefAgent_main.py" "$REPO"
+    python3 "$repo_root/RefAgent_main.py" "$REPO" --tag "$TAG"
 else
     echo "❌ Could not find RefAgent_main.py in expected locations:"
     echo "   $repo_root/RefAgent_main.py"
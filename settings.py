@@ -3,9 +3,34 @@ import os
 class Settings:
     API_KEY = "unused"  # Dummy for local Ollama
     MODEL_NAME = "starcoder2:3b"
+    LLM_BASE_URL = "http://localhost:11434/v1"  # OpenAI-compatible endpoint (Ollama by default)
     DEFAULT_MAX_TOKENS = 4096
     PLANNER_MAX_TOKENS = 4096
+    PLANNER_OUTPUT = "json_schema"  # "json_schema" (schema-constrained decoding), "json_object" (JSON mode) or "text" (free-form)
     REFRACTORING_GENERATOR_MAX_TOKENS = 4096
     COMPILER_MAX_TOKENS = 2048
     TEST_MAX_TOKENS = 2048
+    MAVEN_INCREMENTAL_COMPILE = True  # Build only the module owning the edited file (-pl ... -amd), no clean
+    MAVEN_OFFLINE = True  # Pass -o to incremental builds; falls back to a full online build if resolution fails
+    MAVEN_BACKEND = "auto"  # "auto" (mvnd daemon when installed, else mvn), "mvnd" or "mvn"
+    MAVEN_COMPILE_TIMEOUT = 900  # Seconds per build call before it is killed (None = no limit)
+    MAVEN_TEST_TIMEOUT = 1800  # Seconds per test run before it is killed (None = no limit)
+    JAVAC_FAST_PATH = True  # Pre-compile the changed class and its dependents with javac once the module classpath is cached
+    JAVAC_TIMEOUT = 120  # Seconds per javac fast-path call
+    LLM_CACHE_ENABLED = False  # Replay identical LLM requests from an on-disk cache (prompt tuning, resumed runs)
+    LLM_CACHE_PATH = "data/cache/llm_responses.sqlite"
+    LLM_CACHE_MAX_ENTRIES = 10000  # Least recently used responses are evicted beyond this
+    LLM_MAX_CONCURRENCY = 4  # Max in-flight async LLM requests per server (AsyncOpenAILLM)
+    LLM_STREAMING = True  # Stream True/False answers and generated classes so they can end early (see agents.py monitors)
+    LLM_STREAM_PROSE_CHARS = 200  # Cancel a generated class preceded by this much prose instead of a code block
+    LLM_STREAM_MAX_REPEATS = 6  # Cancel a generated class once the same lines repeat this many times in a row
+    LLM_PROMPT_TOKEN_BUDGET = 8192  # Estimated prompt tokens per call; older history turns are dropped beyond this (None = unbounded)
+    METRICS_BACKEND = "designite"  # "designite" (DesigniteJava.jar subprocess) or "python" (in-process, javalang; parity with Designite not verified yet, see METRICS_CROSS_CHECK)
+    METRICS_CROSS_CHECK = False  # Also run Designite on each original class and record metric mismatches
+    SCHEDULER_WEIGHTS = {"WMC": 1.0, "LCOM": 1.0, "LOC": 0.5, "dependents": 1.0}  # God class priority (log-scaled WMC/LOC/dependents, LCOM in [0, 1]); a "dependents" weight builds the dependency index even without --select-tests
+    TRACING_ENABLED = True  # Write per-stage spans to results/<project>/traces/<run>.jsonl and a p50/p95 summary
+    WORKSPACE_STRATEGY = "auto"  # Per-worker scratch copies of projects/after: "auto"/"hardlink", "overlay", "worktree" or "copy" (see workspaces.py)
+    METRICS_CACHE_ENABLED = True  # Reuse metrics of already measured sources (keyed by source hash and backend version)
+    METRICS_CACHE_PATH = "data/cache/metrics.sqlite"
+    METRICS_CACHE_MAX_ENTRIES = 50000  # Least recently used entries are evicted beyond this
     GITHUB_API_KEY = []  # Empty list or add your tokens if using github_api.py
\ No newline at end of file
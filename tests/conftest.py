@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Modules import each other as `refAgent.<module>` (the checkout is named refAgent/),
+# and `settings` and `javac_parser` as top-level modules
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.dirname(ROOT)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,85 @@
+import pytest
+
+from refAgent.ck_metrics import compute_ck_metrics
+
+# Line numbers start at 1 on "public class Account {".
+ACCOUNT = """public class Account {
+    private int balance;
+    private String owner;
+    public int count;
+
+    public Account(String owner) {
+        this.owner = owner;
+    }
+
+    public void deposit(int amount) {
+        if (amount > 0 && amount < 1000) {
+            balance += amount;
+        }
+    }
+
+    public int balance() {
+        return balance;
+    }
+
+    @Override
+    public String toString() {
+        return owner;
+    }
+
+    String label(int kind, boolean plain) {
+        switch (kind) {
+            case 1: return owner;
+            case 2: case 3: return "mid";
+            default: return kind > 5 ? "big" : "small";
+        }
+    }
+}
+"""
+
+
+def account_metrics():
+    return compute_ck_metrics(ACCOUNT)["Account"]
+
+
+def test_method_metrics():
+    methods = {m["Method Name"]: m for m in account_metrics()["methods"]}
+
+    # CC: 1 + one per if/loop/catch/ternary/case label/&&/||
+    assert {name: m["Cyclomatic Complexity (CC)"] for name, m in methods.items()} == {
+        "Account": 1,
+        "deposit": 3,   # if, &&
+        "balance": 1,
+        "toString": 1,
+        "label": 5,     # case 1, case 2, case 3, ternary
+    }
+    # LOC: declaration line (annotations included) to the closing brace
+    assert {name: m["Lines of Code (LOC)"] for name, m in methods.items()} == {
+        "Account": 3,
+        "deposit": 5,
+        "balance": 3,
+        "toString": 4,
+        "label": 7,
+    }
+    assert methods["label"]["Parameter Count (PC)"] == 2
+
+
+def test_class_metrics():
+    class_metrics = account_metrics()["class_metrics"]
+
+    assert class_metrics["Lines of Code (LOC)"] == 32
+    assert class_metrics["Weighted Methods per Class (WMC)"] == 1 + 3 + 1 + 1 + 5
+    assert class_metrics["Number of Fields (NOF)"] == 3
+    assert class_metrics["Number of Public Fields (NOPF)"] == 1
+    assert class_metrics["Number of Methods (NOM)"] == 5
+    assert class_metrics["Number of Public Methods (NOPM)"] == 4
+    # Components, constructor ignored: {deposit, balance} share `balance`,
+    # {toString, label} share `owner` -> 2 components over 4 methods.
+    assert class_metrics["Lack of Cohesion of Methods (LCOM)"] == pytest.approx(2 / 4)
+
+
+def test_lcom_without_fields():
+    metrics = compute_ck_metrics("class Empty {\n    void run() {}\n}\n")["Empty"]["class_metrics"]
+
+    assert metrics["Lack of Cohesion of Methods (LCOM)"] == -1.0
+    assert metrics["Lines of Code (LOC)"] == 3
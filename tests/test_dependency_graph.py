@@ -0,0 +1,99 @@
+from refAgent.dependency_graph import JavaClassDependencyAnalyzer
+
+SOURCES = {
+    "src/main/java/com/example/Order.java": """package com.example;
+public class Order {
+    public int total() { return 1; }
+}
+""",
+    "src/main/java/com/example/Priced.java": """package com.example;
+public interface Priced {
+    Order order();
+}
+""",
+    "src/main/java/com/example/Discounted.java": """package com.example;
+public interface Discounted extends Comparable<Discounted>, Priced {
+}
+""",
+    "src/main/java/com/example/Status.java": """package com.example;
+public enum Status {
+    OPEN, CLOSED;
+    int weight(Order order) { return order.total(); }
+}
+""",
+    "src/main/java/com/example/Unrelated.java": """package com.example;
+public class Unrelated {
+}
+""",
+    "src/test/java/com/example/OrderTest.java": """package com.example;
+public class OrderTest {
+    void total() { new Order().total(); }
+}
+""",
+    "src/test/java/com/example/PricedTest.java": """package com.example;
+public class PricedTest {
+    void order(Priced priced) { priced.order(); }
+}
+""",
+    "src/test/java/com/example/DiscountedTest.java": """package com.example;
+public class DiscountedTest {
+    Discounted discounted;
+}
+""",
+    "src/test/java/com/example/StatusTest.java": """package com.example;
+public class StatusTest {
+    void weight() { Status.valueOf("OPEN"); }
+}
+""",
+    "src/test/java/com/example/UnrelatedTest.java": """package com.example;
+public class UnrelatedTest {
+    Unrelated unrelated;
+}
+""",
+}
+
+
+def analyze(sources):
+    analyzer = JavaClassDependencyAnalyzer("Order")
+    for file_path, code in sources.items():
+        analyzer.analyze(code, file_path)
+    return analyzer
+
+
+def test_interfaces_and_enums_are_nodes():
+    analyzer = analyze(SOURCES)
+    assert {"com.example.Priced", "com.example.Discounted", "com.example.Status"} <= set(analyzer.classes)
+    assert analyzer.classes["com.example.Status"]["methods"] == ["weight"]
+
+
+def test_tests_reaching_the_target_through_interfaces_and_enums_are_selected():
+    analyzer = analyze(SOURCES)
+    assert analyzer.find_affected_tests("Order") == [
+        "com.example.DiscountedTest", "com.example.OrderTest", "com.example.PricedTest", "com.example.StatusTest",
+    ]
+
+
+def test_graph_holds_the_resolved_edges():
+    analyzer = analyze(SOURCES)
+    graph = analyzer.build_graph()
+    assert graph.has_edge("com.example.Discounted", "com.example.Priced")
+    assert graph.has_edge("com.example.Status", "com.example.Order")
+    assert not graph.has_edge("com.example.Unrelated", "com.example.Order")
+
+
+def test_analyze_project_builds_the_graph(tmp_path):
+    for file_path, code in SOURCES.items():
+        (tmp_path / file_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / file_path).write_text(code)
+    (tmp_path / "src/main/java/com/example/Broken.java").write_text("package com.example;\nclass Broken { # }\n")
+    analyzer = JavaClassDependencyAnalyzer("Order")
+    analyzer.analyze_project(str(tmp_path), workers=1)
+    assert analyzer.dependencies.number_of_nodes() == len(SOURCES)
+    assert analyzer.dependencies.has_edge("com.example.PricedTest", "com.example.Priced")
+    assert list(analyzer.parse_errors) == [str(tmp_path / "src/main/java/com/example/Broken.java")]
+
+
+def test_analyze_records_lexer_errors():
+    analyzer = JavaClassDependencyAnalyzer("Order")
+    analyzer.analyze("class Broken { # }", "Broken.java")
+    assert list(analyzer.parse_errors) == ["Broken.java"]
@@ -0,0 +1,117 @@
+from refAgent.javac_parser import parse, precheck_refactoring
+from refAgent.method_refactoring import class_members, extract_methods, splice_methods
+
+SAMPLE = """package com.example;
+
+import java.util.List;
+
+@SuppressWarnings({"unchecked", "rawtypes"})
+public class Sample {
+    private int count;
+
+    static {
+        System.out.println("loaded");
+    }
+
+    {
+        count = 1;
+    }
+
+    private final Runnable task = new Runnable() {
+        @Override
+        public void run() {
+            count++;
+        }
+    };
+
+    enum Mode { FAST, SLOW; int weight() { return 1; } }
+
+    /** Adds two numbers. */
+    @Deprecated
+    public int add(int a, int b) {
+        return a + b;
+    }
+
+    public int add(int a) {
+        return add(a, count);
+    }
+
+    public String name() {
+        return "sample";
+    }
+}
+"""
+
+
+def test_class_members_kinds_and_declaration_start():
+    layout, members = class_members(SAMPLE, "Sample")
+    assert SAMPLE[layout["start"]:].startswith('@SuppressWarnings({"unchecked", "rawtypes"})\npublic class Sample')
+    assert [(m["kind"], m["name"]) for m in members] == [
+        ("field", "count"), ("other", None), ("other", None), ("field", "task"), ("type", "Mode"),
+        ("method", "add"), ("method", "add"), ("method", "name"),
+    ]
+    assert SAMPLE[members[3]["start"]:members[3]["end"]].endswith("    }\n    };")
+
+
+def test_extract_methods_context():
+    extract = extract_methods(SAMPLE, ["add"], "Sample")
+    assert extract["targets"] == ["add(int,int)", "add(int)"]
+    assert extract["methods"].startswith("/** Adds two numbers. */\n@Deprecated\npublic int add(int a, int b) {")
+    context = extract["context"].splitlines()
+    assert context[:3] == ["import java.util.List;", "", '@SuppressWarnings({"unchecked", "rawtypes"}) public class Sample {']
+    assert "    private int count;" in context
+    assert any(line.startswith("    private final Runnable task = new Runnable() {") for line in context)
+    assert "    enum Mode { ... }" in context
+    assert "    public String name();" in context
+    # Initializers are not part of the context, the extracted methods not repeated
+    assert not any("static" in line or "add(" in line for line in context)
+
+
+def test_splice_methods_keeps_other_members():
+    reply = """import java.util.Objects;
+
+/** Adds two numbers. */
+@Deprecated
+public int add(int a, int b) {
+    return sum(a, b);
+}
+
+private int sum(int a, int b) {
+    return Math.addExact(a, b);
+}
+
+private int count;
+"""
+    code, feedback = splice_methods(SAMPLE, reply, ["add(int,int)"], "Sample")
+    assert feedback == ""
+    parse(code)
+    assert "import java.util.List;\nimport java.util.Objects;\n" in code
+    assert "        return sum(a, b);" in code
+    assert "    public int add(int a, int b) {\n        return sum(a, b);\n    }\n\n    private int sum(int a, int b) {" in code
+    # Echoed field not duplicated; initializers, anonymous class and nested enum untouched
+    assert code.count("private int count;") == 1
+    for unchanged in ('static {\n        System.out.println("loaded");\n    }', "{\n        count = 1;\n    }",
+                      "    private final Runnable task = new Runnable() {", "enum Mode { FAST, SLOW; int weight() { return 1; } }",
+                      "    public int add(int a) {\n        return add(a, count);\n    }"):
+        assert unchanged in code
+    assert precheck_refactoring(SAMPLE, code) == (True, "")
+
+
+def test_splice_methods_rejects_missing_targets():
+    # A new helper alone does not stand in for the methods to refactor
+    code, feedback = splice_methods(SAMPLE, "private int subtract(int a, int b) { return a - b; }",
+                                    ["add(int,int)"], "Sample")
+    assert code is None
+    assert "add(int,int)" in feedback
+
+    code, feedback = splice_methods(SAMPLE, "public int add(int a, int b) { return b + a; }",
+                                    ["add(int,int)", "add(int)"], "Sample")
+    assert code is None
+    assert "add(int)" in feedback and "add(int,int)" not in feedback
+
+
+def test_precheck_detects_removed_signature_with_initializers_and_enums():
+    refactored = SAMPLE.replace("    public String name() {\n        return \"sample\";\n    }\n", "")
+    ok, feedback = precheck_refactoring(SAMPLE, refactored)
+    assert not ok
+    assert "Sample.name()->String" in feedback
@@ -0,0 +1,147 @@
+import os
+import json
+import math
+import time
+import uuid
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+_current_span = contextvars.ContextVar("refagent_current_span", default=None)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def configure_tracing(trace_path):
+    """Write the spans of this process to `trace_path` (JSONL, appended); None stops tracing."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        if trace_path:
+            os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+            _writer = open(trace_path, "a", encoding="utf-8")
+
+
+def _emit(record):
+    with _writer_lock:
+        if _writer is None:
+            return
+        _writer.write(json.dumps(record, default=str) + "\n")
+        _writer.flush()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a stage of the pipeline. Yields a dict of attributes that the block can extend
+    (e.g. token counts); the finished span is written as one JSON line with its name,
+    id, parent span, start time, duration, thread and attributes, plus `error` when the
+    block raised. Spans nest per thread/async task. Without `configure_tracing` nothing
+    is written.
+    """
+    span_id = uuid.uuid4().hex[:16]
+    parent = _current_span.get()
+    token = _current_span.set((span_id, attributes))
+    start = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        record = {
+            "name": name,
+            "span_id": span_id,
+            "parent_id": parent[0] if parent else None,
+            "start": start,
+            "duration_s": round(time.perf_counter() - started, 6),
+            "thread": threading.current_thread().name,
+        }
+        record.update(attributes)
+        if error is not None:
+            record["error"] = error
+        _emit(record)
+
+
+def annotate_span(**attributes):
+    """Add attributes to the innermost open span of the current thread/async task, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current[1].update(attributes)
+
+
+def record_span(name, start, duration_s, **attributes):
+    """Write a span timed by the caller (for stages that cannot be wrapped in `span`, e.g. generators)."""
+    parent = _current_span.get()
+    record = {
+        "name": name,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent[0] if parent else None,
+        "start": start,
+        "duration_s": round(duration_s, 6),
+        "thread": threading.current_thread().name,
+    }
+    record.update(attributes)
+    _emit(record)
+
+
+def traced(name):
+    """Decorator wrapping every call of the function in a `span(name)`."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize_trace(trace_path):
+    """
+    Aggregate a JSONL trace per span name.
+    :return: {name: {"count", "total_s", "p50_s", "p95_s", "max_s", "errors"}}, slowest total first.
+    """
+    durations, errors = {}, {}
+    with open(trace_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            durations.setdefault(record["name"], []).append(record["duration_s"])
+            if "error" in record:
+                errors[record["name"]] = errors.get(record["name"], 0) + 1
+
+    summary = {}
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "total_s": round(sum(values), 3),
+            "p50_s": round(_percentile(values, 0.50), 3),
+            "p95_s": round(_percentile(values, 0.95), 3),
+            "max_s": round(values[-1], 3),
+            "errors": errors.get(name, 0),
+        }
+    return summary
+
+
+def format_summary(summary):
+    """Render a `summarize_trace` result as a fixed-width text table."""
+    header = f"{'stage':<28} {'count':>6} {'total_s':>10} {'p50_s':>9} {'p95_s':>9} {'max_s':>9} {'errors':>6}"
+    lines = [header, "-" * len(header)]
+    for name, row in summary.items():
+        lines.append(f"{name:<28} {row['count']:>6} {row['total_s']:>10.3f} {row['p50_s']:>9.3f} "
+                     f"{row['p95_s']:>9.3f} {row['max_s']:>9.3f} {row['errors']:>6}")
+    return "\n".join(lines)
@@ -2,7 +2,65 @@ import os
 import re
 import json
 import shutil
+import sqlite3
 import subprocess
+import tempfile
+import threading
+import time
+from refAgent.tracing import span, traced
+from refAgent.workspaces import mvnd_environment, stop_mvnd_daemons
+
+class DiskCache:
+    """Size-bounded, least-recently-used key/value store kept in SQLite.
+
+    Values are strings. An instance can be shared between threads, and it counts
+    `hits` and `misses`.
+    """
+
+    def __init__(self, db_path, max_entries=10000, table="entries"):
+        directory_path = os.path.dirname(db_path)
+        if directory_path:
+            os.makedirs(directory_path, exist_ok=True)
+        self.max_entries = max_entries
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, reply TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self.connection.execute(f"SELECT reply FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+            return row[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, reply, last_used) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            # Evict least recently used entries beyond the size bound
+            self.connection.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.connection.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
 
 def find_non_test_files(files):
     return [f for f in files if 'test' not in f.lower() and not f.endswith('Test.java')]
@@ -26,6 +84,9 @@ def copy_file(source_dir, dest_dir, filename):
 
 def write_to_java_file(file_path, java_code):
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    # Workspaces may hardlink files to the base project; never write through the link
+    if os.path.isfile(file_path) and os.stat(file_path).st_nlink > 1:
+        os.remove(file_path)
     with open(file_path, 'w', encoding='utf-8') as f:
         f.write(java_code)
 
@@ -38,6 +99,26 @@ def export_dict_to_json(data, file_path):
     with open(file_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4)
 
+def write_json_atomic(data, file_path):
+    """Write `data` as JSON so that `file_path` always holds either the old or the new content.
+
+    The JSON goes to a temporary file in the same folder, is flushed to disk and then
+    renamed over `file_path`.
+    """
+    directory_path = os.path.dirname(file_path) or "."
+    os.makedirs(directory_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory_path)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 def commit_file_to_github(repo_path, file_path, commit_message):
     try:
         os.chdir(repo_path)
@@ -56,22 +137,226 @@ def find_test_files(files):
 def create_directory_if_not_exists(path):
     os.makedirs(path, exist_ok=True)
 
+def find_maven_module(project_dir: str, java_file: str):
+    """Return the path (relative to `project_dir`) of the Maven module that owns `java_file`.
+
+    Walks up from the file towards the project root and stops at the first folder
+    containing a `pom.xml`. Returns "." for the root module and None when the file is
+    outside the project or no pom.xml is found.
+    """
+    project_dir = os.path.abspath(project_dir)
+    current = os.path.dirname(os.path.abspath(java_file))
+    if os.path.commonpath([project_dir, current]) != project_dir:
+        return None
+    while True:
+        if os.path.isfile(os.path.join(current, "pom.xml")):
+            return os.path.relpath(current, project_dir)
+        if current == project_dir:
+            return None
+        current = os.path.dirname(current)
+
+MAVEN_BACKENDS = ("auto", "mvnd", "mvn")
+
+def maven_command(backend: str = "auto") -> list:
+    """Command prefix for the build backend.
+
+    "auto" uses the Maven daemon (`mvnd`, warm JVM and plugin cache) when it is on the
+    PATH and plain `mvn` otherwise. mvnd runs in batch mode (-B) to keep the classic log.
+    """
+    if backend not in MAVEN_BACKENDS:
+        raise ValueError(f"Unknown Maven backend '{backend}', expected one of {MAVEN_BACKENDS}")
+    if backend != "mvn" and shutil.which("mvnd"):
+        return ["mvnd", "-B"]
+    if backend == "mvnd":
+        print("mvnd is not installed. Using mvn...")
+    return ["mvn"]
+
+def _build_reported_result(process: subprocess.CompletedProcess) -> bool:
+    """True when Maven got as far as reporting BUILD SUCCESS/FAILURE (i.e. the backend itself worked)."""
+    return "BUILD SUCCESS" in process.stdout or "BUILD FAILURE" in process.stdout
+
+def run_maven(args: list, project_dir: str = ".", backend: str = "auto", timeout: float = None) -> subprocess.CompletedProcess:
+    """Run Maven with `args` in `project_dir` on the selected backend.
+
+    A call exceeding `timeout` seconds is killed and returned with returncode 124 and
+    the reason in stderr; with mvnd the daemons of the workspace are stopped as well, so
+    the abandoned build cannot keep writing to it. When mvnd fails without Maven reporting
+    a build result (daemon could not start, lost connection, ...), the call is repeated
+    once with plain `mvn`.
+    """
+    command = maven_command(backend)
+    env = mvnd_environment(project_dir) if command[0] == "mvnd" else None
+    try:
+        process = subprocess.run(command + args, cwd=project_dir, capture_output=True, text=True, timeout=timeout, env=env)
+    except subprocess.TimeoutExpired as e:
+        stdout = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+        print(f"{' '.join(command + args)} timed out after {timeout}s")
+        if env is not None:
+            # Killing the mvnd client alone leaves its daemon building in the workspace
+            stop_mvnd_daemons(project_dir)
+        return subprocess.CompletedProcess(command + args, 124, stdout, f"Maven build timed out after {timeout} seconds.")
+
+    if command[0] == "mvnd" and process.returncode != 0 and not _build_reported_result(process):
+        print(f"mvnd failed before building ({process.stderr.strip()[:200]}). Retrying with mvn...")
+        return run_maven(args, project_dir, backend="mvn", timeout=timeout)
+    return process
+
 # Missing Maven functions required by agents.py
-def compile_project_with_maven(project_dir: str = ".") -> subprocess.CompletedProcess:
-    cmd = ["mvn", "clean", "install", "-DskipTests"]
-    return subprocess.run(cmd, cwd=project_dir, capture_output=True, text=True)
+def compile_project_with_maven(project_dir: str = ".", changed_file: str = None, incremental: bool = True, offline: bool = True,
+                               backend: str = "auto", timeout: float = None) -> subprocess.CompletedProcess:
+    """Build the project with Maven, skipping tests.
 
-def run_maven_test(class_name: str = None, method_name: str = None, project_dir: str = ".", verify: bool = False) -> subprocess.CompletedProcess:
-    cmd = ["mvn"]
+    When `changed_file` is given and `incremental` is True, only the module owning the
+    file and the modules depending on it are built (`-pl <module> -amd`), without
+    `clean` so Maven can reuse previous compilation output, and offline by default.
+    Falls back to the full `mvn clean package -DskipTests` when the module cannot be
+    determined or the offline build cannot resolve its dependencies.
+    Candidates are packaged, never installed: the local repository (~/.m2) is shared by
+    every workspace, so only accepted code goes there (see `install_module`).
+    `backend` and `timeout` are passed to `run_maven`.
+    """
+    with span("maven.compile") as attributes:
+        module = find_maven_module(project_dir, changed_file) if (incremental and changed_file) else None
+        attributes["module"] = module
+
+        if module is not None:
+            args = ["package", "-DskipTests"]
+            if offline:
+                args.append("-o")
+            if module != ".":
+                args.extend(["-pl", module, "-amd"])
+            process = run_maven(args, project_dir, backend=backend, timeout=timeout)
+            if not (offline and process.returncode != 0 and "offline" in process.stdout.lower()):
+                attributes["returncode"] = process.returncode
+                return process
+            print("Offline incremental build could not resolve dependencies. Falling back to full build...")
+
+        process = run_maven(["clean", "package", "-DskipTests"], project_dir, backend=backend, timeout=timeout)
+        attributes.update(module=None, returncode=process.returncode)
+        return process
+
+def install_module(project_dir: str = ".", changed_file: str = None, offline: bool = True,
+                   backend: str = "auto", timeout: float = None) -> subprocess.CompletedProcess:
+    """Install the module owning an accepted `changed_file` (the whole project without one)
+    into the local repository, so later module builds compile against the accepted code.
+    `backend` and `timeout` are passed to `run_maven`."""
+    with span("maven.install") as attributes:
+        module = find_maven_module(project_dir, changed_file) if changed_file else None
+        args = ["install", "-DskipTests"]
+        if offline:
+            args.append("-o")
+        if module not in (None, "."):
+            args.extend(["-pl", module])
+        process = run_maven(args, project_dir, backend=backend, timeout=timeout)
+        attributes.update(module=module, returncode=process.returncode)
+        return process
+
+def run_maven_test(class_name=None, method_name: str = None, project_dir: str = ".", verify: bool = False,
+                   backend: str = "auto", timeout: float = None) -> subprocess.CompletedProcess:
+    """Run `mvn test` (or `mvn clean verify`).
+
+    `class_name` may be a single test class or a list of them; a list is passed as a
+    comma-separated `-Dtest=` filter. Modules without a matching test do not fail the build.
+    `backend` and `timeout` are passed to `run_maven`.
+    """
+    args = []
     if verify:
-        cmd.extend(["clean", "verify"])
+        args.extend(["clean", "verify"])
     else:
-        cmd.append("test")
-    
+        args.append("test")
+
     if class_name:
-        test_filter = class_name
+        test_filter = class_name if isinstance(class_name, str) else ",".join(class_name)
         if method_name:
             test_filter += "#" + method_name
-        cmd.extend(["-Dtest=" + test_filter])
-    
-    return subprocess.run(cmd, cwd=project_dir, capture_output=True, text=True)
+        args.extend(["-Dtest=" + test_filter, "-Dsurefire.failIfNoSpecifiedTests=false", "-DfailIfNoTests=false"])
+
+    with span("maven.test", tests=1 if isinstance(class_name, str) else len(class_name or []) or "all") as attributes:
+        process = run_maven(args, project_dir, backend=backend, timeout=timeout)
+        attributes["returncode"] = process.returncode
+        return process
+
+# Cached compile classpath of a module, kept in its target/ folder so `mvn clean` invalidates it
+CLASSPATH_CACHE_FILE = os.path.join("target", "refagent-classpath.json")
+
+def read_cached_classpath(project_dir: str, module: str):
+    """Return the cached compile classpath entry of `module` ({"classpath", "usable"}), or None.
+
+    An entry older than the module's pom.xml is stale and ignored.
+    """
+    module_dir = os.path.join(project_dir, module)
+    cache_file = os.path.join(module_dir, CLASSPATH_CACHE_FILE)
+    if not os.path.isfile(cache_file):
+        return None
+    if os.path.getmtime(cache_file) < os.path.getmtime(os.path.join(module_dir, "pom.xml")):
+        return None
+    try:
+        return read_json_file(cache_file)
+    except (OSError, ValueError):
+        return None
+
+@traced("maven.classpath")
+def cache_module_classpath(project_dir: str, module: str, offline: bool = True, backend: str = "auto", timeout: float = None):
+    """Resolve the compile classpath of `module` with `dependency:build-classpath` and cache it.
+
+    Returns the classpath string, or None when Maven could not resolve it.
+    """
+    module_dir = os.path.join(project_dir, module)
+    classpath_file = os.path.join(os.path.abspath(module_dir), "target", "refagent-classpath.txt")
+    os.makedirs(os.path.dirname(classpath_file), exist_ok=True)
+    args = ["dependency:build-classpath", "-Dmdep.includeScope=compile", f"-Dmdep.outputFile={classpath_file}"]
+    if offline:
+        args.append("-o")
+    if module != ".":
+        args.extend(["-pl", module])
+    process = run_maven(args, project_dir, backend=backend, timeout=timeout)
+    if process.returncode != 0 or not os.path.isfile(classpath_file):
+        print(f"Could not resolve the compile classpath of module '{module}'.")
+        return None
+    with open(classpath_file, 'r', encoding='utf-8') as f:
+        classpath = f.read().strip()
+    export_dict_to_json({"classpath": classpath, "usable": True}, os.path.join(module_dir, CLASSPATH_CACHE_FILE))
+    return classpath
+
+def mark_cached_classpath_unusable(project_dir: str, module: str):
+    """Disable the javac fast path for `module` (javac rejects code that Maven compiles)."""
+    cache_file = os.path.join(project_dir, module, CLASSPATH_CACHE_FILE)
+    entry = read_cached_classpath(project_dir, module)
+    if entry is not None:
+        entry["usable"] = False
+        export_dict_to_json(entry, cache_file)
+
+def find_direct_dependents(source_root: str, java_file: str) -> list:
+    """Return the other .java files under `source_root` that mention the class declared by `java_file`."""
+    class_name = os.path.splitext(os.path.basename(java_file))[0]
+    pattern = re.compile(r"\b" + re.escape(class_name) + r"\b")
+    dependents = []
+    for root, _, files in os.walk(source_root):
+        for name in files:
+            path = os.path.join(root, name)
+            if not name.endswith(".java") or os.path.samefile(path, java_file):
+                continue
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                if pattern.search(f.read()):
+                    dependents.append(path)
+    return dependents
+
+@traced("javac")
+def compile_with_javac(project_dir: str, module: str, java_files: list, classpath: str, timeout: float = None) -> subprocess.CompletedProcess:
+    """Compile `java_files` with javac against the module's compiled classes and cached classpath.
+
+    Class files go to a temporary folder that is removed afterwards, so the Maven build
+    output is never touched. Diagnostics are returned in the process stderr.
+    """
+    module_dir = os.path.join(project_dir, module)
+    full_classpath = os.pathsep.join(
+        entry for entry in (os.path.join(module_dir, "target", "classes"), classpath) if entry
+    )
+    output_dir = tempfile.mkdtemp(prefix="refagent-javac-")
+    cmd = ["javac", "-d", output_dir, "-cp", full_classpath, "-encoding", "UTF-8", "-implicit:none", "-nowarn"] + list(java_files)
+    try:
+        return subprocess.run(cmd, cwd=project_dir, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return subprocess.CompletedProcess(cmd, 124, "", f"javac timed out after {timeout} seconds.")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
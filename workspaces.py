@@ -0,0 +1,266 @@
+import os
+import sys
+import uuid
+import errno
+import hashlib
+import shutil
+import argparse
+import subprocess
+
+# Strategies for creating a workspace from a base project tree:
+#   hardlink - directory structure recreated, every file hardlinked to the base tree
+#              (write_to_java_file breaks the link before writing; tools that rewrite
+#              sources in place, e.g. formatter plugins, need "copy"); build output is copied
+#   overlay  - overlayfs mount (kernel or fuse-overlayfs) with the base tree as lower layer;
+#              only changed files are ever written, build output is shared until modified
+#   worktree - `git worktree add --detach` of the base repository's HEAD; build output is copied
+#   copy     - full recursive copy; reflinked (`cp --reflink=auto`) where the filesystem
+#              supports it (btrfs, XFS, APFS via clonefile), so blocks are shared until written.
+#              The only strategy that is safe for the canonical after tree, which outlives
+#              the run and is rewritten by tools other than write_to_java_file
+#   auto     - hardlink, falling back to copy when the destination is on another filesystem
+#              (meant for short-lived worker scratch copies)
+STRATEGIES = ("auto", "hardlink", "overlay", "worktree", "copy")
+
+# Build output directories; they are rewritten in place by the build, so never hardlinked
+BUILD_OUTPUT_DIRS = ("target",)
+
+TRASH_DIR = ".trash"
+
+
+def _overlay_dirs(dest_dir):
+    parent, name = os.path.split(os.path.abspath(dest_dir))
+    return os.path.join(parent, f".{name}.overlay")
+
+
+def overlay_available():
+    """True when an overlay can be mounted here (root with kernel overlayfs, or fuse-overlayfs)."""
+    if not sys.platform.startswith("linux"):
+        return False
+    if shutil.which("fuse-overlayfs") and os.path.exists("/dev/fuse"):
+        return True
+    if os.geteuid() == 0:
+        try:
+            with open("/proc/filesystems") as f:
+                return any(line.split()[-1] == "overlay" for line in f if line.strip())
+        except OSError:
+            return False
+    return False
+
+
+def _copy_build_outputs(base_dir, dest_dir):
+    """Copy the build output directories of `base_dir` into the matching places of `dest_dir`."""
+    for root, dirs, _ in os.walk(base_dir):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for name in [d for d in dirs if d in BUILD_OUTPUT_DIRS]:
+            source = os.path.join(root, name)
+            target = os.path.join(dest_dir, os.path.relpath(source, base_dir))
+            if os.path.lexists(target):
+                shutil.rmtree(target)
+            shutil.copytree(source, target, symlinks=True)
+            dirs.remove(name)
+
+
+def _create_hardlink_tree(base_dir, dest_dir):
+    for root, dirs, files in os.walk(base_dir):
+        relative = os.path.relpath(root, base_dir)
+        target_root = os.path.normpath(os.path.join(dest_dir, relative))
+        os.makedirs(target_root, exist_ok=True)
+
+        build_dirs = [d for d in dirs if d in BUILD_OUTPUT_DIRS]
+        for name in build_dirs:
+            shutil.copytree(os.path.join(root, name), os.path.join(target_root, name), symlinks=True)
+        # Symlinked directories are recreated as links, not followed
+        for name in [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            os.symlink(os.readlink(os.path.join(root, name)), os.path.join(target_root, name))
+            build_dirs.append(name)
+        dirs[:] = [d for d in dirs if d not in build_dirs]
+
+        for name in files:
+            source = os.path.join(root, name)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), os.path.join(target_root, name))
+            else:
+                os.link(source, os.path.join(target_root, name))
+
+
+def _copy_tree(base_dir, dest_dir):
+    """Recursive copy that shares blocks with `base_dir` where the filesystem supports reflinks."""
+    if sys.platform.startswith("linux") and shutil.which("cp"):
+        result = subprocess.run(["cp", "-a", "--reflink=auto", os.path.abspath(base_dir), os.path.abspath(dest_dir)],
+                                capture_output=True, text=True)
+        if result.returncode == 0:
+            return
+        print(f"cp --reflink=auto failed ({result.stderr.strip()}); copying with shutil.")
+        discard_workspace(dest_dir)
+    shutil.copytree(base_dir, dest_dir, symlinks=True)
+
+
+def _mount_overlay(base_dir, dest_dir):
+    overlay_dir = _overlay_dirs(dest_dir)
+    upper, work = os.path.join(overlay_dir, "upper"), os.path.join(overlay_dir, "work")
+    os.makedirs(upper, exist_ok=True)
+    os.makedirs(work, exist_ok=True)
+    os.makedirs(dest_dir, exist_ok=True)
+    options = f"lowerdir={os.path.abspath(base_dir)},upperdir={upper},workdir={work}"
+    if os.geteuid() == 0:
+        command = ["mount", "-t", "overlay", "overlay", "-o", options, dest_dir]
+    else:
+        command = ["fuse-overlayfs", "-o", options, dest_dir]
+    subprocess.run(command, check=True, capture_output=True, text=True)
+
+
+def _add_worktree(base_dir, dest_dir):
+    subprocess.run(["git", "-C", base_dir, "worktree", "add", "--detach", "--force", os.path.abspath(dest_dir), "HEAD"],
+                   check=True, capture_output=True, text=True)
+    _copy_build_outputs(base_dir, dest_dir)
+
+
+def create_workspace(base_dir, dest_dir, strategy="auto"):
+    """
+    Create `dest_dir` as a cheap, writable view of the project at `base_dir`.
+    An existing workspace at `dest_dir` is discarded first. The local Maven repository
+    (~/.m2) is shared by every workspace as is; build output (target/) is shared or
+    copied depending on the strategy (see STRATEGIES).
+    :return: The strategy actually used; unavailable strategies fall back to hardlink, then copy.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown workspace strategy '{strategy}', expected one of {STRATEGIES}")
+    discard_workspace(dest_dir)
+    os.makedirs(os.path.dirname(os.path.abspath(dest_dir)), exist_ok=True)
+
+    if strategy == "overlay":
+        if overlay_available():
+            try:
+                _mount_overlay(base_dir, dest_dir)
+                return "overlay"
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"Overlay mount failed ({getattr(e, 'stderr', None) or e}); using a hardlink tree.")
+                discard_workspace(dest_dir)
+        else:
+            print("overlayfs is not available here; using a hardlink tree.")
+        strategy = "hardlink"
+
+    if strategy == "worktree":
+        if os.path.exists(os.path.join(base_dir, ".git")):
+            try:
+                _add_worktree(base_dir, dest_dir)
+                return "worktree"
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"git worktree failed ({getattr(e, 'stderr', None) or e}); using a hardlink tree.")
+                discard_workspace(dest_dir)
+        else:
+            print(f"{base_dir} is not a git checkout; using a hardlink tree.")
+        strategy = "hardlink"
+
+    if strategy in ("auto", "hardlink"):
+        try:
+            _create_hardlink_tree(base_dir, dest_dir)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+            print(f"Hardlinks are not possible for {dest_dir} ({e}); copying the project.")
+            discard_workspace(dest_dir)
+
+    _copy_tree(base_dir, dest_dir)
+    return "copy"
+
+
+def _worktree_git_dir(dest_dir):
+    """The base repository's .git directory when `dest_dir` is a git worktree, else None."""
+    dot_git = os.path.join(dest_dir, ".git")
+    if not os.path.isfile(dot_git):
+        return None
+    with open(dot_git) as f:
+        content = f.read().strip()
+    if not content.startswith("gitdir:"):
+        return None
+    worktree_git_dir = content[len("gitdir:"):].strip()
+    # <base>/.git/worktrees/<name>
+    return os.path.dirname(os.path.dirname(worktree_git_dir))
+
+
+def mvnd_environment(project_dir):
+    """Environment giving the workspace `project_dir` its own mvnd daemon registry
+    (MVND_DAEMON_STORAGE), so its daemons can be stopped without touching the others."""
+    key = hashlib.sha1(os.path.abspath(project_dir).encode("utf-8")).hexdigest()[:16]
+    env = dict(os.environ)
+    env["MVND_DAEMON_STORAGE"] = os.path.join(os.path.expanduser("~"), ".m2", "mvnd", "workspaces", key)
+    return env
+
+
+def stop_mvnd_daemons(project_dir, wait=True):
+    """Stop the mvnd daemons of the workspace `project_dir`, if it ever started any.
+    With `wait=False` the stop runs in a detached process."""
+    env = mvnd_environment(project_dir)
+    if not shutil.which("mvnd") or not os.path.isdir(env["MVND_DAEMON_STORAGE"]):
+        return
+    try:
+        if wait:
+            subprocess.run(["mvnd", "--stop"], env=env, capture_output=True, text=True, timeout=60)
+        else:
+            subprocess.Popen(["mvnd", "--stop"], env=env, start_new_session=True,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Could not stop the mvnd daemons of {project_dir}: {e}")
+
+
+def _remove_in_background(paths):
+    try:
+        subprocess.Popen(["rm", "-rf", *paths], start_new_session=True,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def discard_workspace(dest_dir):
+    """
+    Remove a workspace in constant time: stop its mvnd daemons, unmount it if it is an
+    overlay, move it into a `.trash` folder next to it (a rename on the same filesystem) and
+    delete the trash, both in detached background processes.
+    """
+    stop_mvnd_daemons(dest_dir, wait=False)
+    parent = os.path.dirname(os.path.abspath(dest_dir))
+    overlay_dir = _overlay_dirs(dest_dir)
+    if os.path.ismount(dest_dir):
+        command = ["umount", dest_dir] if os.geteuid() == 0 else ["fusermount", "-u", dest_dir]
+        subprocess.run(command, check=True, capture_output=True, text=True)
+
+    git_dir = _worktree_git_dir(dest_dir) if os.path.isdir(dest_dir) else None
+
+    trash = os.path.join(parent, TRASH_DIR)
+    moved = []
+    for path in (dest_dir, overlay_dir):
+        if os.path.lexists(path):
+            os.makedirs(trash, exist_ok=True)
+            moved.append(os.path.join(trash, f"{os.path.basename(path)}-{uuid.uuid4().hex}"))
+            os.rename(path, moved[-1])
+
+    if git_dir is not None:
+        subprocess.run(["git", "--git-dir", git_dir, "worktree", "prune"], capture_output=True, text=True)
+    if moved:
+        _remove_in_background(moved)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or discard copy-on-write project workspaces")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Create DEST as a workspace of BASE")
+    create.add_argument("base_dir")
+    create.add_argument("dest_dir")
+    create.add_argument("--strategy", choices=STRATEGIES, default="copy")
+    discard = commands.add_parser("discard", help="Remove the workspace DEST")
+    discard.add_argument("dest_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        used = create_workspace(args.base_dir, args.dest_dir, args.strategy)
+        print(f"Created {args.dest_dir} from {args.base_dir} ({used}).")
+    else:
+        discard_workspace(args.dest_dir)
+
+
+if __name__ == "__main__":
+    main()